@@ -0,0 +1,95 @@
+"""Wall-clock benchmark: sequential vs parallel (fan-out) supervisor mode.
+
+Runs the real supervisor graph from ``main._build_graph`` with a scripted
+chat model and simulated tool latencies, so no API keys or network are
+needed. "Mixed" questions need both the reliability searcher and the web
+searcher; "single" questions need only one of them.
+
+    python benchmarks/bench_fanout.py --repeats 5 --llm-latency 0.3 --json fanout.json
+"""
+import argparse, asyncio, json, os, statistics, sys, time, uuid
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+import main
+from fakes import Preset, install, needed_agents
+from fanout import agent_citations
+
+MIXED = [
+    "MTBF 신뢰성 기준과 최신 업계 뉴스를 함께 알려줘",
+    "와이블 고장 분석 방법과 최근 웹에 나온 사례를 비교해줘",
+    "신뢰성 시험 규격과 올해 최신 동향을 정리해줘",
+]
+SINGLE = [
+    "MTBF 신뢰성 정의를 알려줘",
+    "최신 반도체 뉴스를 알려줘",
+]
+
+
+def _build(mode: str, args) -> Any:
+    rt = main.AppContext()
+    install(rt, Preset(args.llm_latency, 0.0, 40, args.rag_latency, args.web_latency))
+    rt.checkpointer = InMemorySaver()
+    prompts = {name: f"You are the {name} agent." for name in ("reliability_searcher", "coder", "websearcher")}
+    return main._build_graph(rt, prompts, mode)
+
+
+async def _time_query(graph, question: str) -> Dict[str, Any]:
+    cfg = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    t0 = time.perf_counter()
+    result = await graph.ainvoke({"messages": [HumanMessage(question)]}, cfg)
+    elapsed = time.perf_counter() - t0
+    answer = result["messages"][-1].content
+    expected = agent_citations(result["messages"])
+    return {
+        "seconds": elapsed,
+        "citations_kept": all(line in answer for line in expected) and len(expected) == len(needed_agents(question)),
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"config": vars(args), "modes": {}}
+    for mode in ("sequential", "parallel"):
+        graph = _build(mode, args)
+        per_kind = {}
+        for kind, questions in (("mixed", MIXED), ("single", SINGLE)):
+            samples = [await _time_query(graph, q) for _ in range(args.repeats) for q in questions]
+            seconds = [s["seconds"] for s in samples]
+            per_kind[kind] = {
+                "n": len(seconds),
+                "mean_s": round(statistics.mean(seconds), 3),
+                "p95_s": round(sorted(seconds)[int(0.95 * (len(seconds) - 1))], 3),
+                "citations_kept": all(s["citations_kept"] for s in samples),
+            }
+        report["modes"][mode] = per_kind
+    seq, par = report["modes"]["sequential"], report["modes"]["parallel"]
+    report["speedup"] = {k: round(seq[k]["mean_s"] / par[k]["mean_s"], 2) for k in seq}
+    return report
+
+
+def main_cli(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--rag-latency", type=float, default=1.0)
+    parser.add_argument("--web-latency", type=float, default=1.5)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print(f"{'mode':<11} {'kind':<7} {'n':>3} {'mean s':>8} {'p95 s':>8}  citations")
+    for mode, kinds in report["modes"].items():
+        for kind, r in kinds.items():
+            print(f"{mode:<11} {kind:<7} {r['n']:>3} {r['mean_s']:>8.3f} {r['p95_s']:>8.3f}  {'ok' if r['citations_kept'] else 'MISSING'}")
+    print("speedup (sequential / parallel): " + ", ".join(f"{k} x{v}" for k, v in report["speedup"].items()))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,284 @@
+"""Offline load test for the chat HTTP API.
+
+Starts ``main.app`` under uvicorn on a loopback port with the fake model and
+tools from ``fakes.py`` (no OpenAI/Tavily calls), in a scratch directory so
+``chat.db``/checkpoints start empty. Each virtual user logs in, creates a
+thread and runs ``--turns`` turns; every turn is either ``/chat`` or
+``/chat/stream`` (``--stream-ratio``) followed by ``GET /messages/{tid}`` and
+``GET /threads``. Reports p50/p90/p99 latency and error rate per endpoint,
+stream TTFT and tokens/sec, and saves everything as JSON; ``--compare`` prints
+the change against an earlier report.
+
+    python benchmarks/bench_load.py --preset fast --users 32 --turns 5 --json load.json
+    python benchmarks/bench_load.py --preset fast --users 32 --turns 5 --compare load.json
+"""
+import argparse, asyncio, json, os, platform, random, subprocess, sys, tempfile, time
+from collections import Counter
+from dataclasses import asdict, replace
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from fakes import PRESETS, install
+
+QUESTIONS = [
+    "안녕하세요, 무엇을 도와줄 수 있나요?",
+    "MTBF 신뢰성 정의를 알려줘",
+    "최신 반도체 뉴스를 알려줘",
+    "MTBF 신뢰성 기준과 최신 업계 뉴스를 함께 알려줘",
+]
+
+
+# ── 집계 ───────────────────────────────────────────────────
+def _pct(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _summary(values: List[float], errors: int = 0) -> Dict[str, Any]:
+    n = len(values) + errors
+    out: Dict[str, Any] = {"n": n, "errors": errors, "error_rate": round(errors / n, 4) if n else 0.0}
+    if values:
+        out.update({
+            "mean": round(sum(values) / len(values), 4),
+            "p50": round(_pct(values, 0.50), 4),
+            "p90": round(_pct(values, 0.90), 4),
+            "p99": round(_pct(values, 0.99), 4),
+            "max": round(max(values), 4),
+        })
+    return out
+
+
+class Recorder:
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = {}
+        self.errors: Counter = Counter()
+        self.status: Counter = Counter()
+        self.ttft: List[float] = []
+        self.tokens_per_second: List[float] = []
+
+    def ok(self, name: str, seconds: float):
+        self.latency.setdefault(name, []).append(seconds)
+
+    def fail(self, name: str, status: Any):
+        self.errors[name] += 1
+        self.status[f"{name}:{status}"] += 1
+
+    def endpoints(self) -> Dict[str, Any]:
+        names = sorted(set(self.latency) | set(self.errors))
+        return {name: _summary(self.latency.get(name, []), self.errors[name]) for name in names}
+
+
+# ── 요청 ───────────────────────────────────────────────────
+async def _timed(rec: Recorder, name: str, call) -> Optional[Any]:
+    t0 = time.perf_counter()
+    try:
+        r = await call
+    except Exception as e:
+        rec.fail(name, type(e).__name__)
+        return None
+    if r.status_code >= 400:
+        rec.fail(name, r.status_code)
+        return None
+    rec.ok(name, time.perf_counter() - t0)
+    return r
+
+
+async def _stream_turn(client, headers: dict, body: dict, rec: Recorder):
+    t0 = time.perf_counter()
+    first = None
+    words = 0
+    try:
+        async with client.stream("POST", "/chat/stream", params={"format": "ndjson"},
+                                 headers=headers, json=body) as r:
+            if r.status_code >= 400:
+                rec.fail("chat_stream", r.status_code)
+                return
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "token":
+                    if first is None:
+                        first = time.perf_counter()
+                    words += len(event["text"].split())
+                elif event["type"] in ("error", "cancelled"):
+                    rec.fail("chat_stream", event["type"])
+                    return
+                elif event["type"] == "done":
+                    break
+    except Exception as e:
+        rec.fail("chat_stream", type(e).__name__)
+        return
+    end = time.perf_counter()
+    rec.ok("chat_stream", end - t0)
+    if first is not None:
+        rec.ttft.append(first - t0)
+        if words > 1 and end > first:
+            rec.tokens_per_second.append(words / (end - first))
+
+
+async def _user(client, index: int, args, rec: Recorder):
+    rng = random.Random(args.seed + index)
+    r = await _timed(rec, "login", client.post("/login", json={"user": f"bench{index:04d}", "key": "open-sesame"}))
+    if r is None:
+        return
+    headers = {"Authorization": f"Bearer {r.json()['token']}"}
+    r = await _timed(rec, "threads_create", client.post("/threads", headers=headers))
+    if r is None:
+        return
+    tid = r.json()["thread_id"]
+    for _ in range(args.turns):
+        body = {"thread_id": tid, "question": rng.choice(QUESTIONS)}
+        if rng.random() < args.stream_ratio:
+            await _stream_turn(client, headers, body, rec)
+        else:
+            await _timed(rec, "chat", client.post("/chat", headers=headers, json=body))
+        await _timed(rec, "messages", client.get(f"/messages/{tid}", headers=headers))
+        await _timed(rec, "threads", client.get("/threads", headers=headers))
+
+
+# ── 서버 ───────────────────────────────────────────────────
+async def _start_server(app):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args) -> Dict[str, Any]:
+    import httpx
+    preset = PRESETS[args.preset]
+    overrides = {k: getattr(args, k) for k in ("llm_latency", "tokens_per_second", "answer_tokens",
+                                               "rag_latency", "web_latency") if getattr(args, k) is not None}
+    preset = replace(preset, **overrides)
+
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    os.chdir(workdir)   # chat.db 는 현재 디렉터리 기준
+    os.environ.setdefault("CHECKPOINT_DB", os.path.join(workdir, "lg.sqlite"))
+    os.makedirs("prompts", exist_ok=True)
+    for name in ("reliability_searcher", "coder", "websearcher"):
+        with open(os.path.join("prompts", f"{name}.md"), "w") as f:
+            f.write(f"You are the {name} agent.")
+
+    import main
+    install(main.runtime, preset)
+    server, task, base_url = await _start_server(main.app)
+    rec = Recorder()
+    try:
+        limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            if args.warmup:
+                await _user(client, 10_000, argparse.Namespace(**{**vars(args), "turns": 1}), Recorder())
+            t0 = time.perf_counter()
+            await asyncio.gather(*(_user(client, i, args, rec) for i in range(args.users)))
+            wall = time.perf_counter() - t0
+    finally:
+        server.should_exit = True
+        await task
+
+    turns = sum(len(rec.latency.get(n, [])) for n in ("chat", "chat_stream"))
+    return {
+        "config": {**vars(args), "preset_values": asdict(preset)},
+        "env": {
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "supervisor_mode": main.SUPERVISOR_MODE,
+            "db_write_behind": main.DB_WRITE_BEHIND,
+            "history_mode": main.HISTORY_MODE,
+        },
+        "wall_seconds": round(wall, 3),
+        "turns_per_second": round(turns / wall, 3) if wall else 0.0,
+        "endpoints": rec.endpoints(),
+        "stream": {
+            "ttft": _summary(rec.ttft),
+            "tokens_per_second": _summary(rec.tokens_per_second),
+        },
+        "error_status": dict(rec.status),
+    }
+
+
+# ── 출력 ───────────────────────────────────────────────────
+def _print_report(report: Dict[str, Any]):
+    print(f"{'endpoint':<15} {'n':>6} {'err%':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    rows = dict(report["endpoints"])
+    rows["stream ttft"] = report["stream"]["ttft"]
+    for name, r in rows.items():
+        if "p50" not in r:
+            print(f"{name:<15} {r['n']:>6} {100 * r['error_rate']:>6.1f}")
+            continue
+        print(f"{name:<15} {r['n']:>6} {100 * r['error_rate']:>6.1f} "
+              f"{1000 * r['p50']:>9.1f} {1000 * r['p90']:>9.1f} {1000 * r['p99']:>9.1f}")
+    tps = report["stream"]["tokens_per_second"]
+    if "p50" in tps:
+        print(f"stream tokens/s p50 {tps['p50']:.1f}, p99 {tps['p99']:.1f}")
+    print(f"{report['turns_per_second']} turns/s over {report['wall_seconds']} s")
+
+
+def _print_compare(report: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"\nvs {baseline['env'].get('git') or 'baseline'}:")
+    old_rows = {**baseline["endpoints"], "stream ttft": baseline["stream"]["ttft"]}
+    new_rows = {**report["endpoints"], "stream ttft": report["stream"]["ttft"]}
+    for name, new in new_rows.items():
+        old = old_rows.get(name)
+        if not old or "p50" not in old or "p50" not in new:
+            continue
+        diffs = "  ".join(
+            f"{q} {100 * (new[q] - old[q]) / old[q]:+.1f}%" if old[q] else f"{q} n/a" for q in ("p50", "p99")
+        )
+        print(f"{name:<15} {diffs}  err {100 * old['error_rate']:.1f}% -> {100 * new['error_rate']:.1f}%")
+    old_tps = baseline.get("turns_per_second") or 0
+    if old_tps:
+        print(f"turns/s {old_tps} -> {report['turns_per_second']} "
+              f"({100 * (report['turns_per_second'] - old_tps) / old_tps:+.1f}%)")
+
+
+def main_cli(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="fast")
+    parser.add_argument("--users", type=int, default=16, help="concurrent virtual users")
+    parser.add_argument("--turns", type=int, default=5, help="chat turns per user")
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="share of turns using /chat/stream")
+    parser.add_argument("--llm-latency", type=float, help="override: model time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, help="override: model token rate")
+    parser.add_argument("--answer-tokens", type=int, help="override: final answer length in tokens")
+    parser.add_argument("--rag-latency", type=float, help="override: RS tool latency (s)")
+    parser.add_argument("--web-latency", type=float, help="override: web search latency (s)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+    for path in ("json", "compare"):
+        if getattr(args, path):
+            setattr(args, path, os.path.abspath(getattr(args, path)))
+
+    report = asyncio.run(run(args))
+    _print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            _print_compare(report, json.load(f))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,156 @@
+"""Deterministic stand-ins for the OpenAI model and the RS / Tavily tools.
+
+``install`` puts them on a ``main.AppContext`` before startup; the lifespan
+keeps anything already set, so the real graph, database and HTTP layer run
+unchanged while no API keys or network are needed.
+"""
+import asyncio, json, time, uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import tool
+
+from fanout import agent_citations
+from tool_cache import make_stub_search_tool
+
+AGENT_TOOLS = {"reliability_searcher": "RS", "websearcher": "tavily_search"}
+FILLER = "신뢰성 분석 결과를 바탕으로 정리한 답변 내용입니다 "
+
+
+def needed_agents(question: str) -> List[str]:
+    """Agents a question calls for, by keyword (the scripted supervisor's routing)."""
+    agents = []
+    if any(k in question for k in ("신뢰성", "MTBF", "고장")):
+        agents.append("reliability_searcher")
+    if any(k in question for k in ("최신", "최근", "뉴스", "웹")):
+        agents.append("websearcher")
+    return agents
+
+
+@dataclass
+class Preset:
+    """Simulated latencies: model time to first token, model token rate, tool calls."""
+    llm_latency: float = 0.3
+    tokens_per_second: float = 60.0
+    answer_tokens: int = 120
+    rag_latency: float = 1.0
+    web_latency: float = 1.5
+
+
+PRESETS = {
+    "zero":      Preset(0.0, 0.0, 40, 0.0, 0.0),     # 프레임워크 오버헤드만 측정
+    "fast":      Preset(0.05, 400.0, 80, 0.1, 0.2),
+    "realistic": Preset(0.4, 60.0, 200, 1.0, 1.5),
+}
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Plays supervisor or agent depending on the tools it is bound to."""
+
+    latency: float = 0.3
+    tokens_per_second: float = 0.0     # 0 이면 전체 답변을 한 번에 낸다
+    answer_tokens: int = 40
+    tool_names: List[str] = []
+    parallel: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, *, parallel_tool_calls: Optional[bool] = None, **kwargs):
+        # create_react_agent 가 한 번 더 bind 할 때는 flag 없이 호출되므로 이전 값을 유지
+        parallel = self.parallel if parallel_tool_calls is None else parallel_tool_calls
+        return self.model_copy(update={"tool_names": [t.name for t in tools], "parallel": parallel})
+
+    def _decide(self, messages: List[BaseMessage]) -> AIMessage:
+        if not self.tool_names:
+            # history 요약처럼 도구 없이 불린 경우
+            return AIMessage(content="요약: " + FILLER.strip())
+        start = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        turn, question = messages[start:], messages[start].content
+        if not isinstance(question, str):
+            question = " ".join(p.get("text", "") for p in question if isinstance(p, dict))
+        if any(name.startswith("transfer_to_") for name in self.tool_names):
+            answered = {m.name for m in turn if isinstance(m, AIMessage) and m.name in AGENT_TOOLS and not m.tool_calls}
+            remaining = [a for a in needed_agents(question) if a not in answered]
+            if remaining:
+                targets = remaining if self.parallel else remaining[:1]
+                return AIMessage(content="", tool_calls=[
+                    {"name": f"transfer_to_{a}", "args": {}, "id": uuid.uuid4().hex} for a in targets
+                ])
+            body = " ".join(FILLER.split()[i % 5] for i in range(self.answer_tokens))
+            sources = "\n".join(agent_citations(messages))
+            return AIMessage(content=f"종합 답변입니다. {body}" + (f"\n📌 출처\n{sources}" if sources else ""))
+
+        own_tool = self.tool_names[0]
+        last = messages[-1]
+        if isinstance(last, ToolMessage) and last.name == own_tool:
+            return AIMessage(content=f"{own_tool} 결과 요약입니다.\n📌 출처\n- {own_tool}-doc-{uuid.uuid4().hex[:6]}.pdf")
+        return AIMessage(content="", tool_calls=[
+            {"name": own_tool, "args": {"query": str(question)}, "id": uuid.uuid4().hex}
+        ])
+
+    def _generation_time(self, message: AIMessage) -> float:
+        if not self.tokens_per_second or message.tool_calls:
+            return 0.0
+        return len(message.content.split()) / self.tokens_per_second
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._decide(messages)
+        time.sleep(self.latency + self._generation_time(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._decide(messages)
+        await asyncio.sleep(self.latency + self._generation_time(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._decide(messages)
+        await asyncio.sleep(self.latency)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                for i, c in enumerate(message.tool_calls)
+            ]))
+            return
+        delay = 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            text = word if i == len(words) - 1 else word + " "
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+            if delay:
+                await asyncio.sleep(delay)
+
+
+def make_fake_rag(latency: float):
+    @tool
+    async def RS(query: str) -> str:
+        """Search the reliability document index."""
+        await asyncio.sleep(latency)
+        return f"reliability documents about {query}"
+    return RS
+
+
+@tool
+def Python_REPL(query: str) -> str:
+    """Run python."""
+    return ""
+
+
+def install(rt: Any, preset: Preset):
+    """Put the fake model and tools on ``rt`` (a ``main.AppContext``) before startup."""
+    rt.llm = ScriptedChatModel(
+        latency=preset.llm_latency,
+        tokens_per_second=preset.tokens_per_second,
+        answer_tokens=preset.answer_tokens,
+    )
+    rt.rag_search_tool = make_fake_rag(preset.rag_latency)
+    rt.tavily_tool = make_stub_search_tool(latency=preset.web_latency, raw_chars=500)
+    rt.python_repl_tool = Python_REPL
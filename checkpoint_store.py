@@ -0,0 +1,164 @@
+# backend/checkpoint_store.py  ───────────────────────────────
+"""Pooled, compacting LangGraph checkpoint store on SQLite.
+
+``PooledSqliteSaver`` keeps ``AsyncSqliteSaver``'s schema and write path on a
+single writer connection, but serves ``aget_tuple``/``alist`` from a small
+pool of reader connections (WAL lets them run alongside the writer). A
+background task keeps only the newest ``keep_last`` root checkpoints per
+thread, plus the subgraph checkpoints written since the oldest of them,
+checkpoints the WAL and VACUUMs once enough pages are free.
+"""
+import asyncio, contextlib
+from typing import Any, AsyncIterator, List, Optional, Set
+
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+)
+
+# checkpoint_id (uuid6) 는 시간 순이므로 모든 namespace 를 같은 기준으로 자른다:
+# subgraph 호출마다 새 namespace ("websearcher:<task_id>") 가 생기기 때문
+_PRUNE_CHECKPOINTS = """
+DELETE FROM checkpoints WHERE thread_id = :tid AND checkpoint_id < (
+    SELECT checkpoint_id FROM checkpoints
+    WHERE thread_id = :tid AND checkpoint_ns = ''
+    ORDER BY checkpoint_id DESC LIMIT 1 OFFSET :keep
+)"""
+
+_PRUNE_WRITES = """
+DELETE FROM writes WHERE thread_id = ? AND NOT EXISTS (
+    SELECT 1 FROM checkpoints c
+    WHERE c.thread_id = writes.thread_id
+      AND c.checkpoint_ns = writes.checkpoint_ns
+      AND c.checkpoint_id = writes.checkpoint_id
+)"""
+
+
+async def _connect(path: str) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(path)
+    for pragma in CONNECTION_PRAGMAS:
+        await conn.execute(pragma)
+    return conn
+
+
+class PooledSqliteSaver(AsyncSqliteSaver):
+    """AsyncSqliteSaver with a reader pool, per-thread retention and compaction."""
+
+    def __init__(self, writer: aiosqlite.Connection, readers: List[aiosqlite.Connection],
+                 keep_last: int = 10, compact_interval: float = 600.0, vacuum_ratio: float = 0.3):
+        super().__init__(writer)
+        self.keep_last        = keep_last
+        self.compact_interval = compact_interval
+        self.vacuum_ratio     = vacuum_ratio
+        self._reader_conns    = readers
+        self._reader_savers   = [AsyncSqliteSaver(conn, serde=self.serde) for conn in readers]
+        self._readers: "asyncio.Queue[AsyncSqliteSaver]" = asyncio.Queue()
+        for reader in self._reader_savers:
+            self._readers.put_nowait(reader)
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def open(cls, path: str, readers: int = 4, **kwargs) -> "PooledSqliteSaver":
+        writer = await _connect(path)
+        saver = cls(writer, [await _connect(path) for _ in range(readers)], **kwargs)
+        await saver.setup()
+        return saver
+
+    async def setup(self) -> None:
+        await super().setup()
+        # reader 들은 스키마를 만들지 않고 writer 의 설정을 따른다
+        for reader in self._reader_savers:
+            reader.is_setup = True
+            reader._has_task_path = self._has_task_path
+
+    @contextlib.asynccontextmanager
+    async def _reader(self):
+        reader = await self._readers.get()
+        try:
+            yield reader
+        finally:
+            self._readers.put_nowait(reader)
+
+    # ── 읽기: reader pool ─────────────────────────────────
+    async def aget_tuple(self, config):
+        await self.setup()
+        async with self._reader() as reader:
+            return await reader.aget_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None) -> AsyncIterator[Any]:
+        await self.setup()
+        async with self._reader() as reader:
+            async for item in reader.alist(config, filter=filter, before=before, limit=limit):
+                yield item
+
+    # ── 쓰기: writer 연결 + retention 대상 기록 ────────────
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        result = await super().aput(config, checkpoint, metadata, new_versions)
+        if self.keep_last:
+            self._dirty.add(str(config["configurable"]["thread_id"]))
+        return result
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await super().adelete_thread(thread_id)
+        self._dirty.discard(str(thread_id))
+
+    # ── retention / compaction ───────────────────────────
+    async def prune(self) -> int:
+        """Drop checkpoints (any namespace) older than the ``keep_last``-th newest root one."""
+        removed = 0
+        while self._dirty:
+            thread_id = self._dirty.pop()
+            async with self.lock:
+                cur = await self.conn.execute(
+                    _PRUNE_CHECKPOINTS, {"tid": thread_id, "keep": self.keep_last - 1}
+                )
+                removed += cur.rowcount
+                await self.conn.execute(_PRUNE_WRITES, (thread_id,))
+                await self.conn.commit()
+        return removed
+
+    async def compact(self) -> dict:
+        """Prune, truncate the WAL and VACUUM when the free-page ratio is high."""
+        removed = await self.prune() if self.keep_last else 0
+        async with self.lock:
+            await self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            free = (await (await self.conn.execute("PRAGMA freelist_count")).fetchone())[0]
+            pages = (await (await self.conn.execute("PRAGMA page_count")).fetchone())[0]
+        vacuumed = bool(pages) and free / pages >= self.vacuum_ratio
+        if vacuumed:
+            # VACUUM 은 배타 잠금이 필요하므로 reader 를 모두 회수한 뒤 실행
+            held = [await self._readers.get() for _ in self._reader_savers]
+            try:
+                async with self.lock:
+                    await self.conn.execute("VACUUM")
+            finally:
+                for reader in held:
+                    self._readers.put_nowait(reader)
+        return {"removed_checkpoints": removed, "free_pages": free, "pages": pages, "vacuumed": vacuumed}
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                await self.compact()
+            except Exception as e:
+                print(f"Checkpoint compaction error: {e}")
+
+    def start(self):
+        if self._task is None and self.compact_interval > 0:
+            self._task = asyncio.create_task(self._compact_loop())
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        for conn in self._reader_conns:
+            await conn.close()
+        await self.conn.close()
@@ -0,0 +1,269 @@
+# backend/collector.py  ──────────────────────────────────────
+"""Incremental garbage collection for chat.db, uploaded images and checkpoints.
+
+``DELETE /threads/{tid}`` only removes the thread row so it stays cheap; the
+thread's messages and image rows, upload files nobody references any more and
+checkpoints of threads that no longer exist are reclaimed here, in the
+background. Every step handles one small batch in its own short transaction
+and sleeps between batches, so request writes never wait long for the SQLite
+write lock. Messages are deleted through the FTS triggers, so the search index
+shrinks with them.
+
+Deleted threads are handed over with ``forget(thread_id)`` and cleaned right
+away; a periodic full pass (``collect``) catches everything else, e.g. rows
+orphaned before this collector existed or by a crash.
+"""
+import asyncio, contextlib, datetime as dt, os, time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import bindparam, text
+
+# message_images.url 에서 /images/ 뒤의 파일 이름 (업로드는 절대 URL, 차트는 상대 URL)
+FILE_NAME_EXPR = "substr(url, instr(url, '/images/') + 8)"
+
+_INDEXES = (
+    f"CREATE INDEX IF NOT EXISTS ix_message_images_file ON message_images ({FILE_NAME_EXPR})",
+)
+
+_DROP_IMAGES = """
+DELETE FROM message_images WHERE message_id IN (
+    SELECT id FROM messages WHERE thread_id = :tid ORDER BY rowid LIMIT :n
+)"""
+_DROP_MESSAGES = """
+DELETE FROM messages WHERE rowid IN (
+    SELECT rowid FROM messages WHERE thread_id = :tid ORDER BY rowid LIMIT :n
+)"""
+_MESSAGE_THREADS = """
+SELECT DISTINCT thread_id FROM messages WHERE thread_id > :after ORDER BY thread_id LIMIT :n"""
+_IMAGE_WINDOW = """
+SELECT max(rowid) FROM (SELECT rowid FROM message_images WHERE rowid > :after ORDER BY rowid LIMIT :n)"""
+_DROP_DANGLING_IMAGES = """
+DELETE FROM message_images AS i
+WHERE i.rowid > :after AND i.rowid <= :upto
+  AND NOT EXISTS (SELECT 1 FROM messages AS m WHERE m.id = i.message_id)"""
+_CHECKPOINT_THREADS = """
+SELECT DISTINCT thread_id FROM checkpoints WHERE thread_id > ? ORDER BY thread_id LIMIT ?"""
+
+
+def ensure_indexes(conn):
+    """Create the indexes the collector relies on (sync SQLAlchemy connection)."""
+    for ddl in _INDEXES:
+        conn.exec_driver_sql(ddl)
+
+
+def _old_files(directory: str, cutoff: float) -> List[os.DirEntry]:
+    with os.scandir(directory) as entries:
+        return [e for e in entries if e.is_file(follow_symlinks=False) and e.stat().st_mtime < cutoff]
+
+
+def _remove_if_old(path: str, cutoff: float) -> int:
+    """Delete ``path`` unless it was touched since ``cutoff`` (re-uploaded); return bytes freed."""
+    try:
+        st = os.stat(path)
+        if st.st_mtime >= cutoff:
+            return 0
+        os.remove(path)
+        return st.st_size
+    except FileNotFoundError:
+        return 0
+
+
+class Collector:
+    """Background collector; ``collect()`` runs one full pass and returns its report."""
+
+    def __init__(self, engine, upload_dir: str, checkpointer: Callable[[], Any] = lambda: None,
+                 batch: int = 200, pause: float = 0.05, file_grace: float = 86400.0,
+                 interval: float = 3600.0):
+        self.engine       = engine
+        self.upload_dir   = upload_dir
+        self.checkpointer = checkpointer
+        self.batch        = batch
+        self.pause        = pause
+        self.file_grace   = file_grace
+        self.interval     = interval
+        self.totals       = {"messages": 0, "images": 0, "files": 0, "file_bytes": 0, "checkpoint_threads": 0}
+        self.last: Optional[Dict[str, Any]] = None
+        self._started: Optional[float] = None     # 마지막 전체 pass 시작 (monotonic)
+        self._collecting  = False
+        self._lock        = asyncio.Lock()
+        self._forgotten: Set[str] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _count(self, report: Dict[str, Any], kind: str, n: int):
+        report[kind] += n
+        self.totals[kind] += n
+
+    # ── 삭제된 스레드 ───────────────────────────────────────
+    def forget(self, thread_id: str):
+        """Queue a deleted thread's messages for removal by the background task."""
+        self._forgotten.add(thread_id)
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _drop_thread(self, thread_id: str, report: Dict[str, Any]):
+        while True:
+            async with self.engine.begin() as conn:
+                params = {"tid": thread_id, "n": self.batch}
+                images = (await conn.execute(text(_DROP_IMAGES), params)).rowcount
+                messages = (await conn.execute(text(_DROP_MESSAGES), params)).rowcount
+            self._count(report, "images", images)
+            self._count(report, "messages", messages)
+            if messages < self.batch:
+                return
+            await asyncio.sleep(self.pause)
+
+    async def _live_threads(self, ids: List[str]) -> Set[str]:
+        q = text("SELECT id FROM threads WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+        async with self.engine.connect() as conn:
+            return set((await conn.execute(q, {"ids": ids})).scalars())
+
+    # ── 전체 pass ──────────────────────────────────────────
+    async def _orphan_messages(self, report: Dict[str, Any]):
+        after = ""
+        while True:
+            async with self.engine.connect() as conn:
+                ids = list((await conn.execute(text(_MESSAGE_THREADS), {"after": after, "n": self.batch})).scalars())
+            if not ids:
+                return
+            after = ids[-1]
+            live = await self._live_threads(ids)
+            for thread_id in ids:
+                if thread_id not in live:
+                    await self._drop_thread(thread_id, report)
+            await asyncio.sleep(self.pause)
+
+    async def _dangling_images(self, report: Dict[str, Any]):
+        after = 0
+        while True:
+            async with self.engine.connect() as conn:
+                upto = (await conn.execute(text(_IMAGE_WINDOW), {"after": after, "n": self.batch})).scalar()
+            if upto is None:
+                return
+            async with self.engine.begin() as conn:
+                removed = (await conn.execute(text(_DROP_DANGLING_IMAGES), {"after": after, "upto": upto})).rowcount
+            self._count(report, "images", removed)
+            after = upto
+            await asyncio.sleep(self.pause)
+
+    async def _unreferenced_files(self, report: Dict[str, Any]):
+        # 업로드 직후 아직 메시지에 붙지 않은 파일은 grace 기간 동안 남겨 둔다
+        cutoff = time.time() - self.file_grace
+        entries = await asyncio.to_thread(_old_files, self.upload_dir, cutoff)
+        q = text(f"SELECT {FILE_NAME_EXPR} FROM message_images WHERE {FILE_NAME_EXPR} IN :names") \
+            .bindparams(bindparam("names", expanding=True))
+        for i in range(0, len(entries), self.batch):
+            chunk = entries[i:i + self.batch]
+            async with self.engine.connect() as conn:
+                used = set((await conn.execute(q, {"names": [e.name for e in chunk]})).scalars())
+            for entry in chunk:
+                if entry.name in used:
+                    continue
+                freed = await asyncio.to_thread(_remove_if_old, entry.path, cutoff)
+                if freed or not os.path.exists(entry.path):
+                    self._count(report, "files", 1)
+                    self._count(report, "file_bytes", freed)
+            await asyncio.sleep(self.pause)
+
+    async def _stale_checkpoints(self, report: Dict[str, Any]):
+        saver = self.checkpointer()
+        if saver is None or not hasattr(saver, "conn"):
+            return
+        after = ""
+        while True:
+            async with saver.lock:
+                cur = await saver.conn.execute(_CHECKPOINT_THREADS, (after, self.batch))
+                ids = [row[0] for row in await cur.fetchall()]
+            if not ids:
+                return
+            after = ids[-1]
+            live = await self._live_threads(ids)
+            for thread_id in ids:
+                if thread_id not in live:
+                    await saver.adelete_thread(thread_id)
+                    self._count(report, "checkpoint_threads", 1)
+            await asyncio.sleep(self.pause)
+
+    async def _free_bytes(self) -> int:
+        async with self.engine.connect() as conn:
+            free = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            page = (await conn.exec_driver_sql("PRAGMA page_size")).scalar()
+        return free * page
+
+    def _report(self) -> Dict[str, Any]:
+        return {kind: 0 for kind in self.totals}
+
+    async def collect(self) -> Dict[str, Any]:
+        """One full pass: orphaned rows, unreferenced files, stale checkpoints."""
+        self._collecting = True
+        try:
+            async with self._lock:
+                started = self._started = time.monotonic()
+                report = self._report()
+                await self._collect_forgotten(report)
+                await self._orphan_messages(report)
+                await self._dangling_images(report)
+                await self._unreferenced_files(report)
+                await self._stale_checkpoints(report)
+                # chat.db 안의 빈 페이지는 새 행이 재사용한다 (파일을 줄이려면 VACUUM)
+                report["db_free_bytes"] = await self._free_bytes()
+                report["seconds"] = round(time.monotonic() - started, 3)
+                report["finished"] = dt.datetime.utcnow().isoformat()
+                self.last = report
+                return report
+        finally:
+            self._collecting = False
+
+    async def _collect_forgotten(self, report: Dict[str, Any]):
+        while self._forgotten:
+            await self._drop_thread(self._forgotten.pop(), report)
+
+    # ── background task ──────────────────────────────────
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        next_full = loop.time() + self.interval if self.interval > 0 else None
+        while True:
+            timeout = max(0.0, next_full - loop.time()) if next_full is not None else None
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            self._wake.clear()
+            try:
+                if next_full is not None and loop.time() >= next_full:
+                    report = await self.collect()
+                    next_full = loop.time() + self.interval
+                    if any(report[kind] for kind in self.totals):
+                        print(f"GC reclaimed {report}")
+                else:
+                    async with self._lock:
+                        await self._collect_forgotten(self._report())
+            except Exception as e:
+                print(f"GC error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            if self._forgotten:
+                self._wake.set()
+            self._task = asyncio.create_task(self._loop())
+
+    @property
+    def running(self) -> bool:
+        """True while a full pass runs or waits for the lock."""
+        return self._collecting
+
+    def seconds_until(self, min_interval: float) -> float:
+        """Seconds until ``min_interval`` has passed since the last full pass started; 0 if it has."""
+        if self._started is None:
+            return 0.0
+        return max(0.0, self._started + min_interval - time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"totals": self.totals, "running": self._collecting,
+                "pending_threads": len(self._forgotten), "last": self.last}
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
@@ -0,0 +1,114 @@
+# backend/fanout.py  ─────────────────────────────────────────
+"""Helpers for the parallel ("fan-out") supervisor mode.
+
+With ``parallel_tool_calls`` the supervisor can hand off to several agents in
+one message. The prebuilt agent runs every tool call as its own task, and the
+first handoff that reaches the parent graph aborts the others, so only one
+agent would run. ``create_fanout_handoff_tool`` makes the first handoff of a
+message ``Send`` to every agent named in it, and those agents then run
+concurrently. ``ensure_citations`` makes sure every ``📌 출처`` line an agent
+returned in this turn survives the merged answer.
+"""
+import re, uuid
+from typing import Annotated, List, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.tools import BaseTool, InjectedToolCallId, tool
+from langgraph.prebuilt import InjectedState
+from langgraph.types import Command, Send
+from langgraph_supervisor.handoff import METADATA_KEY_HANDOFF_DESTINATION
+
+CITATION_MARKER = "📌 출처"
+HANDOFF_PREFIX = "transfer_to_"
+
+
+# ── 병렬 handoff ───────────────────────────────────────────
+def _handoff_branch(state: dict, message: AIMessage, call: dict) -> Send:
+    """``Send`` one agent the history plus only its own handoff call and result."""
+    agent = call["name"][len(HANDOFF_PREFIX):]
+    own_call = AIMessage(content=message.content, tool_calls=[call], name=message.name, id=str(uuid.uuid4()))
+    result = ToolMessage(
+        content=f"Successfully transferred to {agent}",
+        name=call["name"],
+        tool_call_id=call["id"],
+        response_metadata={METADATA_KEY_HANDOFF_DESTINATION: agent},
+    )
+    return Send(agent, {**state, "messages": state["messages"][:-1] + [own_call, result]})
+
+
+def create_fanout_handoff_tool(agent_name: str) -> BaseTool:
+    """Handoff tool that dispatches all handoffs of a multi-call message at once."""
+    name = f"{HANDOFF_PREFIX}{agent_name}"
+
+    @tool(name, description=f"Ask agent '{agent_name}' for help")
+    def handoff(
+        state: Annotated[dict, InjectedState],
+        tool_call_id: Annotated[str, InjectedToolCallId],
+    ):
+        message = state["messages"][-1]
+        calls = [c for c in message.tool_calls if c["name"].startswith(HANDOFF_PREFIX)]
+        if len(calls) <= 1:
+            result = ToolMessage(
+                content=f"Successfully transferred to {agent_name}",
+                name=name,
+                tool_call_id=tool_call_id,
+                response_metadata={METADATA_KEY_HANDOFF_DESTINATION: agent_name},
+            )
+            return Command(goto=agent_name, graph=Command.PARENT,
+                           update={**state, "messages": state["messages"] + [result]})
+        if tool_call_id != calls[0]["id"]:
+            # 첫 번째 handoff 가 모든 agent 를 한꺼번에 보낸다
+            return f"Successfully transferred to {agent_name}"
+        return Command(graph=Command.PARENT, goto=[_handoff_branch(state, message, c) for c in calls])
+
+    handoff.metadata = {METADATA_KEY_HANDOFF_DESTINATION: agent_name}
+    return handoff
+
+
+# ── 출처 보존 ───────────────────────────────────────────────
+def _norm(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+# 목록 항목으로 보는 줄: "- ", "* ", "• ", "1. ", "1) ", "[1]", 또는 URL
+_LIST_ITEM = re.compile(r"([-*•·]\s|\d+[.)]\s|\[\d+\]|https?://)")
+
+
+def _citation_lines(text: str) -> List[str]:
+    """The list right after the marker; it ends at the first blank or non-list line."""
+    idx = text.find(CITATION_MARKER)
+    if idx < 0:
+        return []
+    first, _, rest = text[idx + len(CITATION_MARKER):].partition("\n")
+    first = first.lstrip(":： \t").strip()
+    lines = [first] if first else []
+    for line in rest.splitlines():
+        line = line.strip()
+        if not line and not lines:
+            continue    # 표식 바로 뒤의 빈 줄
+        if not line or not _LIST_ITEM.match(line):
+            break
+        lines.append(line)
+    return lines
+
+
+def agent_citations(messages: List[BaseMessage], supervisor: str = "supervisor") -> List[str]:
+    """Citation lines from the agents' answers in the latest turn, in order."""
+    start = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+    lines: List[str] = []
+    for m in messages[start + 1:]:
+        if isinstance(m, AIMessage) and m.name and m.name != supervisor and not m.tool_calls:
+            for line in _citation_lines(m.content if isinstance(m.content, str) else ""):
+                if line not in lines:
+                    lines.append(line)
+    return lines
+
+
+def ensure_citations(answer: str, messages: List[BaseMessage]) -> Tuple[str, str]:
+    """Append agent citation lines the final answer dropped; returns ``(answer, appended)``."""
+    have = _norm(answer)
+    missing = [line for line in agent_citations(messages) if _norm(line) not in have]
+    if not missing:
+        return answer, ""
+    appended = f"\n\n{CITATION_MARKER}\n" + "\n".join(missing)
+    return answer + appended, appended
@@ -0,0 +1,295 @@
+# backend/history.py  ────────────────────────────────────────
+"""Token-budgeted conversation history for the supervisor graph.
+
+The checkpointed ``messages`` keep growing with every turn; ``HistoryManager``
+decides what the model actually sees. Used as a ``pre_model_hook`` it returns
+``llm_input_messages`` (the checkpoint itself is never rewritten):
+
+* the current turn is passed through untouched;
+* the last ``keep_turns`` finished turns are kept verbatim, minus handoff
+  chatter and with bulky tool outputs cut to ``tool_chars``;
+* everything older is folded into one rolling summary, cached by the hash of
+  the summarized prefix so each turn is summarized only once. A long uncached
+  backlog is folded in batches of at most ``fold_tokens``, and concurrent
+  hooks needing the same summary share one fold.
+"""
+import asyncio, contextvars, hashlib, json
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from tool_cache import TTLCache, _MISS
+
+try:  # 정확한 토큰 수 (없으면 글자 수 기반 추정)
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+HANDOFF_PREFIXES = ("transfer_to_", "transfer_back_to_")
+IMAGE_TOKENS = 765          # detail=auto 이미지 1장의 대략적인 비용
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and a team of "
+    "assistant agents. Merge the new turns into the existing summary. Keep the user's "
+    "goals, facts, numbers, decisions and any '📌 출처' sources; drop greetings and "
+    "process chatter. Answer with the updated summary only, in the conversation's language."
+)
+
+_request_usage: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar(
+    "history_request_usage", default=None
+)
+
+
+# ── 토큰 추정 ──────────────────────────────────────────────
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content or []:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            parts.append(part.get("text", ""))
+    return "\n".join(parts)
+
+
+def _image_count(content: Any) -> int:
+    if isinstance(content, str):
+        return 0
+    return sum(1 for p in content or [] if isinstance(p, dict) and p.get("type") == "image_url")
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return (len(text) + 2) // 3  # 한글이 섞인 텍스트 기준의 보수적 추정
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    total = 0
+    for m in messages:
+        total += MESSAGE_OVERHEAD + count_tokens(_text_of(m.content))
+        total += IMAGE_TOKENS * _image_count(m.content)
+        for call in getattr(m, "tool_calls", None) or []:
+            total += count_tokens(call["name"] + json.dumps(call.get("args", {}), ensure_ascii=False))
+    return total
+
+
+# ── 메시지 분류 ────────────────────────────────────────────
+def _is_handoff_name(name: Optional[str]) -> bool:
+    return bool(name) and name.startswith(HANDOFF_PREFIXES)
+
+
+def split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a human message."""
+    turns: List[List[BaseMessage]] = []
+    for m in messages:
+        if isinstance(m, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(m)
+    return turns
+
+
+def _turn_digest(turn: List[BaseMessage]) -> str:
+    raw = json.dumps([(m.type, m.name, _text_of(m.content)) for m in turn], ensure_ascii=False)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _turn_text(turn: List[BaseMessage], max_chars: int = 2000) -> str:
+    lines = []
+    for m in turn:
+        if isinstance(m, ToolMessage):
+            continue
+        text = _text_of(m.content).strip()
+        if isinstance(m, HumanMessage):
+            text += " [image]" * _image_count(m.content)
+            speaker = "User"
+        else:
+            speaker = m.name or "assistant"
+        if text and not text.startswith("Transferring back to"):
+            lines.append(f"{speaker}: {text[:max_chars]}")
+    return "\n".join(lines)
+
+
+class HistoryManager:
+    """Builds the model input for each supervisor/agent call within a token budget."""
+
+    def __init__(self, llm=None, keep_turns: int = 3, tool_chars: int = 2000,
+                 summary_chars: int = 4000, cache_size: int = 1024, cache_ttl: float = 86400.0,
+                 fold_tokens: int = 6000):
+        self.llm           = llm
+        self.keep_turns    = keep_turns
+        self.tool_chars    = tool_chars
+        self.summary_chars = summary_chars
+        self.fold_tokens   = fold_tokens
+        self.summaries     = TTLCache(cache_size, cache_ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.counters      = {"calls": 0, "tokens_in": 0, "tokens_out": 0, "summaries": 0,
+                              "summary_hits": 0, "summary_shared": 0}
+
+    # ── 최근 turn 정리 ──────────────────────────────────────
+    def _compact_turn(self, turn: List[BaseMessage]) -> List[BaseMessage]:
+        dropped_calls = set()
+        out: List[BaseMessage] = []
+        for m in turn:
+            calls = getattr(m, "tool_calls", None) or []
+            if isinstance(m, AIMessage) and calls and all(_is_handoff_name(c["name"]) for c in calls):
+                dropped_calls.update(c["id"] for c in calls)
+                text = _text_of(m.content).strip()
+                if text and not text.startswith("Transferring back to"):
+                    out.append(AIMessage(content=text, name=m.name))
+                continue
+            if isinstance(m, ToolMessage):
+                if m.tool_call_id in dropped_calls or _is_handoff_name(m.name):
+                    continue
+                text = _text_of(m.content)
+                if self.tool_chars and len(text) > self.tool_chars:
+                    m = m.model_copy(update={
+                        "content": text[:self.tool_chars] + f"\n…[{len(text) - self.tool_chars} chars omitted]",
+                        "artifact": None,
+                    })
+            out.append(m)
+        return out
+
+    # ── 오래된 turn 요약 ────────────────────────────────────
+    def _fallback_summary(self, previous: str, text: str) -> str:
+        merged = f"{previous}\n{text}".strip()
+        return merged[-self.summary_chars:]
+
+    async def _fold(self, previous: str, turns: List[List[BaseMessage]]) -> str:
+        text = "\n\n".join(filter(None, (_turn_text(t) for t in turns)))
+        if self.llm is None:
+            return self._fallback_summary(previous, text)
+        try:
+            # 요약 호출은 callbacks 없이 실행해 스트림(on_chat_model_stream)에 섞이지 않게 한다
+            result = await self.llm.ainvoke(
+                [SystemMessage(SUMMARY_PROMPT),
+                 HumanMessage(f"Existing summary:\n{previous or '(none)'}\n\nNew turns:\n{text}")],
+                config={"callbacks": [], "run_name": "history_summary"},
+            )
+            self.counters["summaries"] += 1
+            return _text_of(result.content).strip()[:self.summary_chars]
+        except Exception as e:
+            print(f"History summary error: {e}")
+            return self._fallback_summary(previous, text)
+
+    def _batches(self, turns: List[List[BaseMessage]], start: int):
+        """Split ``turns[start:]`` into ``(start, end)`` ranges of at most ``fold_tokens``."""
+        end, size = start, 0
+        while end < len(turns):
+            tokens = count_tokens(_turn_text(turns[end]))
+            if end > start and self.fold_tokens > 0 and size + tokens > self.fold_tokens:
+                yield start, end
+                start, size = end, 0
+            end, size = end + 1, size + tokens
+        if end > start:
+            yield start, end
+
+    async def _summarize_uncached(self, turns: List[List[BaseMessage]], keys: List[str]) -> str:
+        start, summary = 0, ""
+        for i in range(len(keys), 0, -1):
+            cached = self.summaries.get(keys[i - 1])
+            if cached is not _MISS:
+                start, summary = i, cached
+                break
+        # batch 마다 prefix 요약을 캐시해 두면 중간에 취소돼도 이어서 진행된다
+        for lo, hi in self._batches(turns, start):
+            summary = await self._fold(summary, turns[lo:hi])
+            self.summaries.set(keys[hi - 1], summary)
+        return summary
+
+    async def summarize(self, turns: List[List[BaseMessage]]) -> str:
+        """Rolling summary of ``turns``, reusing the longest cached prefix."""
+        keys, h = [], ""
+        for turn in turns:
+            h = hashlib.sha1((h + _turn_digest(turn)).encode()).hexdigest()
+            keys.append(h)
+        key = keys[-1]
+        cached = self.summaries.get(key)
+        if cached is not _MISS:
+            self.counters["summary_hits"] += 1
+            return cached
+
+        while (pending := self._inflight.get(key)) is not None:
+            self.counters["summary_shared"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # 요약을 만들던 hook 만 취소됐으면 이 호출이 이어받는다
+                if asyncio.current_task().cancelling() or not pending.cancelled():
+                    raise
+        pending = asyncio.get_running_loop().create_future()
+        pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = pending
+        try:
+            summary = await self._summarize_uncached(turns, keys)
+            pending.set_result(summary)
+            return summary
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    # ── pre_model_hook ──────────────────────────────────────
+    async def prepare(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        turns = split_turns(list(messages))
+        if len(turns) <= 1:
+            return list(messages)
+        *finished, current = turns
+        keep = finished[-self.keep_turns:] if self.keep_turns > 0 else []
+        older = finished[:len(finished) - len(keep)]
+
+        out: List[BaseMessage] = []
+        if older:
+            summary = await self.summarize(older)
+            if summary:
+                out.append(SystemMessage(f"Summary of the earlier conversation:\n{summary}"))
+        for turn in keep:
+            out.extend(self._compact_turn(turn))
+        out.extend(current)
+        return out
+
+    async def hook(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        messages = state["messages"]
+        prepared = await self.prepare(messages)
+        before, after = estimate_tokens(messages), estimate_tokens(prepared)
+        self.counters["calls"] += 1
+        self.counters["tokens_in"] += before
+        self.counters["tokens_out"] += after
+        usage = _request_usage.get()
+        if usage is not None:
+            usage["calls"] += 1
+            usage["full"] += before
+            usage["sent"] += after
+        return {"llm_input_messages": prepared}
+
+    # ── 요청 단위 로그 ──────────────────────────────────────
+    def begin_request(self) -> Dict[str, int]:
+        """Start counting model-input tokens for the current request (context-local)."""
+        usage = {"calls": 0, "full": 0, "sent": 0}
+        _request_usage.set(usage)
+        return usage
+
+    def log_request(self, thread_id: str, usage: Dict[str, int]):
+        if not usage["calls"]:
+            return
+        saved = usage["full"] - usage["sent"]
+        pct = 100 * saved / usage["full"] if usage["full"] else 0.0
+        print(
+            f"History tokens [{thread_id}]: {usage['calls']} model calls, "
+            f"~{usage['sent']} sent of ~{usage['full']} ({pct:.0f}% saved)"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.counters["tokens_in"]
+        return {
+            **self.counters,
+            "cached_summaries": len(self.summaries),
+            "saved_ratio": round(1 - self.counters["tokens_out"] / total, 4) if total else 0.0,
+        }
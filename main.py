@@ -1,120 +1,352 @@
 # backend/main.py  ───────────────────────────────────────────
-import os, uuid, datetime as dt, hmac, hashlib, base64, asyncio, json
+import os, io, uuid, datetime as dt, hmac, hashlib, base64, asyncio, json, contextlib, time
+from collections import OrderedDict
 from sqlalchemy import inspect
 from typing import List, Optional, Dict, Any
 from urllib.parse import urlparse
+from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, Depends, Header, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from sqlalchemy import (
-    create_engine, Column, String, DateTime, ForeignKey, select, delete
+    create_engine, event, Column, String, DateTime, ForeignKey, Index, select, delete, update,
+    and_, or_, text, literal_column,
 )
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship, Session
+from sqlalchemy.orm import declarative_base, relationship, selectinload, defer
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from dotenv import load_dotenv, find_dotenv
-import nest_asyncio
 import aiosqlite
 
+try:  # 비전 입력 축소/재압축용 (없으면 원본 그대로 전송)
+    from PIL import ExifTags, Image, ImageOps
+except ImportError:
+    Image = None
+
 # ── LangChain / OpenAI ─────────────────────────────────────
-from openai import OpenAI
-from langchain_openai import ChatOpenAI
-from langgraph.prebuilt import create_react_agent
-from langchain_experimental.tools.python.tool import PythonREPLTool
-from langchain_core.messages import HumanMessage
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
-from langchain_core.runnables import RunnableConfig
-from graphparser.rag_tool import make_rag_tool
-from pathlib import Path
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_tavily import TavilySearch
-from langgraph_supervisor import create_supervisor
+# LangChain/LangGraph/OpenAI 등 무거운 모듈은 lifespan 의 build 단계에서 지연 import
+from sandbox import SandboxPool
+from streaming import StreamRegistry, StreamRun, FORMATTERS, MEDIA_TYPES, negotiate_format
+from scheduler import FairScheduler, Rejected, Ticket, parse_weights
+from collector import Collector, ensure_indexes
+from search import ensure_fts, owner_key, parse_terms, search_params, snippet
+from metrics import MetricsRegistry, RATE_BUCKETS, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # ── 기본 설정 ───────────────────────────────────────────────
 load_dotenv(find_dotenv())
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") or "YOUR_KEY"
 APP_SECRET     = os.getenv("APP_SECRET",  "change-me")
 
+# /chat, /chat/stream 동시 실행 제한 (graph run 수, 대기열 길이, 대기 시간 초)
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "8"))
+CHAT_MAX_QUEUE       = int(os.getenv("CHAT_MAX_QUEUE", "32"))
+CHAT_QUEUE_TIMEOUT   = float(os.getenv("CHAT_QUEUE_TIMEOUT", "30"))
+CHAT_RETRY_AFTER     = int(os.getenv("CHAT_RETRY_AFTER", "5"))
+# 사용자별 quota (분당 요청 수, 순간 허용 요청 수, 분당 추정 토큰 수; 0 이면 제한 없음)
+SCHED_USER_RPM       = float(os.getenv("SCHED_USER_RPM", "30"))
+SCHED_USER_BURST     = float(os.getenv("SCHED_USER_BURST", "10"))
+SCHED_USER_TPM       = float(os.getenv("SCHED_USER_TPM", "300000"))
+# 한 turn 의 추정 모델 입력 토큰 (질문 길이에 더함), 사용자별 가중치 (예: "alice=2,bob=0.5")
+SCHED_TURN_TOKENS    = int(os.getenv("SCHED_TURN_TOKENS", "4000"))
+SCHED_WEIGHTS        = os.getenv("SCHED_WEIGHTS", "")
+
+# 대화 DB 쓰기 설정 (write-behind 사용 여부, 배치 크기, flush 주기 초)
+DB_WRITE_BEHIND    = os.getenv("DB_WRITE_BEHIND", "0") == "1"
+DB_WRITE_BATCH     = int(os.getenv("DB_WRITE_BATCH", "64"))
+DB_FLUSH_INTERVAL  = float(os.getenv("DB_FLUSH_INTERVAL", "0.05"))
+
+# /messages 페이지 크기 (기본값, 최대값)
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "100"))
+MESSAGES_PAGE_MAX  = int(os.getenv("MESSAGES_PAGE_MAX", "500"))
+# /threads 페이지 크기 (기본값, 최대값)
+THREADS_PAGE_SIZE  = int(os.getenv("THREADS_PAGE_SIZE", "100"))
+THREADS_PAGE_MAX   = int(os.getenv("THREADS_PAGE_MAX", "500"))
+# /search 페이지 크기 (기본값, 최대값), 관련도 정렬 대상 (최신 매치 수)
+SEARCH_PAGE_SIZE   = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_PAGE_MAX    = int(os.getenv("SEARCH_PAGE_MAX", "100"))
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "1000"))
+
+# RS 검색 결과 캐시 (항목 수, TTL 초, 영구 tier 경로, 인덱스 버전)
+RAG_CACHE_SIZE    = int(os.getenv("RAG_CACHE_SIZE", "512"))
+RAG_CACHE_TTL     = float(os.getenv("RAG_CACHE_TTL", "86400"))
+RAG_CACHE_DB      = os.getenv("RAG_CACHE_DB", "")
+RAG_CACHE_VERSION = os.getenv("RAG_CACHE_VERSION", "1")
+
+# 웹 검색 (backend: tavily | stub, 캐시 항목 수/TTL 초, raw_content 최대 글자 수)
+WEB_SEARCH_BACKEND    = os.getenv("WEB_SEARCH_BACKEND", "tavily")
+WEB_CACHE_SIZE        = int(os.getenv("WEB_CACHE_SIZE", "256"))
+WEB_CACHE_TTL         = float(os.getenv("WEB_CACHE_TTL", "300"))
+WEB_RAW_CONTENT_CHARS = int(os.getenv("WEB_RAW_CONTENT_CHARS", "3000"))
+
+# coder agent Python 실행 (sandbox | repl, worker 수, 실행당 제한 시간 초/메모리 MB)
+PYTHON_TOOL       = os.getenv("PYTHON_TOOL", "sandbox")
+SANDBOX_WORKERS   = int(os.getenv("SANDBOX_WORKERS", "2"))
+SANDBOX_TIMEOUT   = float(os.getenv("SANDBOX_TIMEOUT", "30"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "1024"))
+
+# LangGraph checkpoint 저장소 (pooled | single, reader 연결 수, thread 당 보관 checkpoint 수(0=전부),
+# compaction 주기 초, VACUUM 을 실행할 빈 페이지 비율)
+CHECKPOINT_DB               = os.getenv("CHECKPOINT_DB", "lg.sqlite")
+CHECKPOINT_MODE             = os.getenv("CHECKPOINT_MODE", "pooled")
+CHECKPOINT_READERS          = int(os.getenv("CHECKPOINT_READERS", "4"))
+CHECKPOINT_KEEP_LAST        = int(os.getenv("CHECKPOINT_KEEP_LAST", "20"))
+CHECKPOINT_COMPACT_INTERVAL = float(os.getenv("CHECKPOINT_COMPACT_INTERVAL", "600"))
+CHECKPOINT_VACUUM_RATIO     = float(os.getenv("CHECKPOINT_VACUUM_RATIO", "0.3"))
+
+# 고아 메시지/이미지/파일/checkpoint 정리 (전체 pass 주기 초(0=요청 시에만), 배치 크기,
+# 배치 사이 쉬는 시간 초, 참조 없는 업로드 파일을 남겨 두는 시간 초)
+GC_INTERVAL   = float(os.getenv("GC_INTERVAL", "3600"))
+GC_BATCH      = int(os.getenv("GC_BATCH", "200"))
+GC_PAUSE      = float(os.getenv("GC_PAUSE", "0.05"))
+GC_FILE_GRACE = float(os.getenv("GC_FILE_GRACE", "86400"))
+# POST /gc 를 부를 수 있는 사용자 (쉼표 구분, 비우면 비활성)와 pass 사이 최소 간격 초
+GC_ADMINS       = {u.strip() for u in os.getenv("GC_ADMINS", "").split(",") if u.strip()}
+GC_MIN_INTERVAL = float(os.getenv("GC_MIN_INTERVAL", "600"))
+
+# /chat/stream 이벤트 스트림 (token 묶음 시간 ms/크기 bytes, run 당 ring buffer 크기,
+# 종료 후 재접속 허용 시간 초, heartbeat 주기 초)
+STREAM_COALESCE_MS    = float(os.getenv("STREAM_COALESCE_MS", "30"))
+STREAM_COALESCE_BYTES = int(os.getenv("STREAM_COALESCE_BYTES", "256"))
+STREAM_BUFFER_EVENTS  = int(os.getenv("STREAM_BUFFER_EVENTS", "4096"))
+STREAM_RUN_TTL        = float(os.getenv("STREAM_RUN_TTL", "300"))
+STREAM_HEARTBEAT      = float(os.getenv("STREAM_HEARTBEAT", "15"))
+# 읽는 client 가 없어진 run 을 취소하기까지 기다리는 시간 초 (재접속 여유)
+STREAM_CANCEL_GRACE   = float(os.getenv("STREAM_CANCEL_GRACE", "10"))
+
+# supervisor 실행 방식 (sequential: 한 번에 한 agent | parallel: 독립적인 agent 들을 동시에 호출)
+SUPERVISOR_MODE = os.getenv("SUPERVISOR_MODE", "sequential")
+
+# 모델에 보내는 대화 이력 (budget | full, 원문 유지 turn 수, tool 출력 최대 글자 수,
+# 오래된 turn 요약 방식 llm | extractive, 요약 최대 글자 수, 요약 캐시 항목 수,
+# 요약 호출 1회에 넣는 turn 토큰 수)
+HISTORY_MODE          = os.getenv("HISTORY_MODE", "budget")
+HISTORY_KEEP_TURNS    = int(os.getenv("HISTORY_KEEP_TURNS", "3"))
+HISTORY_TOOL_CHARS    = int(os.getenv("HISTORY_TOOL_CHARS", "2000"))
+HISTORY_SUMMARIZER    = os.getenv("HISTORY_SUMMARIZER", "llm")
+HISTORY_SUMMARY_CHARS = int(os.getenv("HISTORY_SUMMARY_CHARS", "4000"))
+HISTORY_SUMMARY_CACHE = int(os.getenv("HISTORY_SUMMARY_CACHE", "1024"))
+HISTORY_FOLD_TOKENS   = int(os.getenv("HISTORY_FOLD_TOKENS", "6000"))
+
 # Directory to store uploaded images
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "images")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+UPLOAD_MAX_BYTES  = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_FORM_SLACK = 64 * 1024    # multipart 경계/헤더 몫 (본문 전체 한도 = 파일 한도 + slack)
+
+# 비전 요청용 이미지 준비 (payload 캐시 크기, 긴 변 최대 px, 재압축 형식/품질)
+IMAGE_CACHE_BYTES      = int(os.getenv("IMAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+IMAGE_MAX_EDGE         = int(os.getenv("IMAGE_MAX_EDGE", "1568"))
+IMAGE_FORMAT           = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY          = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_RECOMPRESS_BYTES = int(os.getenv("IMAGE_RECOMPRESS_BYTES", str(1024 * 1024)))
+# coder agent 차트 저장 형식 (PNG | WEBP, WEBP 는 Pillow 필요)
+CHART_FORMAT           = os.getenv("CHART_FORMAT", "PNG").upper()
+
+# System Agent (Head 설정) - FIXED PROMPT
+SUPERVISOR_PROMPT = (
+    "You are the team supervisor. Your job is to orchestrate multiple specialist agents to achieve the user's goal.\n"
+    "\n"
+    "There are three subordinate agents you can delegate tasks to:\n"
+    "• research_agent — use this when you need information in the reliability or quality‑engineering domain.\n"
+    "• websearcher_agent — use this when you need up‑to‑date information such as breaking news or other recent web content.\n"
+    "• coder_agent — use this when you need to write or execute code, do calculations, or create visualizations.\n"
+    "\n"
+    "Workflow rules:\n"
+    "1. Decide which agent(s) to call and in what order.\n"
+    "2. After an agent returns, carefully read its answer. **If the answer contains a citation or '📌 출처' block, you must preserve it verbatim in your final reply.**\n"
+    "3. If an agent omits citations when they are required (e.g. research_agent answer without '📌 출처'), ask that agent once more for the sources, then include them.\n"
+    "4. When you have enough information, compile a comprehensive final answer in Korean.\n"
+    "5. **IMPORTANT**: Only output your final consolidated answer. Do not repeat or echo the individual agent responses.\n"
+    "6. Keep any citation blocks exactly as given (do not paraphrase or remove them).\n"
+    "\n"
+    "Always follow these rules. Never invent citations. Provide only ONE final response, not multiple responses."
+)
+# SUPERVISOR_MODE=parallel 일 때 덧붙이는 규칙
+PARALLEL_SUPERVISOR_RULES = (
+    "\n\nParallel delegation:\n"
+    "• When a question needs several agents whose work does not depend on each other "
+    "(e.g. reliability documents AND recent web information), call all of their transfer tools "
+    "in the SAME response so they run at the same time.\n"
+    "• Only delegate one after another when an agent needs another agent's result.\n"
+    "• Merge the returned answers into one reply and keep every '📌 출처' line from every agent."
+)
+
+# ── Runtime (LLM, 도구, 그래프) ────────────────────────────
+class AppContext:
+    """Heavy runtime objects, built once per worker process by the app lifespan.
+
+    Anything already set before startup (e.g. a fake ``llm`` or tool) is kept,
+    so tests and benchmarks can swap components without touching the builders.
+    """
+
+    def __init__(self):
+        self.llm              = None
+        self.python_repl_tool = None
+        self.rag_search_tool  = None
+        self.tavily_tool      = None
+        self.rag_cache        = None
+        self.web_cache        = None
+        self.history          = None
+        self.checkpointer     = None
+        self.simple_agent     = None
+        self.sandbox_pool     = SandboxPool(SANDBOX_WORKERS, SANDBOX_TIMEOUT, SANDBOX_MEMORY_MB)
+        self.startup_ms: Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_ms[name] = round((time.perf_counter() - t0) * 1000, 1)
+
+runtime = AppContext()
 
 # ── LLM 준비 ────────────────────────────────────────────────
-client = OpenAI(api_key=OPENAI_API_KEY)
-llm    = ChatOpenAI(model="gpt-4.1-mini", temperature=0)
+def _build_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model="gpt-4.1-mini", temperature=0)
 
 ### ── Tool 설정 ──────────────────────────────────────── ###
-# ── Python REPL 도구 ────────────────────────────────────────
-python_repl_tool = PythonREPLTool()
-# ── RAG 검색 도구 ────────────────────────────────────────
-rag_search_tool = make_rag_tool("RS")
-# ── 웹 검색 도구 ────────────────────────────────────────
-tavily_tool=TavilySearch(max_results=5,topic="general",include_raw_content=True)
+def _build_tools(rt: AppContext):
+    from tool_cache import (
+        ToolResultCache, cached_tool, compact_search_results, is_search_result, make_stub_search_tool
+    )
+    # ── Python REPL 도구 ────────────────────────────────────
+    # 기본은 별도 프로세스 풀에서 실행 (GIL/이벤트 루프를 막지 않고, 시간/메모리 제한)
+    if rt.python_repl_tool is None:
+        if PYTHON_TOOL == "repl":
+            from langchain_experimental.tools.python.tool import PythonREPLTool
+            rt.python_repl_tool = PythonREPLTool()
+        else:
+            from sandbox import make_sandbox_tool
+            rt.python_repl_tool = make_sandbox_tool(rt.sandbox_pool, _write_chart_bytes)
+    # ── RAG 검색 도구 ────────────────────────────────────────
+    # 같은 질의(정규화 기준)는 임베딩/벡터 검색 없이 캐시에서 응답
+    if rt.rag_search_tool is None:
+        from graphparser.rag_tool import make_rag_tool
+        rt.rag_cache = ToolResultCache(
+            f"RS:{RAG_CACHE_VERSION}", RAG_CACHE_SIZE, RAG_CACHE_TTL, RAG_CACHE_DB or None
+        )
+        rt.rag_search_tool = cached_tool(make_rag_tool("RS"), rt.rag_cache)
+    # ── 웹 검색 도구 ────────────────────────────────────────
+    # 동일 질의는 진행 중인 호출을 공유(single-flight)하고 짧게 캐시 (오류 응답은 제외), raw_content 는 축약
+    if rt.tavily_tool is None:
+        if WEB_SEARCH_BACKEND == "stub":
+            web_search_backend = make_stub_search_tool()
+        else:
+            from langchain_tavily import TavilySearch
+            web_search_backend = TavilySearch(max_results=5,topic="general",include_raw_content=True)
+        rt.web_cache = ToolResultCache(
+            f"{web_search_backend.name}:general:5:raw:{WEB_RAW_CONTENT_CHARS}", WEB_CACHE_SIZE, WEB_CACHE_TTL
+        )
+        rt.tavily_tool = cached_tool(
+            web_search_backend, rt.web_cache, single_flight=True,
+            transform=lambda result: compact_search_results(result, WEB_RAW_CONTENT_CHARS),
+            cacheable=is_search_result,
+        )
 
 ### ── Prompt 설정 ──────────────────────────────────────── ###
-reliability_searcher_text = Path("./prompts/reliability_searcher.md").read_text()
-reliability_searcher_prompt = ChatPromptTemplate.from_messages([
-    ("system", reliability_searcher_text),  
-    MessagesPlaceholder(variable_name="messages")
-])
-coder_text = Path("./prompts/coder.md").read_text()
-coder_prompt = ChatPromptTemplate.from_messages([
-    ("system", coder_text),  
-    MessagesPlaceholder(variable_name="messages")
-])
-websearcher_text = Path("./prompts/websearcher.md").read_text()
-websearcher_prompt = ChatPromptTemplate.from_messages([
-    ("system", websearcher_text),  
-    MessagesPlaceholder(variable_name="messages")
-])
-
-### ── Agent 설정 ──────────────────────────────────────── ###
-reliability_searcher_agent = create_react_agent(llm, tools=[rag_search_tool],prompt=reliability_searcher_prompt, name='reliability_searcher')
-coder_agent = create_react_agent(model=llm,tools=[python_repl_tool],prompt=coder_prompt, name="coder")
-websearcher_agent = create_react_agent(model= llm, tools=[tavily_tool], prompt=websearcher_prompt, name='websearcher')
-
-# ── Checkpointer 설정 ───────────────────────────────────────
-async def _init_saver(db_path: str = "lg.sqlite") -> AsyncSqliteSaver:
-    conn = await aiosqlite.connect(db_path)
-    return AsyncSqliteSaver(conn)
+def _read_prompts() -> Dict[str, str]:
+    return {
+        name: Path(f"./prompts/{name}.md").read_text()
+        for name in ("reliability_searcher", "coder", "websearcher")
+    }
 
-try:
-    # asyncio.run() 는 이미 루프가 돌아가는 환경에서는 오류를 던지므로 예외 처리
-    checkpointer = asyncio.run(_init_saver())
-except RuntimeError:
-    nest_asyncio.apply()
-    checkpointer = asyncio.get_event_loop().run_until_complete(_init_saver())
+### ── Agent / Graph 설정 ──────────────────────────────── ###
+def _build_graph(rt: AppContext, prompt_texts: Dict[str, str], mode: str = SUPERVISOR_MODE):
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    from langgraph.prebuilt import create_react_agent
+    from langgraph_supervisor import create_supervisor
+
+    def _prompt(name: str):
+        return ChatPromptTemplate.from_messages([
+            ("system", prompt_texts[name]),
+            MessagesPlaceholder(variable_name="messages")
+        ])
+
+    llm = rt.llm
+    # 이력 관리: 최근 turn 만 원문, 나머지는 요약 (checkpoint 는 그대로 두고 모델 입력만 줄임)
+    if rt.history is None and HISTORY_MODE != "full":
+        from history import HistoryManager
+        rt.history = HistoryManager(
+            llm if HISTORY_SUMMARIZER == "llm" else None,
+            keep_turns=HISTORY_KEEP_TURNS,
+            tool_chars=HISTORY_TOOL_CHARS,
+            summary_chars=HISTORY_SUMMARY_CHARS,
+            cache_size=HISTORY_SUMMARY_CACHE,
+            fold_tokens=HISTORY_FOLD_TOKENS,
+        )
+    hook = rt.history.hook if rt.history is not None else None
+    parallel = mode == "parallel"
+    handoff_tools = None
+    if parallel:
+        # 한 메시지의 handoff 들을 하나의 Command 로 묶어 agent 들을 동시에 실행
+        from fanout import create_fanout_handoff_tool
+        handoff_tools = [create_fanout_handoff_tool(name) for name in ("reliability_searcher", "websearcher", "coder")]
+
+    reliability_searcher_agent = create_react_agent(llm, tools=[rt.rag_search_tool],prompt=_prompt("reliability_searcher"), name='reliability_searcher', pre_model_hook=hook)
+    coder_agent = create_react_agent(model=llm,tools=[rt.python_repl_tool],prompt=_prompt("coder"), name="coder", pre_model_hook=hook)
+    websearcher_agent = create_react_agent(model= llm, tools=[rt.tavily_tool], prompt=_prompt("websearcher"), name='websearcher', pre_model_hook=hook)
+
+    workflow = create_supervisor(
+        [reliability_searcher_agent, websearcher_agent, coder_agent],
+        model=llm,
+        prompt=SUPERVISOR_PROMPT + (PARALLEL_SUPERVISOR_RULES if parallel else ""),
+        tools=handoff_tools,
+        add_handoff_back_messages=True,
+        parallel_tool_calls=parallel,
+        pre_model_hook=hook,
+    )
+    return workflow.compile(checkpointer = rt.checkpointer)
 
-# System Agent (Head 설정) - FIXED PROMPT
-app = create_supervisor(
-    [reliability_searcher_agent, websearcher_agent, coder_agent],
-    model=llm,
-    prompt=(
-        "You are the team supervisor. Your job is to orchestrate multiple specialist agents to achieve the user's goal.\n"
-        "\n"
-        "There are three subordinate agents you can delegate tasks to:\n"
-        "• research_agent — use this when you need information in the reliability or quality‑engineering domain.\n"
-        "• websearcher_agent — use this when you need up‑to‑date information such as breaking news or other recent web content.\n"
-        "• coder_agent — use this when you need to write or execute code, do calculations, or create visualizations.\n"
-        "\n"
-        "Workflow rules:\n"
-        "1. Decide which agent(s) to call and in what order.\n"
-        "2. After an agent returns, carefully read its answer. **If the answer contains a citation or '📌 출처' block, you must preserve it verbatim in your final reply.**\n"
-        "3. If an agent omits citations when they are required (e.g. research_agent answer without '📌 출처'), ask that agent once more for the sources, then include them.\n"
-        "4. When you have enough information, compile a comprehensive final answer in Korean.\n"
-        "5. **IMPORTANT**: Only output your final consolidated answer. Do not repeat or echo the individual agent responses.\n"
-        "6. Keep any citation blocks exactly as given (do not paraphrase or remove them).\n"
-        "\n"
-        "Always follow these rules. Never invent citations. Provide only ONE final response, not multiple responses."
-    ),add_handoff_back_messages=True
-)
-simple_agent = app.compile(checkpointer = checkpointer)
+# ── Checkpointer 설정 ───────────────────────────────────────
+async def _open_checkpointer(stack: contextlib.AsyncExitStack, db_path: str = CHECKPOINT_DB):
+    if CHECKPOINT_MODE == "single":
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        conn = await aiosqlite.connect(db_path)
+        stack.push_async_callback(conn.close)
+        return AsyncSqliteSaver(conn)
+
+    from checkpoint_store import PooledSqliteSaver
+    saver = await PooledSqliteSaver.open(
+        db_path,
+        readers=CHECKPOINT_READERS,
+        keep_last=CHECKPOINT_KEEP_LAST,
+        compact_interval=CHECKPOINT_COMPACT_INTERVAL,
+        vacuum_ratio=CHECKPOINT_VACUUM_RATIO,
+    )
+    stack.push_async_callback(saver.aclose)
+    saver.start()
+    return saver
 
 # ── DB (SQLite, SQLAlchemy ORM) ────────────────────────────
 Base   = declarative_base()
-engine = create_engine("sqlite:///chat.db", connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+# 동기 engine 은 스키마 생성/마이그레이션 전용, 요청 처리는 async engine 사용
+engine       = create_engine("sqlite:///chat.db", connect_args={"check_same_thread": False})
+async_engine = create_async_engine("sqlite+aiosqlite:///chat.db")
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",      # 읽기와 쓰기가 서로 막지 않도록
+    "synchronous=NORMAL",    # WAL 에서는 NORMAL 로도 충분히 안전
+    "busy_timeout=5000",
+    "cache_size=-20000",     # 약 20MB page cache
+    "temp_store=MEMORY",
+    "mmap_size=268435456",
+)
+
+def _apply_sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cur.execute(f"PRAGMA {pragma}")
+    cur.close()
+
+event.listen(engine, "connect", _apply_sqlite_pragmas)
+event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
 
 
 class Thread(Base):
@@ -123,8 +355,12 @@ class Thread(Base):
     user_id  = Column(String, index=True)
     title    = Column(String, default="새 대화")
     created  = Column(DateTime, default=dt.datetime.utcnow)
+    updated  = Column(DateTime, default=dt.datetime.utcnow)  # 마지막 활동 시각
     messages = relationship("Message", cascade="all,delete")
 
+    # 사용자별 최근 활동순 목록/keyset 페이지네이션용
+    __table_args__ = (Index("ix_threads_user_updated", "user_id", "updated"),)
+
 class Message(Base):
     __tablename__ = "messages"
     id        = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -133,8 +369,13 @@ class Message(Base):
     content   = Column(String)
     ts        = Column(DateTime, default=dt.datetime.utcnow)
     steps     = Column(String)
+    status    = Column(String)   # None(완료) | "cancelled"
+    owner_key = Column(String)   # search.owner_key(threads.user_id), 검색 범위용
     images    = relationship("MessageImage", cascade="all,delete", back_populates="message")
 
+    # 스레드별 시간순 조회/keyset 페이지네이션용
+    __table_args__ = (Index("ix_messages_thread_ts", "thread_id", "ts"),)
+
 class MessageImage(Base):
     __tablename__ = "message_images"
     id         = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -142,7 +383,8 @@ class MessageImage(Base):
     url        = Column(String)  # image URL
     message    = relationship("Message", back_populates="images")
 
-Base.metadata.create_all(engine)
+    # 메시지별 이미지 조회/정리용
+    __table_args__ = (Index("ix_message_images_message", "message_id"),)
 
 def _ensure_schema():
     """Add missing columns to existing tables if the database is from an older version."""
@@ -152,22 +394,187 @@ def _ensure_schema():
         if "url" not in cols:
             with engine.begin() as conn:
                 conn.exec_driver_sql("ALTER TABLE message_images ADD COLUMN url TEXT")
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS ix_message_images_message ON message_images (message_id)"
+            )
+    if "threads" in inspector.get_table_names():
+        cols = [col["name"] for col in inspector.get_columns("threads")]
+        if "updated" not in cols:
+            with engine.begin() as conn:
+                conn.exec_driver_sql("ALTER TABLE threads ADD COLUMN updated DATETIME")
+                conn.exec_driver_sql(
+                    "UPDATE threads SET updated = COALESCE("
+                    "(SELECT MAX(ts) FROM messages WHERE messages.thread_id = threads.id), created)"
+                )
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS ix_threads_user_updated ON threads (user_id, updated)"
+            )
     if "messages" in inspector.get_table_names():
         cols = [col["name"] for col in inspector.get_columns("messages")]
         if "steps" not in cols:
             with engine.begin() as conn:
                 conn.exec_driver_sql("ALTER TABLE messages ADD COLUMN steps TEXT")
+        if "status" not in cols:
+            with engine.begin() as conn:
+                conn.exec_driver_sql("ALTER TABLE messages ADD COLUMN status TEXT")
+        if "owner_key" not in cols:
+            with engine.begin() as conn:
+                conn.exec_driver_sql("ALTER TABLE messages ADD COLUMN owner_key TEXT")
+        # create_all 은 기존 테이블에 새 인덱스를 만들지 않는다
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS ix_messages_thread_ts ON messages (thread_id, ts)"
+            )
 
-_ensure_schema()
+def _init_schema():
+    Base.metadata.create_all(engine)
+    _ensure_schema()
+    with engine.begin() as conn:
+        if ensure_fts(conn):
+            print("Built full-text index for messages")
+        ensure_indexes(conn)
 
 # ── DB 세션 의존성 ─────────────────────────────────────────
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+# ── Write-behind 메시지 저장 ───────────────────────────────
+class MessageWriter:
+    """Batch Message/MessageImage inserts from many streams into one transaction.
+
+    ``submit`` only enqueues; a background task drains the queue every
+    ``flush_interval`` seconds (or as soon as ``max_batch`` turns are pending)
+    and commits them together. A failing batch is retried turn by turn so one
+    bad row does not drop the others.
+    """
+
+    def __init__(self, sessionmaker, max_batch: int = 64, flush_interval: float = 0.05,
+                 max_pending: int = 1024):
+        self._sessionmaker  = sessionmaker
+        self.max_batch      = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending    = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(self.max_pending)
+            self._task = asyncio.create_task(self._run())
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, objs: List[Any], on_commit=None):
+        self.start()
+        await self._queue.put((objs, on_commit))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _flush(self, batch: List[tuple]):
+        try:
+            async with self._sessionmaker() as db:
+                with DB_COMMIT_SECONDS.time("batch"):
+                    for objs, _ in batch:
+                        await _add_turn(db, objs)
+                    await db.commit()
+            for _, on_commit in batch:
+                if on_commit:
+                    on_commit()
+            return
+        except Exception as e:
+            print(f"Write-behind batch error: {e}")
+        for objs, on_commit in batch:
+            try:
+                async with self._sessionmaker() as db:
+                    with DB_COMMIT_SECONDS.time("retry"):
+                        await _add_turn(db, objs)
+                        await db.commit()
+                if on_commit:
+                    on_commit()
+            except Exception as e:
+                print(f"Write-behind insert error: {e}")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+message_writer = MessageWriter(AsyncSessionLocal, DB_WRITE_BATCH, DB_FLUSH_INTERVAL)
+
+# ── 백그라운드 정리 (collector.py) ─────────────────────────
+collector = Collector(
+    async_engine, UPLOAD_DIR, lambda: runtime.checkpointer,
+    batch=GC_BATCH, pause=GC_PAUSE, file_grace=GC_FILE_GRACE, interval=GC_INTERVAL,
+)
+
+async def _add_turn(db: AsyncSession, objs: List[Any]):
+    """Add a turn's rows and bump the owning threads' activity time."""
+    db.add_all(objs)
+    tids = {o.thread_id for o in objs if isinstance(o, Message)}
+    if tids:
+        await db.execute(
+            update(Thread).where(Thread.id.in_(tids)).values(updated=dt.datetime.utcnow())
+        )
+
+async def persist_messages(objs: List[Any], user: Optional[str] = None):
+    """Store a finished turn, through the write-behind queue when enabled.
+
+    ``user``'s thread-list version is bumped only once the rows are committed,
+    so a fresh ETag never points at data that is not yet visible.
+    """
+    on_commit = (lambda: bump_thread_version(user)) if user else None
+    if user:
+        for obj in objs:
+            if isinstance(obj, Message):
+                obj.owner_key = owner_key(user)
+    if DB_WRITE_BEHIND:
+        await message_writer.submit(objs, on_commit)
+        return
+    async with AsyncSessionLocal() as db:
+        with DB_COMMIT_SECONDS.time("direct"):
+            await _add_turn(db, objs)
+            await db.commit()
+    if on_commit:
+        on_commit()
+
+# ── 스레드 목록 버전 (conditional GET) ─────────────────────
+# 사용자별 스레드 목록이 바뀔 때마다 증가한다. 프로세스 로컬 값이므로 ETag 에
+# 부팅 nonce 를 섞어 다른 워커/재시작의 ETag 와 섞이지 않게 한다. 여러 워커가
+# 같은 DB 를 쓰면 다른 워커의 변경은 보이지 않으므로 THREADS_ETAG=0 으로 끈다.
+THREADS_ETAG     = os.getenv("THREADS_ETAG", "1") == "1"
+_BOOT_NONCE      = uuid.uuid4().hex[:8]
+_thread_versions: Dict[str, int] = {}
+
+def bump_thread_version(user: str):
+    _thread_versions[user] = _thread_versions.get(user, 0) + 1
+
+def _threads_etag(user: str, before: Optional[str], limit: int) -> str:
+    raw = f"{user}|{_BOOT_NONCE}|{_thread_versions.get(user, 0)}|{before or ''}|{limit}"
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()}"'
 
 # ── 간단 서명 기반 Auth ────────────────────────────────────
 
@@ -193,31 +600,207 @@ def current_user(auth: str = Header(..., alias="Authorization")):
     return _verify(auth.removeprefix("Bearer ").strip())
 
 # ── FastAPI 앱 ──────────────────────────────────────────────
-app = FastAPI()
+@contextlib.asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Build the runtime on uvicorn's own loop and tear it down on shutdown."""
+    rt = runtime
+    async with contextlib.AsyncExitStack() as stack:
+        with rt.phase("db_schema"):
+            await asyncio.to_thread(_init_schema)
+        with rt.phase("llm"):
+            if rt.llm is None:
+                rt.llm = await asyncio.to_thread(_build_llm)
+        with rt.phase("tools"):
+            await asyncio.to_thread(_build_tools, rt)
+        with rt.phase("prompts"):
+            prompt_texts = await asyncio.to_thread(_read_prompts)
+        with rt.phase("checkpointer"):
+            if rt.checkpointer is None:
+                rt.checkpointer = await _open_checkpointer(stack)
+        collector.start()
+        with rt.phase("graph"):
+            if rt.simple_agent is None:
+                rt.simple_agent = await asyncio.to_thread(_build_graph, rt, prompt_texts)
+        with rt.phase("sandbox"):
+            if PYTHON_TOOL != "repl":
+                await asyncio.to_thread(rt.sandbox_pool.start)
+                stack.callback(rt.sandbox_pool.close)
+        print("Startup phases (ms): " + ", ".join(f"{k}={v}" for k, v in rt.startup_ms.items()))
+
+        yield
+
+        # 진행 중인 스트림은 취소하고 부분 답변을 저장한 뒤 writer 를 닫는다
+        await stream_runs.cancel_all()
+        await message_writer.stop()
+        await collector.aclose()
+        await async_engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+    expose_headers=["X-Has-More", "X-Next-Cursor", "ETag", "X-Run-Id"],
 )
-app.mount("/images", StaticFiles(directory=UPLOAD_DIR), name="images")
+class ImmutableStaticFiles(StaticFiles):
+    """Static files whose names never get new content (content hash / UUID)."""
+
+    def file_response(self, *args, **kwargs):
+        resp = super().file_response(*args, **kwargs)
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return resp
+
+app.mount("/images", ImmutableStaticFiles(directory=UPLOAD_DIR), name="images")
+
+@app.get("/health")
+def health():
+    return {
+        "ok": runtime.simple_agent is not None,
+        "startup_ms": runtime.startup_ms,
+        "streams": stream_runs.stats(),
+        "scheduler": chat_gate.stats(),
+        "gc": collector.stats(),
+    }
+
+# ── Metrics (/metrics, Prometheus text) ───────────────────
+# token 마다 observe 하지 않고 모델 호출/도구 호출/turn 이 끝날 때 한 번씩 기록한다
+metrics = MetricsRegistry("chat_")
+TTFT_SECONDS       = metrics.histogram("ttft_seconds", "Time from stream start to the first answer token")
+TURN_SECONDS       = metrics.histogram("turn_seconds", "Wall time of one chat turn", ("endpoint", "status"))
+AGENT_SECONDS      = metrics.histogram("agent_seconds", "Time spent in one supervisor/agent node run", ("agent",))
+TOOL_SECONDS       = metrics.histogram("tool_seconds", "Latency of one tool call", ("tool",))
+TOKENS_PER_SECOND  = metrics.histogram("model_tokens_per_second", "Streamed chunks per second after the first one, per model call", ("agent",), RATE_BUCKETS)
+DB_COMMIT_SECONDS  = metrics.histogram("db_commit_seconds", "Latency of message inserts plus commit", ("mode",))
+IMAGE_IO_SECONDS   = metrics.histogram("image_io_seconds", "Image upload, vision encoding and chart writes", ("op",))
+metrics.gauge("streams_in_flight", "Stream runs still producing events", lambda: stream_runs.active())
+metrics.gauge("stream_runs_total", "Finished and started stream runs by outcome",
+              lambda: {(k,): v for k, v in stream_runs.counters.items()}, ("status",), type="counter")
+metrics.gauge("gate_running", "Graph runs holding a slot", lambda: chat_gate.running)
+metrics.gauge("gate_waiting", "Chat requests queued for a slot", lambda: chat_gate.waiting)
+metrics.gauge("gate_decisions_total", "Admission outcomes (admitted, rejected_rate, rejected_tokens, rejected_queue, timed_out)",
+              lambda: {(k,): v for k, v in chat_gate.counters.items()}, ("outcome",), type="counter")
+metrics.gauge("gc_reclaimed_total", "Rows, files and bytes removed by the garbage collector",
+              lambda: {(k,): v for k, v in collector.totals.items()}, ("kind",), type="counter")
+metrics.gauge("db_write_queue", "Turns waiting in the write-behind queue", lambda: message_writer.pending())
+metrics.gauge("history_tokens_total", "Estimated model-input tokens before/after history trimming",
+              lambda: {("full",): runtime.history.counters["tokens_in"], ("sent",): runtime.history.counters["tokens_out"]}
+              if runtime.history else {}, ("kind",), type="counter")
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+# ── Admission control ──────────────────────────────────────
+# 전체 동시 실행 수를 제한하고, 기다리는 요청은 사용자별로 공정하게 (가중 SFQ) 꺼낸다
+chat_gate = FairScheduler(
+    CHAT_MAX_CONCURRENCY, CHAT_MAX_QUEUE, CHAT_QUEUE_TIMEOUT, CHAT_RETRY_AFTER,
+    user_rpm=SCHED_USER_RPM,
+    user_burst=SCHED_USER_BURST,
+    user_tpm=SCHED_USER_TPM,
+    weights=parse_weights(SCHED_WEIGHTS),
+)
+
+def _rejected(e: Rejected) -> HTTPException:
+    return HTTPException(e.status, e.detail, headers={"Retry-After": str(e.retry_after)})
+
+def _estimate_turn_tokens(req) -> int:
+    """Rough model-input tokens of one turn, charged before the run and settled after."""
+    from history import count_tokens, IMAGE_TOKENS
+    return SCHED_TURN_TOKENS + count_tokens(req.question) + (IMAGE_TOKENS if req.image else 0)
 
 # Convert local image URLs to data URIs for OpenAI access
-def _prepare_image_for_openai(url: str) -> str:
-    """Return a data URL if the image is local, otherwise return the URL."""
+class ImagePayloadCache:
+    """LRU of prepared data URLs, evicted by total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size      = 0
+        self._items: "OrderedDict[tuple, str]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[str]:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: tuple, value: str):
+        if len(value) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._items[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+image_payload_cache = ImagePayloadCache(IMAGE_CACHE_BYTES)
+
+def _image_mime(fname: str) -> str:
+    ext = os.path.splitext(fname)[1].lower().lstrip(".") or "png"
+    if ext in {"jpg", "jpeg"}:
+        return "jpeg"
+    if ext in {"png", "gif", "webp"}:
+        return ext
+    return "png"
+
+def _shrink_image(data: bytes, max_edge: int) -> Optional[tuple]:
+    """Upright, downscale and recompress with Pillow.
+
+    Returns (bytes, mime) if the result is smaller or the original relied on
+    an EXIF rotation; otherwise None (send the original).
+    """
+    with Image.open(io.BytesIO(data)) as im:
+        if getattr(im, "is_animated", False):
+            return None
+        # 재인코딩하면 EXIF Orientation 이 사라지므로 회전을 픽셀에 먼저 반영
+        rotated = im.getexif().get(ExifTags.Base.Orientation, 1) != 1
+        if max(im.size) <= max_edge and len(data) <= IMAGE_RECOMPRESS_BYTES and not rotated:
+            return None
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((max_edge, max_edge))
+        if IMAGE_FORMAT == "JPEG" and im.mode not in {"RGB", "L"}:
+            rgba = im.convert("RGBA")
+            im = Image.new("RGB", rgba.size, (255, 255, 255))
+            im.paste(rgba, mask=rgba.split()[-1])
+        out = io.BytesIO()
+        im.save(out, IMAGE_FORMAT, quality=IMAGE_QUALITY)
+    if out.tell() >= len(data) and not rotated:
+        return None
+    return out.getvalue(), IMAGE_FORMAT.lower()
+
+def _encode_image(path: str, detail: str) -> str:
+    with open(path, "rb") as f:
+        data = f.read()
+    mime = _image_mime(path)
+    max_edge = 512 if detail == "low" else IMAGE_MAX_EDGE
+    if Image is not None and max_edge:
+        try:
+            shrunk = _shrink_image(data, max_edge)
+            if shrunk:
+                data, mime = shrunk
+        except Exception as e:
+            print(f"Image resize error: {e}")
+    return f"data:image/{mime};base64,{base64.b64encode(data).decode()}"
+
+async def _prepare_image_for_openai(url: str, detail: str = "auto") -> str:
+    """Return a data URL if the image is local, otherwise return the URL.
+
+    Encoded payloads are cached by ``(path, mtime, detail)``; encoding and the
+    optional downscale run in a worker thread.
+    """
     try:
         parsed = urlparse(url)
         if not parsed.scheme or parsed.hostname in {"localhost", "127.0.0.1"}:
             fname = os.path.basename(parsed.path)
             path = os.path.join(UPLOAD_DIR, fname)
-            with open(path, "rb") as f:
-                b64 = base64.b64encode(f.read()).decode()
-            ext = os.path.splitext(fname)[1].lower().lstrip(".") or "png"
-            if ext in {"jpg", "jpeg"}:
-                mime = "jpeg"
-            elif ext in {"png", "gif", "webp"}:
-                mime = ext
-            else:
-                mime = "png"
-            return f"data:image/{mime};base64,{b64}"
+            key = (path, os.stat(path).st_mtime_ns, detail)
+            payload = image_payload_cache.get(key)
+            if payload is None:
+                with IMAGE_IO_SECONDS.time("encode"):
+                    payload = await asyncio.to_thread(_encode_image, path, detail)
+                image_payload_cache.put(key, payload)
+            return payload
     except Exception as e:
         print(f"Image conversion error: {e}")
     return url
@@ -235,100 +818,486 @@ def login(body: LoginReq):
 
 # ---------- 2) Thread CRUD ---------------------------------
 @app.post("/threads")
-def new_thread(db: Session = Depends(get_db), user=Depends(current_user)):
+async def new_thread(db: AsyncSession = Depends(get_db), user=Depends(current_user)):
     tid = str(uuid.uuid4())
     db.add(Thread(id=tid, user_id=user))
-    db.commit()
+    await db.commit()
+    bump_thread_version(user)
     return {"thread_id": tid, "title": "새 대화"}
 
 @app.get("/threads")
-def list_threads(db: Session = Depends(get_db), user=Depends(current_user)):
-    rows = db.scalars(select(Thread).where(Thread.user_id == user)).all()
+async def list_threads(
+    response: Response,
+    before: Optional[str] = None,
+    limit: int = Query(THREADS_PAGE_SIZE, ge=1, le=THREADS_PAGE_MAX),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(current_user),
+):
+    """List the caller's threads, most recently active first.
+
+    ``before`` is the ``X-Next-Cursor`` value of the previous page. The ETag is
+    derived from the per-user version counter, so an unchanged list answers
+    ``If-None-Match`` with 304 without touching the database.
+    """
+    etag = _threads_etag(user, before, limit) if THREADS_ETAG else None
+    if etag and if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+    q = select(Thread).where(Thread.user_id == user)
+    if before:
+        try:
+            ts, tid = before.split("|", 1)
+            ts = dt.datetime.fromisoformat(ts)
+        except ValueError:
+            raise HTTPException(400, "Bad cursor")
+        q = q.where(or_(Thread.updated < ts, and_(Thread.updated == ts, Thread.id < tid)))
+    rows = list((await db.scalars(
+        q.order_by(Thread.updated.desc(), Thread.id.desc()).limit(limit + 1)
+    )).all())
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = f"{rows[-1].updated.isoformat()}|{rows[-1].id}"
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
     return [{"id": t.id, "title": t.title} for t in rows]
 
 @app.patch("/threads/{tid}")
-def rename_thread(tid: str, body: dict, db: Session = Depends(get_db), user=Depends(current_user)):
-    th = db.get(Thread, tid)
+async def rename_thread(tid: str, body: dict, db: AsyncSession = Depends(get_db), user=Depends(current_user)):
+    th = await db.get(Thread, tid)
     if not th or th.user_id != user:
         raise HTTPException(404)
     th.title = (body.get("title") or "제목 없음")[:50]
-    db.commit()
+    await db.commit()
+    bump_thread_version(user)
     return {"ok": True, "title": th.title}
 
 @app.delete("/threads/{tid}")
-def delete_thread(tid: str, db: Session = Depends(get_db), user=Depends(current_user)):
-    rows = db.execute(delete(Thread).where(Thread.id == tid, Thread.user_id == user)).rowcount
+async def delete_thread(tid: str, db: AsyncSession = Depends(get_db), user=Depends(current_user)):
+    rows = (await db.execute(delete(Thread).where(Thread.id == tid, Thread.user_id == user))).rowcount
     if rows:
-        db.commit(); return {"ok": True}
+        await db.commit(); bump_thread_version(user)
+        # 메시지/이미지 행은 collector 가 배치로 지운다 (bulk delete 는 cascade 를 타지 않음)
+        collector.forget(tid)
+        if runtime.checkpointer is not None:
+            await runtime.checkpointer.adelete_thread(tid)
+        return {"ok": True}
     raise HTTPException(404)
 
+@app.post("/gc")
+async def run_gc(user=Depends(current_user)):
+    """Run a full garbage-collection pass now (``GC_ADMINS`` only) and return what it reclaimed."""
+    if user not in GC_ADMINS:
+        raise HTTPException(403, "Not allowed")
+    if collector.running:
+        raise HTTPException(409, "A collection pass is already running")
+    wait = collector.seconds_until(GC_MIN_INTERVAL)
+    if wait > 0:
+        raise HTTPException(429, "Collection ran recently", headers={"Retry-After": str(max(1, round(wait)))})
+    return await collector.collect()
+
 # ---------- 이미지 업로드 ----------------------------------
+def _write_chunk(f, digest, chunk: bytes):
+    digest.update(chunk)
+    f.write(chunk)
+
+def _commit_file(tmp: str, fname: str):
+    """Move a finished temp file to its content-addressed name (dedup if present)."""
+    path = os.path.join(UPLOAD_DIR, fname)
+    if os.path.exists(path):
+        os.remove(tmp)
+        os.utime(path)   # 같은 내용이 다시 올라왔으므로 GC 의 grace 기간을 새로 시작
+    else:
+        os.replace(tmp, path)
+
+class _FilePart:
+    """python-multipart callbacks that keep only the ``name`` file field's bytes."""
+
+    def __init__(self, name: str):
+        self.name     = name.encode()
+        self.filename = None
+        self.found    = False
+        self.size     = 0
+        self.pending: List[bytes] = []
+        self.pending_size = 0
+        self._in_file = False
+        self._field   = b""
+        self._value   = b""
+        self._headers: Dict[bytes, bytes] = {}
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._begin,
+            "on_header_field": lambda data, start, end: self._append_field(data[start:end]),
+            "on_header_value": lambda data, start, end: self._append_value(data[start:end]),
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._data,
+            "on_part_end": self._end,
+        }
+
+    def _begin(self):
+        self._headers, self._field, self._value, self._in_file = {}, b"", b"", False
+
+    def _append_field(self, data: bytes):
+        self._field += data
+
+    def _append_value(self, data: bytes):
+        self._value += data
+
+    def _header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def _headers_finished(self):
+        from python_multipart.multipart import parse_options_header
+        _, params = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if params.get(b"name") == self.name and b"filename" in params and not self.found:
+            self._in_file = self.found = True
+            self.filename = params[b"filename"].decode(errors="replace")
+
+    def _data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.pending.append(data[start:end])
+            self.size += end - start
+            self.pending_size += end - start
+
+    def _end(self):
+        self._in_file = False
+
+    def take(self) -> bytes:
+        data, self.pending, self.pending_size = b"".join(self.pending), [], 0
+        return data
+
 @app.post("/upload")
-async def upload_image(file: UploadFile = File(...), user=Depends(current_user)):
-    ext = os.path.splitext(file.filename)[1] or ".png"
-    fname = f"{uuid.uuid4()}{ext}"
-    path  = os.path.join(UPLOAD_DIR, fname)
-    with open(path, "wb") as f:
-        f.write(await file.read())
+async def upload_image(request: Request, user=Depends(current_user)):
+    """Stream the multipart ``file`` field to disk off the event loop, named by its SHA-256.
+
+    The body is parsed as it arrives (not spooled by Starlette first), so
+    ``UPLOAD_MAX_BYTES`` caps what the server receives, not just what it keeps.
+    """
+    from python_multipart import MultipartParser
+    from python_multipart.multipart import parse_options_header
+
+    too_large = HTTPException(413, f"File exceeds {UPLOAD_MAX_BYTES} bytes")
+    body_max = UPLOAD_MAX_BYTES + UPLOAD_FORM_SLACK
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > body_max:
+        raise too_large
+    ctype, params = parse_options_header(request.headers.get("content-type", ""))
+    if ctype != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(400, "multipart/form-data with a 'file' field required")
+
+    part = _FilePart("file")
+    parser = MultipartParser(params[b"boundary"], part.callbacks())
+    tmp = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+    digest, received = hashlib.sha256(), 0
+    started = time.perf_counter()
+    f = await asyncio.to_thread(open, tmp, "wb")
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > body_max:
+                raise too_large
+            parser.write(chunk)
+            if part.size > UPLOAD_MAX_BYTES:
+                raise too_large
+            # 작은 조각마다 thread 를 오가지 않도록 UPLOAD_CHUNK_SIZE 만큼 모아서 쓴다
+            if part.pending_size >= UPLOAD_CHUNK_SIZE:
+                await asyncio.to_thread(_write_chunk, f, digest, part.take())
+        parser.finalize()
+        if not part.found:
+            raise HTTPException(400, "multipart/form-data with a 'file' field required")
+        await asyncio.to_thread(_write_chunk, f, digest, part.take())
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+    await asyncio.to_thread(f.close)
+
+    ext = (os.path.splitext(part.filename or "")[1] or ".png").lower()
+    fname = f"{digest.hexdigest()}{ext}"
+    await asyncio.to_thread(_commit_file, tmp, fname)
+    IMAGE_IO_SECONDS.observe(time.perf_counter() - started, "upload")
     return {"url": f"/images/{fname}"}
 
+# ---------- 차트 아티팩트 (coder agent 의 IMAGE_DATA) -------
+IMAGE_DATA_MARKER = "IMAGE_DATA:"
+
+def split_image_data(text: str) -> tuple:
+    """Split ``text`` into (visible text, base64 blob or None) at the marker."""
+    head, sep, tail = text.partition(IMAGE_DATA_MARKER)
+    return (head.strip(), tail.strip()) if sep else (text, None)
+
+def _write_chart(b64: str) -> str:
+    return _write_chart_bytes(base64.b64decode(b64))
+
+def _write_chart_bytes(data: bytes) -> str:
+    ext = ".png"
+    if CHART_FORMAT == "WEBP" and Image is not None:
+        with Image.open(io.BytesIO(data)) as im:
+            out = io.BytesIO()
+            im.save(out, "WEBP", lossless=True)
+        data, ext = out.getvalue(), ".webp"
+    fname = f"{hashlib.sha256(data).hexdigest()}{ext}"
+    path = os.path.join(UPLOAD_DIR, fname)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        tmp = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        _commit_file(tmp, fname)
+    return f"/images/{fname}"
+
+async def store_chart(b64: str) -> Optional[str]:
+    """Decode and durably store a chart off the event loop; return its URL."""
+    try:
+        with IMAGE_IO_SECONDS.time("chart"):
+            return await asyncio.to_thread(_write_chart, b64)
+    except Exception as e:
+        print(f"Image processing error: {e}")
+        return None
+
+def _turn_chart_url(messages: list) -> Optional[str]:
+    """Latest chart URL reported by a sandbox tool artifact in the current turn."""
+    for m in reversed(messages):
+        if m.type == "human":
+            break
+        if m.type == "tool" and isinstance(getattr(m, "artifact", None), dict) and m.artifact.get("charts"):
+            return m.artifact["charts"][-1]
+    return None
+
+class ImageDataFilter:
+    """Keep an ``IMAGE_DATA:`` blob out of a token stream.
+
+    ``feed`` returns the text that is safe to show. A tail that could be the
+    start of the marker is held back until the next token decides it; once the
+    marker is seen, the rest of the stream is collected in ``blob`` instead.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self.blob: Optional[List[str]] = None
+
+    def feed(self, token: str) -> str:
+        if self.blob is not None:
+            self.blob.append(token)
+            return ""
+        text = self._pending + token
+        head, sep, tail = text.partition(IMAGE_DATA_MARKER)
+        if sep:
+            self._pending, self.blob = "", [tail]
+            return head
+        keep = next((k for k in range(min(len(text), len(IMAGE_DATA_MARKER) - 1), 0, -1)
+                     if text.endswith(IMAGE_DATA_MARKER[:k])), 0)
+        self._pending = text[len(text) - keep:] if keep else ""
+        return text[:len(text) - keep]
+
+    def flush(self) -> str:
+        out, self._pending = self._pending, ""
+        return out
+
+    def blob_text(self) -> Optional[str]:
+        return "".join(self.blob).strip() if self.blob else None
+
+# ---------- 도구 캐시 통계 ---------------------------------
+@app.get("/cache/stats")
+def cache_stats(user=Depends(current_user)):
+    caches = {"RS": runtime.rag_cache, "web": runtime.web_cache, "history": runtime.history}
+    return {name: cache.stats() for name, cache in caches.items() if cache is not None}
+
 # ---------- 3) 메시지 조회 ---------------------------------
+def _message_cursor(cursor: str) -> tuple:
+    """``"<timestamp>|<message id>"`` → (datetime, id)."""
+    try:
+        ts, mid = cursor.split("|", 1)
+        return dt.datetime.fromisoformat(ts), mid
+    except ValueError:
+        raise HTTPException(400, "Bad cursor")
+
+def _message_rowid(mid: str):
+    m = Message.__table__.alias("cursor_message")
+    return select(literal_column("cursor_message.rowid")).where(m.c.id == mid).scalar_subquery()
+
 @app.get("/messages/{tid}")
-def get_messages(tid: str, db: Session = Depends(get_db), user=Depends(current_user)):
-    db.scalar(select(Thread).where(Thread.id == tid, Thread.user_id == user)) \
+async def get_messages(
+    tid: str,
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MESSAGES_PAGE_MAX),
+    include_steps: bool = True,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(current_user),
+):
+    """Return one page of a thread in chronological order.
+
+    Without a cursor the newest ``limit`` messages are returned. ``before`` pages
+    backwards from a message, ``after`` pages forwards; both take the
+    ``X-Next-Cursor`` value (``<timestamp>|<message id>``) of the previous page.
+    ``X-Has-More`` tells whether another page exists in that direction. With
+    ``include_steps=false`` the step logs are not loaded (``steps`` is null);
+    fetch them per message from ``/messages/{tid}/{mid}/steps``.
+    """
+    await db.scalar(select(Thread).where(Thread.id == tid, Thread.user_id == user)) \
         or (_ for _ in ()).throw(HTTPException(404))
-    msgs = db.scalars(select(Message).where(Message.thread_id == tid).order_by(Message.ts)).all()
+
+    # 같은 ts 는 삽입 순서(rowid)로 정렬 (ix_messages_thread_ts 가 rowid 순으로 담고 있음)
+    rowid = literal_column("messages.rowid")
+    q = select(Message).where(Message.thread_id == tid).options(selectinload(Message.images))
+    if not include_steps:
+        q = q.options(defer(Message.steps))
+    if after is not None:
+        ts, mid = _message_cursor(after)
+        q = q.where(Message.ts >= ts, or_(Message.ts > ts, rowid > _message_rowid(mid))) \
+            .order_by(Message.ts.asc(), rowid.asc())
+    else:
+        if before is not None:
+            ts, mid = _message_cursor(before)
+            # ts 범위 조건을 따로 두어 index 가 cursor 위치부터 읽게 한다
+            q = q.where(Message.ts <= ts, or_(Message.ts < ts, rowid < _message_rowid(mid)))
+        q = q.order_by(Message.ts.desc(), rowid.desc())
+    msgs = list((await db.scalars(q.limit(limit + 1))).all())
+
+    has_more = len(msgs) > limit
+    response.headers["X-Has-More"] = "true" if has_more else "false"
+    msgs = msgs[:limit]
+    if has_more:
+        response.headers["X-Next-Cursor"] = f"{msgs[-1].ts.isoformat()}|{msgs[-1].id}"
+    if after is None:
+        msgs.reverse()
 
     def to_dict(m: Message):
         img = m.images[0].url if m.images else None
+        steps = (json.loads(m.steps) if m.steps else []) if include_steps else None
         return {
+            "id": m.id,
             "role": m.role,
             "content": m.content,
             "image": img,
             "timestamp": m.ts.isoformat(),
-            "steps": json.loads(m.steps) if m.steps else [],
+            "steps": steps,
+            "status": m.status or "complete",
         }
 
     return [to_dict(m) for m in msgs]
 
+@app.get("/messages/{tid}/{mid}/steps")
+async def get_message_steps(tid: str, mid: str, db: AsyncSession = Depends(get_db), user=Depends(current_user)):
+    row = (await db.execute(
+        select(Message.steps).join(Thread, Thread.id == Message.thread_id)
+        .where(Message.id == mid, Message.thread_id == tid, Thread.user_id == user)
+    )).first()
+    if row is None:
+        raise HTTPException(404)
+    return json.loads(row.steps) if row.steps else []
+
+@app.get("/search")
+async def search_messages(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=500),
+    thread_id: Optional[str] = None,
+    role: Optional[str] = None,
+    sort: str = Query("relevance", pattern="^(relevance|recent)$"),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_PAGE_MAX),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(current_user),
+):
+    """Search the caller's messages, best match first.
+
+    Every whitespace-separated term (or ``"quoted phrase"``) must occur in the
+    message as a substring, case-insensitively. Relevance ranks the newest
+    ``SEARCH_RANK_WINDOW`` matches; ``sort=recent`` pages through all matches,
+    newest first. Each hit carries a snippet with the matches wrapped in
+    ``**``. ``X-Has-More`` tells whether ``offset + limit`` has another page.
+    """
+    terms = parse_terms(q)
+    if not terms:
+        raise HTTPException(400, "Empty query")
+    sql, params = search_params(user, terms, limit, offset, thread_id=thread_id, role=role,
+                                recent=sort == "recent", window=SEARCH_RANK_WINDOW)
+    rows = (await db.execute(text(sql), params)).all()
+
+    response.headers["X-Has-More"] = "true" if len(rows) > limit else "false"
+    return [
+        {
+            "id": r.id,
+            "thread_id": r.thread_id,
+            "thread_title": r.title,
+            "role": r.role,
+            "snippet": snippet(r.content or "", terms),
+            "timestamp": dt.datetime.fromisoformat(r.ts).isoformat() if r.ts else None,
+            "score": round(r.score, 4) if r.score is not None else None,
+        }
+        for r in rows[:limit]
+    ]
+
 # ---------- 4) 대화 (동기) ---------------------------------
 class ChatReq(BaseModel):
     thread_id: str
     question:  str
     image: Optional[str] = None  # base64 혹은 URL
 
+async def _human_message(req: ChatReq):
+    from langchain_core.messages import HumanMessage
+    img = await _prepare_image_for_openai(req.image) if req.image else None
+    return HumanMessage(content=req.question if not img else [
+        {"type": "text", "text": req.question},
+        {"type": "image_url", "image_url": {"url": img, "detail": "auto"}}
+    ])
+
+@contextlib.contextmanager
+def _history_usage(thread_id: str):
+    """Log the model-input token estimate of one graph run."""
+    if runtime.history is None:
+        yield None
+        return
+    usage = runtime.history.begin_request()
+    try:
+        yield usage
+    finally:
+        runtime.history.log_request(thread_id, usage)
+
+def _run_config(thread_id: str) -> dict:
+    # RunnableConfig 는 TypedDict 이므로 dict 로 충분
+    return {"configurable": {"thread_id": thread_id}, "callbacks": []}
+
 @app.post("/chat")
-def chat(req: ChatReq, db: Session = Depends(get_db), user=Depends(current_user)):
+async def chat(req: ChatReq, db: AsyncSession = Depends(get_db), user=Depends(current_user)):
     # 0) 권한 체크
-    db.scalar(select(Thread).where(Thread.id == req.thread_id, Thread.user_id == user)) \
+    await db.scalar(select(Thread).where(Thread.id == req.thread_id, Thread.user_id == user)) \
         or (_ for _ in ()).throw(HTTPException(404))
 
     # 1) LangGraph 에이전트 실행 ----------------------------
-    img = _prepare_image_for_openai(req.image) if req.image else None
-    human = HumanMessage(content=req.question if not img else [
-        {"type": "text", "text": req.question},
-        {"type": "image_url", "image_url": {"url": img, "detail": "auto"}}
-    ])
-
-    state = {"messages": [human]}
-    cfg = RunnableConfig(configurable={"thread_id": req.thread_id}, callbacks=[])
+    state = {"messages": [await _human_message(req)]}
+    cfg = _run_config(req.thread_id)
 
-    result = simple_agent.invoke(state, cfg)
+    started = time.perf_counter()
+    try:
+        async with chat_gate.slot(user, _estimate_turn_tokens(req)) as ticket:
+            with _history_usage(req.thread_id) as usage:
+                result = await runtime.simple_agent.ainvoke(state, cfg)
+            if usage is not None:
+                ticket.actual_tokens = usage["sent"]
+    except Rejected as e:
+        raise _rejected(e)
+    TURN_SECONDS.observe(time.perf_counter() - started, "chat", "completed")
     answer = result["messages"][-1].content
 
     # 2) 이미지 데이터 분리 -------------------------------
-    image_url = None
-    if "IMAGE_DATA:" in answer:
-        parts = answer.split("IMAGE_DATA:")
-        if len(parts) > 1:
-            b64 = parts[1].strip()
-            img_bytes = base64.b64decode(b64)
-            fname = f"{uuid.uuid4()}.png"
-            path = os.path.join(UPLOAD_DIR, fname)
-            with open(path, "wb") as f:
-                f.write(img_bytes)
-            image_url = f"/images/{fname}"
-        answer = parts[0].strip()
+    answer, b64 = split_image_data(answer)
+    if SUPERVISOR_MODE == "parallel":
+        # 여러 agent 답을 합치며 빠진 📌 출처 줄을 덧붙인다 (sequential 답변은 그대로)
+        from fanout import ensure_citations
+        answer, _ = ensure_citations(answer, result["messages"])
+    image_url = await store_chart(b64) if b64 else _turn_chart_url(result["messages"])
 
     # 3) DB 기록 -------------------------------------------
     user_msg = Message(thread_id=req.thread_id, role="user", content=req.question)
@@ -339,207 +1308,320 @@ def chat(req: ChatReq, db: Session = Depends(get_db), user=Depends(current_user)
     if image_url:
         assistant_msg.images.append(MessageImage(url=image_url))
 
-    db.add_all([user_msg, assistant_msg])
-    db.commit()
+    await persist_messages([user_msg, assistant_msg], user)
 
     return {"role": "assistant", "content": answer, "image": image_url}
 
-@app.post("/chat/stream")
-async def chat_stream(req: ChatReq, db: Session = Depends(get_db), user=Depends(current_user)):
-    # 0) 권한 체크
-    db.scalar(select(Thread).where(Thread.id == req.thread_id, Thread.user_id == user)) \
-        or (_ for _ in ()).throw(HTTPException(404))
-
-    # 1) async generator ----------------------------------
-    async def gen():
-        assistant_acc = ""
-        image_url = None
-        current_agent = None
-        supervisor_streaming = False
-        previous_agent = None
-        steps_data = [{"type": "step", "content": "🤖 질문을 분석하고 있습니다..."}]
-
-        def add_step(step_type: str, content: str):
-            steps_data.append({"type": step_type, "content": content})
-        
-        try:
-            img = _prepare_image_for_openai(req.image) if req.image else None
-            human = HumanMessage(content=req.question if not img else [
-                {"type": "text", "text": req.question},
-                {"type": "image_url", "image_url": {"url": img, "detail": "auto"}}
-            ])
-
-            state = {"messages": [human]}
-            cfg = RunnableConfig(configurable={"thread_id": req.thread_id}, callbacks=[])
-
-            # 초기 supervisor 시작 메시지 (실시간 스트림만 전송)
-            yield f"[STEP] 🤖 질문을 분석하고 있습니다...\n".encode()
-
-            async for event in simple_agent.astream_events(state, cfg, version="v1"):
-                event_name = event.get("name", "")
-                event_type = event.get("event", "")
-                
-                # Track current agent and detect transfers
-                if event_type == "on_chain_start":
-                    previous_agent = current_agent
-                    
-                    if "reliability_searcher" in event_name:
-                        current_agent = "reliability_searcher"
-                        if previous_agent != current_agent:
-                            add_step("step", "📋 신뢰성 전문가에게 전달합니다...")
-                            yield f"[STEP] 📋 신뢰성 전문가에게 전달합니다...\n".encode()
-                            add_step("step", "🔍 신뢰성 정보를 검색하고 있습니다...")
-                            yield f"[STEP] 🔍 신뢰성 정보를 검색하고 있습니다...\n".encode()
-                    elif "websearcher" in event_name:
-                        current_agent = "websearcher"
-                        if previous_agent != current_agent:
-                            add_step("step", "🌐 웹 검색 전문가에게 전달합니다...")
-                            yield f"[STEP] 🌐 웹 검색 전문가에게 전달합니다...\n".encode()
-                            add_step("step", "🔍 웹에서 최신 정보를 검색하고 있습니다...")
-                            yield f"[STEP] 🔍 웹에서 최신 정보를 검색하고 있습니다...\n".encode()
-                    elif "coder" in event_name:
-                        current_agent = "coder"
-                        if previous_agent != current_agent:
-                            add_step("step", "💻 코딩 전문가에게 전달합니다...")
-                            yield f"[STEP] 💻 코딩 전문가에게 전달합니다...\n".encode()
-                            add_step("step", "🐍 코드를 실행하고 있습니다...")
-                            yield f"[STEP] 🐍 코드를 실행하고 있습니다...\n".encode()
-                    elif "supervisor" in event_name.lower() or event_name == "LangGraph":
-                        if current_agent and current_agent != "supervisor":
-                            # 에이전트에서 supervisor로 돌아왔을 때
-                            add_step("step", f"🤖 {get_agent_name(current_agent)} 작업이 완료되어 결과를 취합하고 있습니다...")
-                            yield f"[STEP] 🤖 {get_agent_name(current_agent)} 작업이 완료되어 결과를 취합하고 있습니다...\n".encode()
-                        current_agent = "supervisor"
-
-                # Tool execution events with agent context
-                elif event_type == "on_tool_start":
-                    tool_name = event.get("name", "")
-                    if tool_name == "RS":
-                        add_step("step", "📚 신뢰성 데이터베이스 검색 중...")
-                        yield f"[STEP] 📚 신뢰성 데이터베이스 검색 중...\n".encode()
-                    elif tool_name == "TavilySearch":
-                        add_step("step", "🔍 웹 검색 실행 중...")
-                        yield f"[STEP] 🔍 웹 검색 실행 중...\n".encode()
-                    elif tool_name == "PythonREPLTool":
-                        add_step("step", "🐍 Python 코드 실행 중...")
-                        yield f"[STEP] 🐍 Python 코드 실행 중...\n".encode()
-
-                elif event_type == "on_tool_end":
-                    tool_name = event.get("name", "")
-                    output = event.get("data", {}).get("output", "")
-                    if hasattr(output, "content"):
-                        output = output.content
-                    elif not isinstance(output, str):
-                        output = str(output)
-
-                    if "IMAGE_DATA:" in output:
-                        parts = output.split("IMAGE_DATA:")
-                        if len(parts) > 1:
-                            b64 = parts[1].strip()
-                            try:
-                                img_bytes = base64.b64decode(b64)
-                                fname = f"{uuid.uuid4()}.png"
-                                path = os.path.join(UPLOAD_DIR, fname)
-                                with open(path, "wb") as f:
-                                    f.write(img_bytes)
-                                image_url = f"/images/{fname}"
-                                add_step("observation", "📊 그래프가 생성되었습니다.")
-                                yield "[OBS] 📊 그래프가 생성되었습니다.\n".encode()
-                            except Exception as e:
-                                print(f"Image processing error: {e}")
-                                add_step("observation", "⚠️ 이미지 처리 중 오류가 발생했습니다.")
-                                yield "[OBS] ⚠️ 이미지 처리 중 오류가 발생했습니다.\n".encode()
-                    else:
-                        # Show tool completion with agent context
-                        agent_name = get_agent_name(current_agent)
-                        if tool_name == "RS":
-                            add_step("observation", f"✅ {agent_name}: 신뢰성 데이터 검색 완료")
-                            yield f"[OBS] ✅ {agent_name}: 신뢰성 데이터 검색 완료\n".encode()
-                        elif tool_name == "TavilySearch":
-                            add_step("observation", f"✅ {agent_name}: 웹 검색 완료")
-                            yield f"[OBS] ✅ {agent_name}: 웹 검색 완료\n".encode()
-                        elif tool_name == "PythonREPLTool":
-                            add_step("observation", f"✅ {agent_name}: 코드 실행 완료")
-                            yield f"[OBS] ✅ {agent_name}: 코드 실행 완료\n".encode()
-                        else:
-                            add_step("observation", f"✅ {agent_name}: 작업 완료")
-                            yield f"[OBS] ✅ {agent_name}: 작업 완료\n".encode()
-
-                # Chat model streaming - ONLY from supervisor
-                elif event_type == "on_chat_model_stream":
-                    # Only stream if this is the supervisor's response
-                    if current_agent == "supervisor" or "supervisor" in event_name.lower():
-                        chunk = event.get("data", {}).get("chunk", {})
-                        if hasattr(chunk, "content") and chunk.content:
-                            token = chunk.content
-                            if "IMAGE_DATA:" not in token:
-                                # 최종 응답 시작 시 메시지
-                                if not supervisor_streaming:
-                                    add_step("step", "🎯 최종 답변을 생성하고 있습니다...")
-                                    yield f"[STEP] 🎯 최종 답변을 생성하고 있습니다...\n".encode()
-                                supervisor_streaming = True
-                                assistant_acc += token
-                                yield token.encode()
-
-            # If supervisor didn't stream (fallback), get final result
-            if not supervisor_streaming:
-                add_step("step", "🎯 최종 답변을 준비하고 있습니다...")
-                yield f"[STEP] 🎯 최종 답변을 준비하고 있습니다...\n".encode()
-                result = simple_agent.invoke(state, cfg)
-                final_answer = result["messages"][-1].content
-                
-                if "IMAGE_DATA:" in final_answer:
-                    parts = final_answer.split("IMAGE_DATA:")
-                    final_answer = parts[0].strip()
-                    if len(parts) > 1 and not image_url:
-                        try:
-                            b64 = parts[1].strip()
-                            img_bytes = base64.b64decode(b64)
-                            fname = f"{uuid.uuid4()}.png"
-                            path = os.path.join(UPLOAD_DIR, fname)
-                            with open(path, "wb") as f:
-                                f.write(img_bytes)
-                            image_url = f"/images/{fname}"
-                        except Exception as e:
-                            print(f"Image processing error: {e}")
-                
-                assistant_acc = final_answer
-                yield final_answer.encode()
-
-            # Signal completion
-            yield "[DONE]\n".encode()
-
-            # 2) DB 저장 ----------------------------------
-            user_msg = Message(thread_id=req.thread_id, role="user", content=req.question)
-            if req.image:
-                user_msg.images.append(MessageImage(url=req.image))
-
-            clean_content = assistant_acc.split("IMAGE_DATA:")[0].strip() if "IMAGE_DATA:" in assistant_acc else assistant_acc
-            assistant_msg = Message(
-                thread_id=req.thread_id,
-                role="assistant",
-                content=clean_content,
-                steps=json.dumps(steps_data),
-            )
-            if image_url:
-                assistant_msg.images.append(MessageImage(url=image_url))
+# 스트림 run 은 HTTP 응답과 분리된 task 로 실행되고, 응답은 run 의 event log 를 읽기만 한다
+stream_runs = StreamRegistry(
+    STREAM_RUN_TTL,
+    buffer_size=STREAM_BUFFER_EVENTS,
+    coalesce_ms=STREAM_COALESCE_MS,
+    coalesce_bytes=STREAM_COALESCE_BYTES,
+    cancel_grace=STREAM_CANCEL_GRACE,
+)
 
-            db.add_all([user_msg, assistant_msg])
-            db.commit()
+def _stream_response(run: StreamRun, fmt: str, after: int = 0) -> StreamingResponse:
+    render = FORMATTERS[fmt]
 
-        except Exception as e:
-            print(f"Stream error: {e}")
-            yield f"Error: {str(e)}".encode()
+    async def gen():
+        # 연결이 끊기면 Starlette 가 gen 을 취소 → events 를 닫아 run 에서 분리
+        async with contextlib.aclosing(run.events(after, STREAM_HEARTBEAT)) as events:
+            async for item in events:
+                chunk = render(item)
+                if chunk:
+                    yield chunk
 
     return StreamingResponse(
         gen(),
-        media_type="text/plain; charset=utf-8",
+        media_type=MEDIA_TYPES[fmt],
         headers={
             "X-Accel-Buffering": "no",
             "Cache-Control": "no-cache",
+            "X-Run-Id": run.id,
         }
     )
 
+async def _save_stream_turn(run: StreamRun, req: ChatReq, user: str,
+                            image_url: Optional[str], status: Optional[str] = None):
+    user_msg = Message(thread_id=req.thread_id, role="user", content=req.question)
+    if req.image:
+        user_msg.images.append(MessageImage(url=req.image))
+
+    assistant_msg = Message(
+        thread_id=req.thread_id,
+        role="assistant",
+        content=run.content,
+        steps=json.dumps(run.steps),
+        status=status,
+    )
+    if image_url:
+        assistant_msg.images.append(MessageImage(url=image_url))
+
+    await persist_messages([user_msg, assistant_msg], user)
+
+async def _run_stream(run: StreamRun, req: ChatReq, user: str, ticket: Ticket):
+    """Run the graph for one streamed turn, writing typed events into ``run``.
+
+    ``ticket`` is the request's admission; the run waits for its slot first
+    and reports queue positions as (unsaved) ``step`` events.
+    """
+    image_url = None
+    history_usage = None
+    active_agents: List[str] = []   # supervisor 에게서 일을 받아 실행 중인 agent (병렬이면 여럿)
+    supervisor_streaming = False
+    image_filter = ImageDataFilter()
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}        # event run_id → agent node / tool 시작 시각
+    open_nodes: Dict[str, str] = {}       # 실행 중인 agent node 이름 → event run_id
+
+    def _close_node(name: str):
+        AGENT_SECONDS.observe(time.perf_counter() - timings.pop(open_nodes.pop(name)), name)
+    model_calls: Dict[str, list] = {}     # event run_id → [첫 chunk 시각, chunk 수]
+
+    def _queued(position: int):
+        run.emit("step", content=f"⏳ 요청이 대기열 {position}번째에 있습니다...", agent="scheduler", position=position)
+
+    try:
+        await chat_gate.wait(ticket, _queued)
+        state = {"messages": [await _human_message(req)]}
+        cfg = _run_config(req.thread_id)
+
+        # 초기 supervisor 시작 메시지
+        run.step("🤖 질문을 분석하고 있습니다...", agent="supervisor")
+
+        final_state = None
+        history_usage = runtime.history.begin_request() if runtime.history else None
+        # v2: 취소되면 내부 graph task 까지 취소된다 (v1 은 graph 가 끝날 때까지 기다림)
+        async for ev in runtime.simple_agent.astream_events(state, cfg, version="v2"):
+            event_name = ev.get("name", "")
+            event_type = ev.get("event", "")
+            agent = _event_agent(ev)
+            
+            # Track current agent and detect transfers
+            if event_type == "on_chain_end":
+                if open_nodes.get(event_name) == ev.get("run_id"):
+                    _close_node(event_name)
+                # 루트 그래프 종료 시 최종 state 를 보관 (fallback 에서 재실행하지 않도록)
+                # (v2 는 전체 state, v1 은 마지막 노드의 update 예: {"supervisor": {"messages": [...]}})
+                output = ev.get("data", {}).get("output")
+                if event_name == "LangGraph" and isinstance(output, dict):
+                    if "messages" not in output and len(output) == 1:
+                        output = next(iter(output.values()))
+                    if isinstance(output, dict) and output.get("messages"):
+                        final_state = output
+
+            elif event_type == "on_chain_start":
+                if agent == event_name and (event_name in AGENT_HANDOFF_STEPS or event_name == "supervisor"):
+                    # handoff 로 끝난 supervisor 는 end event 가 없으므로 agent 가 시작될 때 닫는다
+                    if event_name != "supervisor" and "supervisor" in open_nodes:
+                        _close_node("supervisor")
+                    # node 와 그 안의 subgraph 가 같은 이름으로 시작하므로 바깥쪽만 잰다
+                    if event_name not in open_nodes:
+                        open_nodes[event_name] = ev["run_id"]
+                        timings[ev["run_id"]] = time.perf_counter()
+                if event_name in AGENT_HANDOFF_STEPS and agent == event_name:
+                    if event_name not in active_agents:
+                        active_agents.append(event_name)
+                        for step_text in AGENT_HANDOFF_STEPS[event_name]:
+                            run.step(step_text, agent=event_name)
+                elif event_name == "supervisor" and active_agents:
+                    # 에이전트(들)에서 supervisor로 돌아왔을 때
+                    for name in active_agents:
+                        run.step(f"🤖 {get_agent_name(name)} 작업이 완료되어 결과를 취합하고 있습니다...", agent=name)
+                    active_agents.clear()
+
+            # Tool execution events with agent context
+            elif event_type == "on_tool_start":
+                tool_name = ev.get("name", "")
+                timings[ev["run_id"]] = time.perf_counter()
+                if tool_name == "RS":
+                    run.step("📚 신뢰성 데이터베이스 검색 중...", agent=agent)
+                elif tool_name == "TavilySearch":
+                    run.step("🔍 웹 검색 실행 중...", agent=agent)
+                elif tool_name == "PythonREPLTool":
+                    run.step("🐍 Python 코드 실행 중...", agent=agent)
+
+            elif event_type == "on_tool_end":
+                tool_name = ev.get("name", "")
+                began = timings.pop(ev.get("run_id"), None)
+                if began is not None:
+                    TOOL_SECONDS.observe(time.perf_counter() - began, tool_name)
+                output = ev.get("data", {}).get("output", "")
+                artifact = getattr(output, "artifact", None)
+                charts = artifact.get("charts") if isinstance(artifact, dict) else None
+                if hasattr(output, "content"):
+                    output = output.content
+                elif not isinstance(output, str):
+                    output = str(output)
+
+                if charts:
+                    # sandbox 가 이미 저장한 차트 (artifact 로 URL 만 전달됨)
+                    image_url = charts[-1]
+                    run.obs("📊 그래프가 생성되었습니다.", agent=agent)
+                elif IMAGE_DATA_MARKER in output:
+                    _, b64 = split_image_data(output)
+                    chart_url = await store_chart(b64)
+                    if chart_url:
+                        image_url = chart_url
+                        run.obs("📊 그래프가 생성되었습니다.", agent=agent)
+                    else:
+                        run.obs("⚠️ 이미지 처리 중 오류가 발생했습니다.", agent=agent)
+                else:
+                    # Show tool completion with agent context
+                    agent_name = get_agent_name(agent)
+                    if tool_name == "RS":
+                        run.obs(f"✅ {agent_name}: 신뢰성 데이터 검색 완료", agent=agent)
+                    elif tool_name == "TavilySearch":
+                        run.obs(f"✅ {agent_name}: 웹 검색 완료", agent=agent)
+                    elif tool_name == "PythonREPLTool":
+                        run.obs(f"✅ {agent_name}: 코드 실행 완료", agent=agent)
+                    else:
+                        run.obs(f"✅ {agent_name}: 작업 완료", agent=agent)
+
+            # Chat model streaming - ONLY from supervisor
+            elif event_type == "on_chat_model_stream":
+                call = model_calls.get(ev["run_id"])
+                if call is None:
+                    model_calls[ev["run_id"]] = [time.perf_counter(), 1]
+                else:
+                    call[1] += 1
+                # Only stream if this is the supervisor's response
+                if agent == "supervisor":
+                    chunk = ev.get("data", {}).get("chunk", {})
+                    if hasattr(chunk, "content") and chunk.content:
+                        token = image_filter.feed(chunk.content)
+                        if token:
+                            # 최종 응답 시작 시 메시지
+                            if not supervisor_streaming:
+                                TTFT_SECONDS.observe(time.perf_counter() - started)
+                                run.step("🎯 최종 답변을 생성하고 있습니다...", agent="supervisor")
+                            supervisor_streaming = True
+                            run.token(token)
+
+            elif event_type == "on_chat_model_end":
+                call = model_calls.pop(ev.get("run_id"), None)
+                if call is not None and call[1] > 1:
+                    elapsed = time.perf_counter() - call[0]
+                    if elapsed > 0:
+                        TOKENS_PER_SECOND.observe((call[1] - 1) / elapsed, agent)
+
+        if history_usage is not None:
+            runtime.history.log_request(req.thread_id, history_usage)
+
+        # marker 후보로 보류했던 꼬리와, 답변에 섞인 차트 blob 처리
+        tail = image_filter.flush()
+        if tail and supervisor_streaming:
+            run.token(tail)
+        if image_filter.blob_text() and not image_url:
+            image_url = await store_chart(image_filter.blob_text())
+
+        if final_state is None:
+            # 이벤트에서 얻지 못했으면 같은 run 이 남긴 checkpoint 를 읽는다
+            final_state = (await runtime.simple_agent.aget_state(cfg)).values
+        messages = final_state.get("messages") or []
+
+        # If supervisor didn't stream (fallback), get final result
+        if not supervisor_streaming:
+            run.step("🎯 최종 답변을 준비하고 있습니다...", agent="supervisor")
+            final_answer = messages[-1].content if messages else ""
+            if not isinstance(final_answer, str):
+                final_answer = str(final_answer)
+            
+            final_answer, b64 = split_image_data(final_answer)
+            if b64 and not image_url:
+                image_url = await store_chart(b64)
+            
+            TTFT_SECONDS.observe(time.perf_counter() - started)
+            run.token(final_answer)
+
+        # parallel: 에이전트가 준 📌 출처 줄이 합친 답변에서 빠졌으면 덧붙인다
+        if SUPERVISOR_MODE == "parallel":
+            from fanout import ensure_citations
+            _, appended = ensure_citations(run.text, messages)
+            run.token(appended)
+
+        # Signal completion
+        run.finish(image=image_url)
+        TURN_SECONDS.observe(time.perf_counter() - started, "stream", "completed")
+
+        # 2) DB 저장 ----------------------------------
+        await _save_stream_turn(run, req, user, image_url)
+
+    except asyncio.CancelledError:
+        # client 가 떠났거나 서버 종료: 진행 중이던 tool 호출까지 함께 취소됨
+        if not run.finished:
+            run.mark_cancelled()
+            TURN_SECONDS.observe(time.perf_counter() - started, "stream", "cancelled")
+            print(f"Stream cancelled: thread={req.thread_id} run={run.id}")
+            await _save_stream_turn(run, req, user, image_url, status="cancelled")
+        raise
+    except Exception as e:
+        print(f"Stream error: {e}")
+        run.fail(str(e))
+        TURN_SECONDS.observe(time.perf_counter() - started, "stream", "failed")
+    finally:
+        chat_gate.release(ticket, history_usage["sent"] if history_usage else None)
+
+@app.post("/chat/stream")
+async def chat_stream(
+    req: ChatReq,
+    format: Optional[str] = Query(None, pattern="^(sse|ndjson|text)$"),
+    accept: str = Header("", alias="Accept"),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(current_user),
+):
+    # 0) 권한 체크
+    await db.scalar(select(Thread).where(Thread.id == req.thread_id, Thread.user_id == user)) \
+        or (_ for _ in ()).throw(HTTPException(404))
+
+    # 1) quota / 대기열 확인 (거절이면 스트림을 열기 전에 429)
+    try:
+        ticket = chat_gate.admit(user, _estimate_turn_tokens(req))
+    except Rejected as e:
+        raise _rejected(e)
+
+    # 2) run 시작 → 첫 event 로 run id 를 알려 재접속에 쓰게 한다
+    run = stream_runs.create(user, req.thread_id)
+    run.emit("run", run_id=run.id, thread_id=req.thread_id)
+    run.task = asyncio.create_task(_run_stream(run, req, user, ticket))
+    return _stream_response(run, negotiate_format(format, accept))
+
+@app.get("/chat/stream/{run_id}")
+async def resume_chat_stream(
+    run_id: str,
+    format: Optional[str] = Query(None, pattern="^(sse|ndjson|text)$"),
+    last_event_id: int = Header(0, alias="Last-Event-ID"),
+    accept: str = Header("", alias="Accept"),
+    user=Depends(current_user),
+):
+    """Re-attach to a running (or recently finished) stream after ``Last-Event-ID``."""
+    run = stream_runs.get(run_id)
+    if run is None or run.owner != user:
+        raise HTTPException(404)
+    return _stream_response(run, negotiate_format(format, accept), last_event_id)
+
+@app.delete("/chat/stream/{run_id}")
+async def cancel_chat_stream(run_id: str, user=Depends(current_user)):
+    """Stop a run right away (the user pressed stop); the partial turn is kept."""
+    run = stream_runs.get(run_id)
+    if run is None or run.owner != user:
+        raise HTTPException(404)
+    run.cancel()
+    return {"ok": True}
+
+# 에이전트 node 가 시작될 때 보낼 step
+AGENT_HANDOFF_STEPS = {
+    "reliability_searcher": ("📋 신뢰성 전문가에게 전달합니다...", "🔍 신뢰성 정보를 검색하고 있습니다..."),
+    "websearcher": ("🌐 웹 검색 전문가에게 전달합니다...", "🔍 웹에서 최신 정보를 검색하고 있습니다..."),
+    "coder": ("💻 코딩 전문가에게 전달합니다...", "🐍 코드를 실행하고 있습니다..."),
+}
+
+def _event_agent(event: dict) -> str:
+    """Top-level graph node (supervisor or agent) an astream_events event belongs to."""
+    ns = (event.get("metadata") or {}).get("langgraph_checkpoint_ns") or ""
+    return ns.split("|", 1)[0].split(":", 1)[0] or "supervisor"
+
 # Helper function to get agent display name
 def get_agent_name(agent_type: str) -> str:
     agent_names = {
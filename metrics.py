@@ -0,0 +1,131 @@
+# backend/metrics.py  ────────────────────────────────────────
+"""In-process latency/throughput metrics in the Prometheus text format.
+
+Histograms are plain Python objects updated from the event loop (no locks, no
+dependency on ``prometheus_client``); callback gauges read live values such as
+queue depths, or counters the components already keep, only when ``/metrics``
+is scraped. Hot paths should
+accumulate locally and ``observe`` once per model call, tool call or turn.
+"""
+import contextlib, math, time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+# 초 단위 기본 bucket (수 ms 의 DB commit 부터 수십 초 걸리는 agent 실행까지)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS    = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self.buckets    = tuple(sorted(buckets))
+        self._series: Dict[Labels, List[float]] = {}   # [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> Iterator[str]:
+        for labels, series in self._series.items():
+            total = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                total += count
+                le = 'le="%s"' % _num(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {total}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(series[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {total}"
+
+
+GaugeValue = Union[float, Dict[Labels, float]]
+
+
+class CallbackGauge:
+    """Value read at scrape time; ``fn`` returns a number or ``{label values: number}``."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], GaugeValue],
+                 labelnames: Sequence[str] = (), type: str = "gauge"):
+        self.name       = name
+        self.help       = help
+        self.fn         = fn
+        self.labelnames = tuple(labelnames)
+        self.type       = type
+
+    def render(self) -> Iterator[str]:
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"Metric {self.name} error: {e}")
+            return
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, v in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}"
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = ""):
+        self.prefix   = prefix
+        self._metrics: Dict[str, Union[Histogram, CallbackGauge]] = {}
+
+    def _add(self, metric):
+        metric.name = self.prefix + metric.name
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], GaugeValue],
+              labelnames: Sequence[str] = (), type: str = "gauge") -> CallbackGauge:
+        return self._add(CallbackGauge(name, help, fn, labelnames, type))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,277 @@
+# backend/sandbox.py  ────────────────────────────────────────
+"""Process-pool sandbox for the coder agent's Python tool.
+
+Each worker is a separate (spawned) process with numpy, pandas and matplotlib
+(Agg backend) imported up front, so heavy computation never holds the API
+server's GIL. Every execution gets a fresh namespace, a wall-clock limit
+(the worker is killed and replaced when it is exceeded) and an address-space
+limit. Open matplotlib figures and ``IMAGE_DATA:`` blobs printed by the code
+come back as PNG bytes instead of base64 text.
+
+This module is imported by the worker processes too, so it must stay light:
+LangChain is only imported inside ``make_sandbox_tool``.
+"""
+import base64, io, multiprocessing as mp, os, queue, re, sys, threading, time, traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout, redirect_stderr
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Set
+
+PRELOAD_MODULES = ("numpy", "pandas", "matplotlib", "matplotlib.pyplot")
+MAX_OUTPUT_CHARS = 20_000
+CANCEL_POLL_INTERVAL = 0.1
+_IMAGE_DATA_RE = re.compile(r"IMAGE_DATA:\s*([A-Za-z0-9+/=\s]+)")
+
+
+@dataclass
+class SandboxResult:
+    output: str = ""
+    error: Optional[str] = None
+    charts: List[bytes] = field(default_factory=list)
+    timed_out: bool = False
+    cancelled: bool = False
+
+
+# ── worker 프로세스 쪽 ─────────────────────────────────────
+def _collect_figures() -> List[bytes]:
+    plt = sys.modules.get("matplotlib.pyplot")
+    if plt is None:
+        return []
+    charts = []
+    for num in plt.get_fignums():
+        buf = io.BytesIO()
+        plt.figure(num).savefig(buf, format="png", bbox_inches="tight")
+        charts.append(buf.getvalue())
+    plt.close("all")
+    return charts
+
+
+def _execute(code: str) -> dict:
+    buf = io.StringIO()
+    error = None
+    try:
+        with redirect_stdout(buf), redirect_stderr(buf):
+            exec(code, {"__name__": "__main__"})
+    except BaseException:
+        error = traceback.format_exc(limit=5)
+    charts = _collect_figures()
+
+    output = buf.getvalue()
+    for blob in _IMAGE_DATA_RE.findall(output):
+        try:
+            charts.append(base64.b64decode("".join(blob.split())))
+        except ValueError:
+            pass
+    output = _IMAGE_DATA_RE.sub("", output)
+    if len(output) > MAX_OUTPUT_CHARS:
+        output = output[:MAX_OUTPUT_CHARS] + "\n...(output truncated)"
+    return {"output": output, "error": error, "charts": charts}
+
+
+def _worker_main(conn, memory_mb: int, preload: tuple):
+    if memory_mb:
+        try:
+            import resource
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass
+    os.environ["MPLBACKEND"] = "Agg"
+    for name in preload:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    while True:
+        try:
+            code = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        conn.send(_execute(code))
+
+
+# ── 서버 프로세스 쪽 ───────────────────────────────────────
+class _Worker:
+    def __init__(self, ctx, memory_mb: int, preload: tuple):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child, memory_mb, preload), daemon=True)
+        self.proc.start()
+        child.close()
+
+    def kill(self):
+        self.proc.kill()
+        self.proc.join()
+        self.conn.close()
+
+
+class SandboxPool:
+    """Pool of pre-warmed worker processes; ``run`` blocks, so call it on ``executor``."""
+
+    def __init__(self, size: int = 2, timeout: float = 30.0, memory_mb: int = 1024,
+                 preload: tuple = PRELOAD_MODULES):
+        self.size      = size
+        self.timeout   = timeout
+        self.memory_mb = memory_mb
+        self.preload   = preload
+        self._ctx      = mp.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: Set[_Worker] = set()     # 대기 중 + 실행 중인 모든 worker
+        self._lock     = threading.RLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._started  = False
+        self._closed   = False
+
+    def _spawn(self) -> _Worker:
+        with self._lock:
+            worker = _Worker(self._ctx, self.memory_mb, self.preload)
+            self._workers.add(worker)
+            return worker
+
+    def _retire(self, worker: _Worker):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.kill()
+
+    def _replace(self, worker: _Worker) -> Optional[_Worker]:
+        self._retire(worker)
+        with self._lock:
+            return None if self._closed else self._spawn()
+
+    def _release(self, worker: Optional[_Worker]):
+        if worker is None:
+            return
+        with self._lock:
+            if not self._closed:
+                self._idle.put(worker)
+                return
+        self._retire(worker)
+
+    def _checkout(self, cancel: Optional[threading.Event]) -> Optional[_Worker]:
+        """Wait for an idle worker; ``None`` when ``cancel`` is set first."""
+        while True:
+            if self._closed:
+                raise RuntimeError("Sandbox pool is closed")
+            if cancel is not None and cancel.is_set():
+                return None
+            try:
+                return self._idle.get(timeout=CANCEL_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Threads for calling ``run`` from async code, one per worker.
+
+        Callers beyond the pool size queue here instead of holding threads of
+        the loop's default executor, which file and database I/O share.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.size, thread_name_prefix="sandbox")
+            return self._executor
+
+    def start(self):
+        """Spawn the workers (again, after ``close``)."""
+        with self._lock:
+            self._closed = False
+            if self._started:
+                return
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+            self._started = True
+
+    def close(self):
+        """Kill every worker, including ones running code; ``run`` raises until ``start``."""
+        with self._lock:
+            self._closed = True
+            self._started = False
+            workers, self._workers = self._workers, set()
+            executor, self._executor = self._executor, None
+            while not self._idle.empty():
+                self._idle.get_nowait()
+        for worker in workers:
+            worker.kill()
+        if executor is not None:
+            # 대기 중인 호출은 _closed 를 보고 RuntimeError 로 끝남
+            executor.shutdown(wait=False)
+
+    def run(self, code: str, cancel: Optional[threading.Event] = None) -> SandboxResult:
+        """Execute ``code``; setting ``cancel`` kills the worker like a timeout does."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Sandbox pool is closed")
+            if not self._started:
+                self.start()
+        worker = self._checkout(cancel)
+        if worker is None:
+            return SandboxResult(error="Execution cancelled", cancelled=True)
+        try:
+            worker.conn.send(code)
+            deadline = time.monotonic() + self.timeout
+            while not worker.conn.poll(min(CANCEL_POLL_INTERVAL, max(0.0, deadline - time.monotonic()))):
+                if cancel is not None and cancel.is_set():
+                    worker = self._replace(worker)
+                    return SandboxResult(error="Execution cancelled", cancelled=True)
+                if time.monotonic() >= deadline:
+                    worker = self._replace(worker)
+                    return SandboxResult(error=f"Execution timed out after {self.timeout:g}s", timed_out=True)
+            return SandboxResult(**worker.conn.recv())
+        except (EOFError, BrokenPipeError, ConnectionResetError, OSError):
+            # 메모리 한도 초과 등으로 worker 가 죽은 경우 (close 로 죽인 경우 포함)
+            worker = self._replace(worker)
+            if self._closed:
+                return SandboxResult(error="Sandbox is shutting down")
+            return SandboxResult(error="Sandbox worker crashed (memory limit exceeded?)")
+        finally:
+            self._release(worker)
+
+
+def make_sandbox_tool(pool: SandboxPool, store_chart: Callable[[bytes], str],
+                      name: str = "Python_REPL"):
+    """Drop-in replacement for ``PythonREPLTool`` backed by ``pool``.
+
+    Charts are handed to ``store_chart`` (bytes → URL) and reported in the tool
+    artifact as ``{"charts": [url, ...]}``; the text content only mentions them.
+    """
+    import asyncio
+    from langchain_core.tools import StructuredTool
+    from pydantic import BaseModel, Field
+
+    class _Args(BaseModel):
+        query: str = Field(description="A valid python command to execute")
+
+    def _format(result: SandboxResult) -> tuple:
+        urls = [store_chart(data) for data in result.charts]
+        text = result.output
+        if result.error:
+            text = f"{text}\n{result.error}" if text else result.error
+        for url in urls:
+            text += f"\n[chart saved: {url}]"
+        return text.strip(), {"charts": urls}
+
+    def _run(query: str) -> tuple:
+        return _format(pool.run(query))
+
+    async def _arun(query: str) -> tuple:
+        # graph run 이 취소되면 worker 도 바로 종료 (thread 는 취소로 멈추지 않으므로)
+        cancel = threading.Event()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                pool.executor, lambda: _format(pool.run(query, cancel)))
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    return StructuredTool.from_function(
+        func=_run,
+        coroutine=_arun,
+        name=name,
+        description=(
+            "A Python shell running in an isolated worker process. Use this to execute "
+            "python commands. Input should be a valid python command. Print values to see "
+            "them. numpy, pandas and matplotlib are available; open figures are saved "
+            "automatically as charts."
+        ),
+        args_schema=_Args,
+        response_format="content_and_artifact",
+    )
@@ -0,0 +1,248 @@
+# backend/scheduler.py  ──────────────────────────────────────
+"""Per-user fair admission in front of graph execution.
+
+``FairScheduler`` caps concurrent graph runs globally and decides who goes
+next when a slot frees up:
+
+* every user has two token buckets, requests per minute and estimated model
+  tokens per minute; an empty bucket rejects the request with a
+  ``Retry-After`` instead of letting it queue;
+* waiting requests are ordered by start-time fair queuing (SFQ) over users,
+  weighted per user and charged by estimated tokens, so one user with many
+  requests cannot starve the others;
+* a waiting request can be told its queue position as it changes.
+
+Token charges are estimates taken at admission and settled with the actual
+usage when the run ends (``release(ticket, actual_tokens)``).
+"""
+import asyncio, contextlib, heapq, itertools, time
+from typing import Callable, Dict, List, Optional
+
+
+class Rejected(Exception):
+    """Request refused by admission; ``status`` is 429 (over quota/queue) or 503 (timed out)."""
+
+    def __init__(self, status: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status      = status
+        self.detail      = detail
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills at ``rate`` per second up to ``capacity``; the level may go negative (debt)."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate     = rate
+        self.capacity = capacity
+        self.level    = capacity
+        self._stamp   = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` (capped at capacity) is available; 0 if it is now."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def give(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.level >= self.capacity
+
+
+class _User:
+    __slots__ = ("requests", "tokens", "last_finish", "active")
+
+    def __init__(self, requests: Optional[TokenBucket], tokens: Optional[TokenBucket]):
+        self.requests    = requests
+        self.tokens      = tokens
+        self.last_finish = 0.0
+        self.active      = 0      # 대기 + 실행 중인 요청 수
+
+
+class Ticket:
+    """One admitted request: queued, then running, then released."""
+
+    def __init__(self, user: str, cost: float, start: float, seq: int):
+        self.user     = user
+        self.cost     = cost
+        self.start    = start
+        self.seq      = seq
+        self.state    = "queued"      # queued → running → done
+        self.actual_tokens: Optional[float] = None
+        self.position = 0
+        self.on_position: Optional[Callable[[int], None]] = None
+        self.granted: Optional[asyncio.Future] = None
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return (self.start, self.seq) < (other.start, other.seq)
+
+
+class FairScheduler:
+    def __init__(self, limit: int, max_queue: int, timeout: float, retry_after: int,
+                 user_rpm: float = 0, user_burst: float = 10, user_tpm: float = 0,
+                 weights: Optional[Dict[str, float]] = None, cost_unit: float = 1000.0):
+        self.limit       = limit
+        self.max_queue   = max_queue
+        self.timeout     = timeout
+        self.retry_after = retry_after
+        self.user_rpm    = user_rpm
+        self.user_burst  = user_burst
+        self.user_tpm    = user_tpm
+        self.weights     = weights or {}
+        self.cost_unit   = cost_unit
+        self.running     = 0
+        self.counters    = {"admitted": 0, "rejected_rate": 0, "rejected_tokens": 0,
+                            "rejected_queue": 0, "timed_out": 0}
+        self._vtime      = 0.0
+        self._seq        = itertools.count()
+        self._queue: List[Ticket] = []
+        self._users: Dict[str, _User] = {}
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for t in self._queue if t.state == "queued")
+
+    # ── 사용자별 quota ──────────────────────────────────────
+    def _user(self, name: str) -> _User:
+        user = self._users.get(name)
+        if user is None:
+            if len(self._users) >= 4096:
+                self._prune()
+            user = self._users[name] = _User(
+                TokenBucket(self.user_rpm / 60, self.user_burst) if self.user_rpm > 0 else None,
+                TokenBucket(self.user_tpm / 60, self.user_tpm) if self.user_tpm > 0 else None,
+            )
+        return user
+
+    def _prune(self):
+        # 쉬고 있고 bucket 이 가득 찬 사용자는 새로 만든 것과 같으므로 버린다
+        for name in [n for n, u in self._users.items()
+                     if not u.active and (u.requests is None or u.requests.full)
+                     and (u.tokens is None or u.tokens.full) and u.last_finish <= self._vtime]:
+            del self._users[name]
+
+    def _reject(self, status: int, detail: str, retry_after: Optional[float] = None) -> Rejected:
+        return Rejected(status, detail, max(1, round(retry_after)) if retry_after else self.retry_after)
+
+    # ── 대기열 ─────────────────────────────────────────────
+    def admit(self, user: str, tokens: float) -> Ticket:
+        """Charge ``user``'s quotas and enqueue a request of ``tokens`` estimated tokens."""
+        state = self._user(user)
+        if state.requests is not None:
+            wait = state.requests.wait_time(1)
+            if wait:
+                self.counters["rejected_rate"] += 1
+                raise self._reject(429, "Too many requests for this user", wait)
+        if state.tokens is not None:
+            # 한 요청이 capacity 를 넘어도 받아 주고 빚으로 남긴다
+            wait = state.tokens.wait_time(1) if state.tokens.level <= 0 else 0.0
+            if wait:
+                self.counters["rejected_tokens"] += 1
+                raise self._reject(429, "Token quota exceeded for this user", wait)
+        if self.running >= self.limit and self.waiting >= self.max_queue:
+            self.counters["rejected_queue"] += 1
+            raise self._reject(429, "Too many concurrent chats")
+
+        if state.requests is not None:
+            state.requests.take(1)
+        if state.tokens is not None:
+            state.tokens.take(tokens)
+        weight = self.weights.get(user, 1.0)
+        start = max(self._vtime, state.last_finish)
+        state.last_finish = start + tokens / self.cost_unit / weight
+        state.active += 1
+        ticket = Ticket(user, tokens, start, next(self._seq))
+        heapq.heappush(self._queue, ticket)
+        self.counters["admitted"] += 1
+        self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        while self.running < self.limit and self._queue:
+            ticket = heapq.heappop(self._queue)
+            if ticket.state != "queued":
+                continue
+            ticket.state = "running"
+            self.running += 1
+            self._vtime = ticket.start
+            if ticket.granted is not None and not ticket.granted.done():
+                ticket.granted.set_result(None)
+        self._notify_positions()
+
+    def _notify_positions(self):
+        waiting = sorted(t for t in self._queue if t.state == "queued")
+        for position, ticket in enumerate(waiting, 1):
+            if ticket.position != position:
+                ticket.position = position
+                if ticket.on_position is not None:
+                    ticket.on_position(position)
+
+    async def wait(self, ticket: Ticket, on_position: Optional[Callable[[int], None]] = None):
+        """Wait until ``ticket`` holds a slot; ``on_position`` gets each new queue position."""
+        if ticket.state == "running":
+            return
+        ticket.on_position = on_position
+        if on_position is not None and ticket.position:
+            on_position(ticket.position)
+        ticket.granted = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(ticket.granted, self.timeout)
+        except asyncio.TimeoutError:
+            self.counters["timed_out"] += 1
+            self.release(ticket)
+            raise self._reject(503, "Chat queue timeout")
+        finally:
+            ticket.on_position = None
+
+    def release(self, ticket: Ticket, actual_tokens: Optional[float] = None):
+        """Free the slot (or leave the queue) and settle the token estimate with ``actual_tokens``."""
+        if ticket.state == "done":
+            return
+        was_running = ticket.state == "running"
+        ticket.state = "done"
+        state = self._users.get(ticket.user)
+        if state is not None:
+            state.active -= 1
+            if state.tokens is not None:
+                if actual_tokens is None and not was_running:
+                    state.tokens.give(ticket.cost)            # 실행 전에 빠졌으면 전부 환불
+                elif actual_tokens is not None:
+                    state.tokens.give(ticket.cost - actual_tokens)
+        if was_running:
+            self.running -= 1
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, user: str, tokens: float):
+        ticket = self.admit(user, tokens)
+        try:
+            await self.wait(ticket)
+            yield ticket
+        finally:
+            self.release(ticket, ticket.actual_tokens)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "running": self.running, "waiting": self.waiting, "users": len(self._users)}
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """``"alice=2,bob=0.5"`` → ``{"alice": 2.0, "bob": 0.5}``."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        weights[name.strip()] = float(value) if value else 1.0
+    return weights
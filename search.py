@@ -0,0 +1,179 @@
+# backend/search.py  ─────────────────────────────────────────
+"""Full-text search over chat messages with SQLite FTS5.
+
+``messages_fts`` is an external-content FTS5 table over ``messages``, tokenized
+with ``trigram`` so Korean text matches by substring without a morphological
+analyzer. Triggers keep it in sync on insert, update and delete.
+
+The index is global, so every message also indexes ``owner_key``: the thread
+owner's id hashed into three private-use characters, i.e. exactly one trigram
+per user. ``owner_key:"…" AND content:"…"`` then walks the caller's own
+postings instead of everyone's matches; the join on ``threads.user_id`` still
+checks ownership, so a hash collision can only cost time, never leak rows.
+The writer sets ``owner_key`` (``persist_messages``); rows inserted without
+it stay indexed but are never returned.
+
+Ranking avoids ``bm25()``: its IDF pass reads each term's posting list over the
+whole table, which grows with every user's history. The score is the BM25
+term-frequency part only, counted with plain string functions on the caller's
+own matches, and snippets are cut in Python for the returned page only (the
+FTS5 ``highlight``/``snippet`` functions re-tokenize every match). Trigram
+matching needs at least three characters; shorter terms (common in Korean,
+e.g. "수명") become ``LIKE`` filters on those matches.
+"""
+import hashlib, re
+from typing import Any, Dict, List, Optional, Tuple
+
+FTS_TABLE = "messages_fts"
+
+# BM25 의 단어 빈도 포화/문서 길이 보정 (AVG_CHARS 는 보통 메시지 길이)
+K1, B, AVG_CHARS = 1.2, 0.75, 400.0
+MIN_TRIGRAM = 3
+
+
+def owner_key(user: Optional[str]) -> Optional[str]:
+    """Three private-use characters (one trigram) identifying ``user`` in the index."""
+    if user is None:
+        return None
+    h = int.from_bytes(hashlib.blake2b(user.encode(), digest_size=8).digest(), "big")
+    return "".join(chr(0xE000 + (h >> (13 * i)) % 6400) for i in range(3))
+
+
+# ── 색인 ───────────────────────────────────────────────────
+_CREATE_FTS = f"""
+CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+    content, owner_key, content='messages', content_rowid='rowid', tokenize='trigram'
+)"""
+
+_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+         INSERT INTO {FTS_TABLE}(rowid, content, owner_key) VALUES (new.rowid, new.content, new.owner_key);
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+         INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, owner_key)
+         VALUES ('delete', old.rowid, old.content, old.owner_key);
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content, owner_key ON messages BEGIN
+         INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, owner_key)
+         VALUES ('delete', old.rowid, old.content, old.owner_key);
+         INSERT INTO {FTS_TABLE}(rowid, content, owner_key) VALUES (new.rowid, new.content, new.owner_key);
+       END""",
+)
+
+_BACKFILL_OWNER_KEY = """
+UPDATE messages SET owner_key = ?
+WHERE owner_key IS NULL AND thread_id IN (SELECT id FROM threads WHERE user_id = ?)"""
+
+
+def ensure_fts(conn) -> bool:
+    """Create the index and triggers on a sync SQLAlchemy connection; True if it was built."""
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first()
+    built = False
+    if not exists:
+        # trigger 보다 먼저 기존 행을 채우고 한 번에 색인 (행마다 trigger 를 타지 않게)
+        users = conn.exec_driver_sql("SELECT DISTINCT user_id FROM threads").scalars().all()
+        for user in users:
+            conn.exec_driver_sql(_BACKFILL_OWNER_KEY, (owner_key(user), user))
+        conn.exec_driver_sql(_CREATE_FTS)
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        built = True
+    for ddl in _TRIGGERS:
+        conn.exec_driver_sql(ddl)
+    return built
+
+
+# ── 질의 ───────────────────────────────────────────────────
+def _phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _like(text: str) -> str:
+    return "%" + re.sub(r"([\\%_])", r"\\\1", text) + "%"
+
+
+def parse_terms(query: str) -> List[str]:
+    """Whitespace-separated terms; ``"quoted text"`` stays one term."""
+    return [a or b for a, b in re.findall(r'"([^"]+)"|(\S+)', query)]
+
+
+def match_expression(owner: str, terms: List[str]) -> str:
+    """FTS5 MATCH scoped to ``owner``; every term of three or more characters is a phrase.
+
+    FTS5 operators in the terms are treated as plain text.
+    """
+    phrases = [f"owner_key : {_phrase(owner_key(owner))}"]
+    phrases += [f"content : {_phrase(t)}" for t in terms if len(t) >= MIN_TRIGRAM]
+    return " AND ".join(phrases)
+
+
+def _term_score(i: int) -> str:
+    # 단어 등장 횟수 (replace 로 센다) 에 BM25 의 포화/길이 보정을 적용
+    tf = f"((length(m.content) - length(replace(lower(m.content), :term{i}, ''))) / length(:term{i}))"
+    return f"({tf} * {K1 + 1} / ({tf} + {K1} * ({1 - B} + {B} * length(m.content) / {AVG_CHARS})))"
+
+
+def search_sql(terms: List[str], thread: bool, role: bool, recent: bool) -> str:
+    where = [f"f.{FTS_TABLE} MATCH :match", "t.user_id = :owner"]
+    where += [f"m.content LIKE :like{i} ESCAPE '\\'" for i, t in enumerate(terms) if len(t) < MIN_TRIGRAM]
+    if thread:
+        where.append("m.thread_id = :thread_id")
+    if role:
+        where.append("m.role = :role")
+    # rowid 는 삽입 순서이므로 FTS 가 역순으로 읽다가 LIMIT 에서 멈춘다
+    hits = f"""
+SELECT m.rowid AS rid
+FROM {FTS_TABLE} AS f
+JOIN messages AS m ON m.rowid = f.rowid
+JOIN threads AS t ON t.id = m.thread_id
+WHERE {" AND ".join(where)}
+ORDER BY f.rowid DESC"""
+    if recent:
+        score, source, order = "NULL", f"({hits} LIMIT :limit OFFSET :offset)", "hit.rid DESC"
+        page = ""
+    else:
+        # 최신 :window 개 매치 안에서만 점수를 매긴다 (이력이 긴 사용자도 일정한 비용)
+        score, source, order = " + ".join(_term_score(i) for i in range(len(terms))), \
+            f"({hits} LIMIT :window)", "score DESC, hit.rid DESC"
+        page = "\nLIMIT :limit OFFSET :offset"
+    return f"""
+SELECT m.id, m.thread_id, t.title, m.role, m.ts, m.content, {score} AS score
+FROM {source} AS hit
+JOIN messages AS m ON m.rowid = hit.rid
+JOIN threads AS t ON t.id = m.thread_id
+ORDER BY {order}{page}"""
+
+
+def search_params(owner: str, terms: List[str], limit: int, offset: int, thread_id: Optional[str] = None,
+                  role: Optional[str] = None, recent: bool = False,
+                  window: int = 1000) -> Tuple[str, Dict[str, Any]]:
+    """SQL and bind parameters for one page (``limit`` + 1 rows, to detect a next page).
+
+    Relevance ranks only the newest ``window`` matches; ``recent`` pages through all of them.
+    """
+    params: Dict[str, Any] = {
+        "match": match_expression(owner, terms), "owner": owner,
+        "limit": limit + 1, "offset": offset, "window": window,
+    }
+    for i, term in enumerate(terms):
+        params[f"term{i}"] = term.lower()
+        if len(term) < MIN_TRIGRAM:
+            params[f"like{i}"] = _like(term)
+    if thread_id:
+        params["thread_id"] = thread_id
+    if role:
+        params["role"] = role
+    return search_sql(terms, bool(thread_id), bool(role), recent), params
+
+
+def snippet(content: str, terms: List[str], width: int = 80, mark: Tuple[str, str] = ("**", "**")) -> str:
+    """About ``width`` characters around the first match, every term wrapped in ``mark``."""
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    text = " ".join(content.split())
+    first = pattern.search(text)
+    start = max(0, (first.start() if first else 0) - width // 3)
+    end = min(len(text), start + width)
+    start = max(0, min(start, end - width))
+    body = pattern.sub(lambda m: f"{mark[0]}{m.group(0)}{mark[1]}", text[start:end])
+    return ("…" if start else "") + body + ("…" if end < len(text) else "")
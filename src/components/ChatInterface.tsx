@@ -11,6 +11,8 @@ export const ChatInterface = () => {
   const { 
     threads, 
     activeThreadId, 
+    hasMoreThreads,
+    loadMoreThreads,
     handleNewThread, 
     handleSelectThread, 
     handleDeleteThread,
@@ -33,6 +35,8 @@ export const ChatInterface = () => {
     <ChatLayout
       threads={threads}
       activeThreadId={activeThreadId}
+      hasMoreThreads={hasMoreThreads}
+      onLoadMoreThreads={loadMoreThreads}
       onSelectThread={handleSelectThread}
       onNewThread={handleNewThread}
       onDeleteThread={handleDeleteThread}
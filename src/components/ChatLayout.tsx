@@ -13,6 +13,8 @@ interface Thread {
 interface ChatLayoutProps {
   threads: Thread[];
   activeThreadId: string | null;
+  hasMoreThreads: boolean;
+  onLoadMoreThreads: () => void;
   onSelectThread: (id: string) => void;
   onNewThread: () => void;
   onDeleteThread: (id: string) => void;
@@ -25,6 +27,8 @@ interface ChatLayoutProps {
 export const ChatLayout = ({
   threads,
   activeThreadId,
+  hasMoreThreads,
+  onLoadMoreThreads,
   onSelectThread,
   onNewThread,
   onDeleteThread,
@@ -33,7 +37,16 @@ export const ChatLayout = ({
   onLogout,
   updateThreadTitle,
 }: ChatLayoutProps) => {
-  const { messages, isStreaming, messagesEndRef, handleSendMessage, handleToggleSteps, handleStopStreaming } = useMessages(
+  const {
+    messages,
+    isStreaming,
+    messagesEndRef,
+    hasMoreMessages,
+    loadOlderMessages,
+    handleSendMessage,
+    handleToggleSteps,
+    handleStopStreaming,
+  } = useMessages(
     activeThreadId,
     updateThreadTitle
   );
@@ -43,6 +56,8 @@ export const ChatLayout = ({
       <ChatSidebar
         threads={threads}
         activeThreadId={activeThreadId}
+        hasMoreThreads={hasMoreThreads}
+        onLoadMoreThreads={onLoadMoreThreads}
         onSelectThread={onSelectThread}
         onNewThread={onNewThread}
         onDeleteThread={onDeleteThread}
@@ -63,6 +78,16 @@ export const ChatLayout = ({
                 />
               ) : (
                 <div>
+                  {hasMoreMessages && (
+                    <div className="flex justify-center py-3">
+                      <button
+                        className="text-sm text-muted-foreground hover:text-foreground"
+                        onClick={loadOlderMessages}
+                      >
+                        이전 메시지 더 보기
+                      </button>
+                    </div>
+                  )}
                   {messages.map((message, index) => (
                     <ChatMessage
                       key={index}
@@ -21,6 +21,8 @@ interface Thread {
 interface ChatSidebarProps {
   threads: Thread[];
   activeThreadId: string | null;
+  hasMoreThreads: boolean;
+  onLoadMoreThreads: () => void;
   onSelectThread: (id: string) => void;
   onNewThread: () => void;
   onDeleteThread: (id: string) => void;
@@ -33,6 +35,8 @@ interface ChatSidebarProps {
 export const ChatSidebar = ({
   threads,
   activeThreadId,
+  hasMoreThreads,
+  onLoadMoreThreads,
   onSelectThread,
   onNewThread,
   onDeleteThread,
@@ -182,6 +186,16 @@ export const ChatSidebar = ({
               </ContextMenuContent>
             </ContextMenu>
           ))}
+          {hasMoreThreads && (
+            <Button
+              variant="ghost"
+              size="sm"
+              onClick={onLoadMoreThreads}
+              className="w-full text-sidebar-foreground"
+            >
+              대화 더 보기
+            </Button>
+          )}
         </div>
       </div>
 
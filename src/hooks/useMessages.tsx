@@ -5,10 +5,12 @@ import { useToast } from '@/hooks/use-toast';
 import { useStreamingChat, StreamStep } from './useStreamingChat';
 
 export interface Message {
+  id?: string;
   role: 'user' | 'assistant';
   content: string;
   image?: string;
   timestamp?: string;
+  createdAt?: string;
   isStreaming?: boolean;
   steps?: StreamStep[];
   showSteps?: boolean;
@@ -19,11 +21,12 @@ export const useMessages = (
   updateThreadTitle: (threadId: string, title: string) => Promise<void>
 ) => {
   const [messages, setMessages] = useState<Message[]>([]);
+  const [hasMoreMessages, setHasMoreMessages] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const streamingMsgIndexRef = useRef<number | null>(null);
   const { toast } = useToast();
 
-  const handleMessageComplete = (content: string, steps: StreamStep[]) => {
+  const handleMessageComplete = (content: string, steps: StreamStep[], image?: string) => {
     setMessages(prev => {
       const newMessages = [...prev];
       const idx =
@@ -40,6 +43,7 @@ export const useMessages = (
         });
         target.steps = steps;
         target.showSteps = false;
+        if (image) target.image = image;
       }
       streamingMsgIndexRef.current = null;
       return newMessages;
@@ -63,22 +67,44 @@ export const useMessages = (
     }
   }, [activeThreadId]);
 
+  const toDisplayMessages = (messagesData: Message[]): Message[] =>
+    messagesData.map(msg => ({
+      ...msg,
+      createdAt: msg.timestamp,
+      timestamp: msg.timestamp
+        ? new Date(msg.timestamp).toLocaleTimeString('ko-KR', {
+            hour: '2-digit',
+            minute: '2-digit',
+          })
+        : undefined,
+      steps: msg.steps || [],
+      showSteps: false,
+    }));
+
   const loadMessages = async (threadId: string) => {
     try {
-      const messagesData = await apiClient.getMessages(threadId);
-      setMessages(
-        messagesData.map(msg => ({
-          ...msg,
-          timestamp: msg.timestamp
-            ? new Date(msg.timestamp).toLocaleTimeString('ko-KR', {
-                hour: '2-digit',
-                minute: '2-digit',
-              })
-            : undefined,
-          steps: msg.steps || [],
-          showSteps: false,
-        }))
-      );
+      const page = await apiClient.getMessages(threadId);
+      setMessages(toDisplayMessages(page.messages));
+      setHasMoreMessages(page.hasMore);
+    } catch (error) {
+      toast({
+        title: "오류",
+        description: "메시지를 불러오는데 실패했습니다.",
+        variant: "destructive",
+      });
+    }
+  };
+
+  // 이전 페이지 불러오기 (가장 오래된 메시지의 (시각, id) 기준 keyset)
+  const loadOlderMessages = async () => {
+    const oldest = messages.find(msg => msg.createdAt && msg.id);
+    if (!activeThreadId || !oldest) return;
+    try {
+      const page = await apiClient.getMessages(activeThreadId, {
+        before: `${oldest.createdAt}|${oldest.id}`,
+      });
+      setMessages(prev => [...toDisplayMessages(page.messages), ...prev]);
+      setHasMoreMessages(page.hasMore);
     } catch (error) {
       toast({
         title: "오류",
@@ -175,6 +201,8 @@ export const useMessages = (
     messages: displayMessages,
     isStreaming: streamingState.isStreaming,
     messagesEndRef,
+    hasMoreMessages,
+    loadOlderMessages,
     handleSendMessage,
     handleToggleSteps,
     handleStopStreaming: stopStreaming,
@@ -17,7 +17,7 @@ export interface StreamingState {
 
 export const useStreamingChat = (
   activeThreadId: string | null,
-  onMessageComplete: (content: string, steps: StreamStep[]) => void
+  onMessageComplete: (content: string, steps: StreamStep[], image?: string) => void
 ) => {
   const [streamingState, setStreamingState] = useState<StreamingState>({
     isStreaming: false,
@@ -27,6 +27,7 @@ export const useStreamingChat = (
   });
   
   const abortControllerRef = useRef<AbortController | null>(null);
+  const runIdRef = useRef<string | null>(null);
   const { toast } = useToast();
 
   const sendStreamingMessage = async (content: string, image?: string) => {
@@ -46,72 +47,131 @@ export const useStreamingChat = (
       showSteps: false,
     });
 
-    try {
-      const response = await fetch(`${apiClient['API_BASE'] || 'http://localhost:8000'}/chat/stream`, {
-        method: 'POST',
-        headers: apiClient['getHeaders'](),
-        body: JSON.stringify({
-          thread_id: activeThreadId,
-          question: content,
-          image: image
-        }),
-        signal: abortControllerRef.current.signal,
-      });
-
-      if (!response.ok) {
-        throw new Error('Failed to send message');
+    const controller = abortControllerRef.current;
+    const base = apiClient['API_BASE'] || 'http://localhost:8000';
+    let accumulatedContent = '';
+    let steps: StreamStep[] = [];
+    let runId: string | null = null;
+    let lastEventId = 0;
+    let finished = false;
+    let imageUrl: string | undefined;
+
+    // 서버 이벤트 하나를 상태에 반영 (token 은 서버에서 이미 묶여서 온다)
+    const handleEvent = (type: string, data: any) => {
+      switch (type) {
+        case 'run':
+          runId = data.run_id;
+          runIdRef.current = runId;
+          break;
+        case 'step':
+        case 'obs':
+          steps = [...steps, { type: type === 'step' ? 'step' : 'observation', content: data.content }];
+          setStreamingState(prev => ({ ...prev, steps }));
+          break;
+        case 'token':
+          accumulatedContent += data.text;
+          setStreamingState(prev => ({ ...prev, currentContent: accumulatedContent }));
+          break;
+        case 'snapshot':
+          // 재접속 시 ring buffer 를 벗어난 구간은 현재까지의 상태로 대체
+          accumulatedContent = data.content;
+          steps = data.steps;
+          setStreamingState(prev => ({ ...prev, currentContent: accumulatedContent, steps }));
+          break;
+        case 'done':
+          accumulatedContent = data.content ?? accumulatedContent;
+          imageUrl = data.image ? (data.image.startsWith('http') ? data.image : `${base}${data.image}`) : undefined;
+          finished = true;
+          break;
+        case 'cancelled':
+          accumulatedContent = data.content ?? accumulatedContent;
+          finished = true;
+          break;
+        case 'error':
+          finished = true;
+          throw new Error(data.message);
       }
+    };
 
+    // SSE 프레임("id:/event:/data:" + 빈 줄) 파싱
+    const readEvents = async (response: Response) => {
       const reader = response.body?.getReader();
       if (!reader) {
         throw new Error('No response body');
       }
-
       const decoder = new TextDecoder();
-      let accumulatedContent = '';
-      const steps: StreamStep[] = [];
       let buffer = '';
-
-      // --- streaming parse loop (token + STEP/OBS/DONE) ---
-      while (true) {
+      while (!finished) {
         const { done, value } = await reader.read();
         if (done) break;
-
         buffer += decoder.decode(value, { stream: true });
 
-        let nl: number;
-        while ((nl = buffer.indexOf('\n')) !== -1) {
-          const line = buffer.slice(0, nl);
-          buffer = buffer.slice(nl + 1);
-
-          if (line.startsWith('[STEP]')) {
-            steps.push({ type: 'step', content: line.replace('[STEP]', '').trim() });
-            setStreamingState(prev => ({ ...prev, steps: [...steps] }));
-          } else if (line.startsWith('[OBS]')) {
-            steps.push({ type: 'observation', content: line.replace('[OBS]', '').trim() });
-            setStreamingState(prev => ({ ...prev, steps: [...steps] }));
-          } else if (line === '[DONE]') {
-            buffer = '';
-            break;
-          } else {
-            accumulatedContent += line + '\n';
-            setStreamingState(prev => ({ ...prev, currentContent: accumulatedContent }));
+        let sep: number;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+          const frame = buffer.slice(0, sep);
+          buffer = buffer.slice(sep + 2);
+          let type = 'message';
+          let data = '';
+          for (const line of frame.split('\n')) {
+            if (line.startsWith('id:')) lastEventId = Number(line.slice(3).trim());
+            else if (line.startsWith('event:')) type = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
           }
+          if (data) handleEvent(type, JSON.parse(data));
         }
       }
+    };
+
+    try {
+      const response = await fetch(`${base}/chat/stream`, {
+        method: 'POST',
+        headers: { ...apiClient['getHeaders'](), Accept: 'text/event-stream' },
+        body: JSON.stringify({
+          thread_id: activeThreadId,
+          question: content,
+          image: image
+        }),
+        signal: controller.signal,
+      });
 
-      if (buffer.trim() && buffer.trim() !== '[DONE]') {
-        accumulatedContent += buffer.trim();
+      if (!response.ok) {
+        throw new Error('Failed to send message');
       }
 
-      accumulatedContent = accumulatedContent.replace(/\[DONE\]/g, '').trim();
+      // 연결이 끊기면 같은 run 에 Last-Event-ID 로 재접속 (graph 는 다시 실행되지 않음)
+      let attempts = 0;
+      let next: Response | null = response;
+      while (!finished) {
+        try {
+          await readEvents(next!);
+          if (finished) break;
+        } catch (error) {
+          if (controller.signal.aborted || finished || !(error instanceof TypeError)) throw error;
+        }
+        if (!runId || attempts >= 3) {
+          throw new Error('Stream disconnected');
+        }
+        attempts += 1;
+        await new Promise(resolve => setTimeout(resolve, 500 * attempts));
+        next = await fetch(`${base}/chat/stream/${runId}`, {
+          headers: {
+            ...apiClient['getHeaders'](),
+            Accept: 'text/event-stream',
+            'Last-Event-ID': String(lastEventId),
+          },
+          signal: controller.signal,
+        });
+        if (!next.ok) {
+          throw new Error('Failed to resume stream');
+        }
+      }
 
       setStreamingState(prev => ({
         ...prev,
         isStreaming: false
       }));
 
-      onMessageComplete(accumulatedContent, steps);
+      onMessageComplete(accumulatedContent.trim(), steps, imageUrl);
 
     } catch (error) {
       if (error instanceof Error && error.name === 'AbortError') {
@@ -145,6 +205,11 @@ export const useStreamingChat = (
     if (abortControllerRef.current) {
       abortControllerRef.current.abort();
     }
+    // 서버의 graph run 도 바로 중단 (부분 답변은 서버에 "cancelled" 로 저장됨)
+    if (runIdRef.current) {
+      apiClient.cancelStream(runIdRef.current).catch(() => {});
+      runIdRef.current = null;
+    }
     setStreamingState(prev => ({
       ...prev,
       isStreaming: false
@@ -10,6 +10,7 @@ interface Thread {
 export const useThreads = (isAuthenticated: boolean) => {
   const [threads, setThreads] = useState<Thread[]>([]);
   const [activeThreadId, setActiveThreadId] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const { toast } = useToast();
 
   useEffect(() => {
@@ -20,8 +21,10 @@ export const useThreads = (isAuthenticated: boolean) => {
 
   const loadThreads = async () => {
     try {
-      const threadsData = await apiClient.getThreads();
+      const page = await apiClient.getThreads();
+      const threadsData = page.threads;
       setThreads(threadsData);
+      setNextCursor(page.nextCursor);
       if (threadsData.length > 0 && !activeThreadId) {
         setActiveThreadId(threadsData[0].id);
       }
@@ -34,6 +37,21 @@ export const useThreads = (isAuthenticated: boolean) => {
     }
   };
 
+  const loadMoreThreads = async () => {
+    if (!nextCursor) return;
+    try {
+      const page = await apiClient.getThreads(nextCursor);
+      setThreads(prev => [...prev, ...page.threads]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      toast({
+        title: "오류",
+        description: "대화 목록을 불러오는데 실패했습니다.",
+        variant: "destructive",
+      });
+    }
+  };
+
   const handleNewThread = async () => {
     try {
       const newThread = await apiClient.createThread();
@@ -70,6 +88,8 @@ export const useThreads = (isAuthenticated: boolean) => {
   return {
     threads,
     activeThreadId,
+    hasMoreThreads: nextCursor !== null,
+    loadMoreThreads,
     handleNewThread,
     handleSelectThread,
     handleDeleteThread,
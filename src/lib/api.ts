@@ -18,11 +18,30 @@ export interface Thread {
 }
 
 export interface Message {
+  id?: string;
   role: 'user' | 'assistant';
   content: string;
   image?: string;
   timestamp?: string;
   steps?: { type: 'step' | 'observation'; content: string }[];
+  status?: 'complete' | 'cancelled';
+}
+
+export interface ThreadPage {
+  threads: Thread[];
+  nextCursor: string | null;
+}
+
+export interface MessagePageOptions {
+  // keyset cursor: `${timestamp}|${id}` of the message to page from
+  before?: string;
+  after?: string;
+  limit?: number;
+}
+
+export interface MessagePage {
+  messages: Message[];
+  hasMore: boolean;
 }
 
 export interface ChatRequest {
@@ -31,6 +50,16 @@ export interface ChatRequest {
   image?: string;
 }
 
+// API_BASE 가 상대 경로(예: 프록시 뒤의 `/api`)여도 동작하도록 new URL() 대신 문자열로 붙인다.
+function withQuery(path: string, params: Record<string, string | number | undefined>): string {
+  const query = new URLSearchParams();
+  for (const [key, value] of Object.entries(params)) {
+    if (value !== undefined && value !== '') query.set(key, String(value));
+  }
+  const qs = query.toString();
+  return qs ? `${path}?${qs}` : path;
+}
+
 class ApiClient {
   private token: string | null = null;
   public API_BASE = API_BASE;
@@ -95,8 +124,9 @@ class ApiClient {
     return { id: data.thread_id, title: data.title };
   }
 
-  async getThreads(): Promise<Thread[]> {
-    const response = await fetch(`${API_BASE}/threads`, {
+  async getThreads(before?: string): Promise<ThreadPage> {
+    // 서버가 ETag 를 주므로 브라우저 캐시가 If-None-Match 재검증(304)을 처리한다.
+    const response = await fetch(withQuery(`${API_BASE}/threads`, { before }), {
       headers: this.getHeaders(),
     });
     
@@ -104,7 +134,8 @@ class ApiClient {
       throw new Error('Failed to fetch threads');
     }
     
-    return response.json();
+    const threads = (await response.json()) as Thread[];
+    return { threads, nextCursor: response.headers.get('X-Next-Cursor') };
   }
 
   async deleteThread(threadId: string) {
@@ -120,8 +151,14 @@ class ApiClient {
     return response.json();
   }
 
-  async getMessages(threadId: string): Promise<Message[]> {
-    const response = await fetch(`${API_BASE}/messages/${threadId}`, {
+  async getMessages(threadId: string, options: MessagePageOptions = {}): Promise<MessagePage> {
+    const url = withQuery(`${API_BASE}/messages/${threadId}`, {
+      before: options.before,
+      after: options.after,
+      limit: options.limit,
+    });
+
+    const response = await fetch(url, {
       headers: this.getHeaders(),
     });
     
@@ -130,12 +167,13 @@ class ApiClient {
     }
     
     const data = (await response.json()) as Message[];
-    return data.map(m => {
+    const messages = data.map(m => {
       if (m.image && !m.image.startsWith('http')) {
         m.image = `${API_BASE}${m.image}`;
       }
       return m;
     });
+    return { messages, hasMore: response.headers.get('X-Has-More') === 'true' };
   }
 
   async sendMessage(request: ChatRequest): Promise<Message> {
@@ -202,6 +240,19 @@ class ApiClient {
     return response.body!;
   }
 
+  async cancelStream(runId: string) {
+    const response = await fetch(`${API_BASE}/chat/stream/${runId}`, {
+      method: 'DELETE',
+      headers: this.getHeaders(),
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to cancel stream');
+    }
+
+    return response.json();
+  }
+
   async renameThread(threadId: string, title: string) {
     const response = await fetch(`${API_BASE}/threads/${threadId}`, {
       method: 'PATCH',
@@ -0,0 +1,289 @@
+# backend/streaming.py  ──────────────────────────────────────
+"""Typed, resumable event streams for ``/chat/stream``.
+
+A graph run writes into a ``StreamRun`` instead of the HTTP response. Every
+event gets a monotonically increasing id and is kept in a bounded ring
+buffer, so a client that dropped can reconnect with ``Last-Event-ID`` and
+continue where it left off; if the gap has already left the buffer it gets a
+``snapshot`` of the answer and steps so far. Model tokens are coalesced on a
+time/size window before they become events.
+
+A run with no attached reader for ``cancel_grace`` seconds is cancelled, so
+closed tabs stop burning model and tool calls while short network drops can
+still resume.
+
+Events: ``run``, ``step``, ``obs``, ``token``, ``snapshot``, ``done``, ``error``,
+``cancelled``.
+They are rendered as SSE, NDJSON or the legacy ``[STEP]``/``[DONE]`` text.
+"""
+import asyncio, json, time, uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+
+@dataclass
+class StreamEvent:
+    id: int
+    type: str
+    data: Dict[str, Any]
+
+
+class StreamRun:
+    """Event log of one graph run; written by the run task, read by any number of clients."""
+
+    def __init__(self, owner: str, thread_id: str, buffer_size: int = 4096,
+                 coalesce_ms: float = 30.0, coalesce_bytes: int = 256, cancel_grace: float = 10.0,
+                 on_end: Optional[Callable[[str], None]] = None):
+        self.id             = uuid.uuid4().hex
+        self.owner          = owner
+        self.thread_id      = thread_id
+        self.coalesce_s     = coalesce_ms / 1000
+        self.coalesce_bytes = coalesce_bytes
+        self.cancel_grace   = cancel_grace
+        self.status         = "running"
+        self._on_end        = on_end
+        self.content        = ""
+        self.steps: List[Dict[str, str]] = []
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._events: Deque[StreamEvent] = deque(maxlen=buffer_size)
+        self._last_id  = 0
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._wake = asyncio.Event()
+        self._subscribers  = 0
+        self._cancel_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    # ── 쓰기 쪽 ────────────────────────────────────────────
+    def _append(self, type_: str, data: Dict[str, Any]) -> int:
+        self._last_id += 1
+        self._events.append(StreamEvent(self._last_id, type_, data))
+        self._wake.set()
+        self._wake = asyncio.Event()
+        return self._last_id
+
+    def _flush_tokens(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending, self._pending_bytes = [], 0
+        self.content += text
+        self._append("token", {"text": text})
+
+    def emit(self, type_: str, **data) -> int:
+        self._flush_tokens()
+        return self._append(type_, data)
+
+    def token(self, text: str):
+        """Queue model output; it is emitted once the window fills or expires."""
+        if not text or self.finished:
+            return
+        self._pending.append(text)
+        self._pending_bytes += len(text.encode())
+        if self._pending_bytes >= self.coalesce_bytes:
+            self._flush_tokens()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.coalesce_s, self._flush_tokens)
+
+    @property
+    def text(self) -> str:
+        """Answer so far, including tokens still waiting in the coalescing window."""
+        return self.content + "".join(self._pending)
+
+    def _add_step(self, type_: str, event: str, content: str, agent: Optional[str]):
+        step = {"type": type_, "content": content}
+        if agent:
+            step["agent"] = agent
+        self.steps.append(step)
+        self.emit(event, **{k: v for k, v in step.items() if k != "type"})
+
+    def step(self, content: str, agent: Optional[str] = None):
+        self._add_step("step", "step", content, agent)
+
+    def obs(self, content: str, agent: Optional[str] = None):
+        self._add_step("observation", "obs", content, agent)
+
+    def _end(self, status: str):
+        self.status = status
+        self.finished_at = time.monotonic()
+        if self._cancel_handle is not None:
+            self._cancel_handle.cancel()
+            self._cancel_handle = None
+        if self._on_end is not None:
+            self._on_end(status)
+
+    def finish(self, **data):
+        """Emit ``done`` carrying the full answer plus ``data``."""
+        if not self.finished:
+            self._flush_tokens()
+            self.emit("done", content=self.content, **data)
+            self._end("completed")
+
+    def fail(self, message: str):
+        if not self.finished:
+            self.emit("error", message=message)
+            self._end("failed")
+
+    def mark_cancelled(self):
+        """Close the log after the run task was cancelled; ``content`` keeps the partial answer."""
+        if not self.finished:
+            self._flush_tokens()
+            self.emit("cancelled", content=self.content)
+            self._end("cancelled")
+
+    # ── 연결 해제 시 취소 ─────────────────────────────────
+    def cancel(self):
+        if not self.finished and self.task is not None:
+            self.task.cancel()
+
+    def _detach(self):
+        self._subscribers -= 1
+        if self._subscribers == 0 and not self.finished:
+            if self.cancel_grace <= 0:
+                self.cancel()
+            elif self._cancel_handle is None:
+                self._cancel_handle = asyncio.get_running_loop().call_later(self.cancel_grace, self._grace_expired)
+
+    def _grace_expired(self):
+        self._cancel_handle = None
+        if self._subscribers == 0:
+            self.cancel()
+
+    # ── 읽기 쪽 ────────────────────────────────────────────
+    async def events(self, after: int = 0, heartbeat: float = 15.0) -> AsyncIterator[Optional[StreamEvent]]:
+        """Yield events with ``id > after``; ``None`` is a heartbeat tick.
+
+        Close the iterator (e.g. ``contextlib.aclosing``) when the client goes
+        away so the run can be cancelled once nobody is reading.
+        """
+        self._subscribers += 1
+        if self._cancel_handle is not None:
+            self._cancel_handle.cancel()
+            self._cancel_handle = None
+        try:
+            oldest = self._events[0].id if self._events else self._last_id + 1
+            if after < oldest - 1:
+                # 요청한 위치가 ring buffer 밖이면 지금까지의 상태를 통째로 보낸다
+                self._flush_tokens()
+                yield StreamEvent(self._last_id, "snapshot", {"content": self.content, "steps": list(self.steps)})
+                after = self._last_id
+            while True:
+                wake = self._wake
+                batch = [e for e in self._events if e.id > after] if self._last_id > after else []
+                for event in batch:
+                    yield event
+                    after = event.id
+                if self.finished and after >= self._last_id:
+                    return
+                if not batch:
+                    try:
+                        await asyncio.wait_for(wake.wait(), heartbeat)
+                    except asyncio.TimeoutError:
+                        yield None
+        finally:
+            self._detach()
+
+
+class StreamRegistry:
+    """Live and recently finished runs, kept ``ttl`` seconds after they end for resumption."""
+
+    def __init__(self, ttl: float = 300.0, **run_options):
+        self.ttl          = ttl
+        self.run_options  = run_options
+        self.counters     = {"started": 0, "completed": 0, "failed": 0, "cancelled": 0}
+        self._runs: Dict[str, StreamRun] = {}
+
+    def _ended(self, status: str):
+        self.counters[status] += 1
+
+    def create(self, owner: str, thread_id: str) -> StreamRun:
+        self.gc()
+        run = StreamRun(owner, thread_id, on_end=self._ended, **self.run_options)
+        self._runs[run.id] = run
+        self.counters["started"] += 1
+        return run
+
+    def get(self, run_id: str) -> Optional[StreamRun]:
+        return self._runs.get(run_id)
+
+    def gc(self):
+        now = time.monotonic()
+        for run_id in [r.id for r in self._runs.values() if r.finished and now - r.finished_at > self.ttl]:
+            del self._runs[run_id]
+
+    def active(self) -> int:
+        return sum(1 for r in self._runs.values() if not r.finished)
+
+    async def cancel_all(self):
+        """Cancel every live run and wait for it to record its partial turn."""
+        tasks = [r.task for r in self._runs.values() if not r.finished and r.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "active": self.active()}
+
+
+# ── 직렬화 ─────────────────────────────────────────────────
+MEDIA_TYPES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+    "text": "text/plain; charset=utf-8",
+}
+
+
+def format_sse(event: Optional[StreamEvent]) -> str:
+    if event is None:
+        return ": ping\n\n"
+    data = json.dumps(event.data, ensure_ascii=False)
+    return f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+def format_ndjson(event: Optional[StreamEvent]) -> str:
+    if event is None:
+        return '{"type":"ping"}\n'
+    return json.dumps({"id": event.id, "type": event.type, **event.data}, ensure_ascii=False) + "\n"
+
+
+def format_text(event: Optional[StreamEvent]) -> str:
+    """Legacy marker protocol (``[STEP]``/``[OBS]``/raw tokens/``[DONE]``)."""
+    if event is None:
+        return ""
+    if event.type == "step":
+        return f"[STEP] {event.data['content']}\n"
+    if event.type == "obs":
+        return f"[OBS] {event.data['content']}\n"
+    if event.type == "token":
+        return event.data["text"]
+    if event.type == "snapshot":
+        return event.data["content"]
+    if event.type == "done":
+        return "[DONE]\n"
+    if event.type == "error":
+        return f"Error: {event.data['message']}"
+    if event.type == "cancelled":
+        return "[CANCELLED]\n"
+    return ""
+
+
+FORMATTERS = {"sse": format_sse, "ndjson": format_ndjson, "text": format_text}
+
+
+def negotiate_format(requested: Optional[str], accept: str = "") -> str:
+    if requested in FORMATTERS:
+        return requested
+    if "application/x-ndjson" in accept:
+        return "ndjson"
+    if "text/plain" in accept and "text/event-stream" not in accept:
+        return "text"
+    return "sse"
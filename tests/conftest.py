@@ -0,0 +1,72 @@
+import os, sys
+from typing import ClassVar, List
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+from fakes import PRESETS, ScriptedChatModel, install
+
+# main 은 import 시점에 설정을 읽으므로 import 전에 정한다
+TEST_ENV = {
+    "CHECKPOINT_KEEP_LAST": "3",
+    "CHECKPOINT_COMPACT_INTERVAL": "0",   # prune 은 테스트가 직접 호출
+    "GC_INTERVAL": "0",
+    "HISTORY_MODE": "full",               # 요약 호출 없이 LLM 호출 수를 그대로 센다
+    "SCHED_USER_RPM": "0",
+    "PYTHON_TOOL": "repl",
+}
+
+
+class CountingChatModel(ScriptedChatModel):
+    """``ScriptedChatModel`` that records every model call; ``streaming`` toggles token streaming."""
+
+    calls: ClassVar[List[List[str]]] = []
+    streaming: ClassVar[bool] = True
+
+    def _should_stream(self, **kwargs) -> bool:
+        return self.streaming and super()._should_stream(**kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append(self.tool_names)
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append(self.tool_names)
+        async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+            yield chunk
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """``main`` running under a TestClient with the fake model and tools, in a scratch directory."""
+    cwd, env = os.getcwd(), dict(os.environ)
+    workdir = tmp_path_factory.mktemp("app")
+    os.chdir(workdir)   # chat.db / prompts 는 현재 디렉터리 기준
+    os.environ.update(TEST_ENV, CHECKPOINT_DB=str(workdir / "lg.sqlite"))
+    os.makedirs("prompts")
+    for name in ("reliability_searcher", "coder", "websearcher"):
+        with open(os.path.join("prompts", f"{name}.md"), "w") as f:
+            f.write(f"You are the {name} agent.")
+
+    import main
+    from fastapi.testclient import TestClient
+    install(main.runtime, PRESETS["zero"])
+    main.runtime.llm = CountingChatModel(latency=0.0, answer_tokens=20)
+    try:
+        with TestClient(main.app) as client:
+            client.main = main
+            yield client
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+
+
+@pytest.fixture
+def auth(app):
+    """Headers of a logged-in user and a new thread of theirs."""
+    token = app.post("/login", json={"user": "tester", "key": "open-sesame"}).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    return headers, app.post("/threads", headers=headers).json()["thread_id"]
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from conftest import CountingChatModel
+
+
+class CountingGraph:
+    """Wraps the compiled graph and counts how often it is executed."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.runs = []
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+    def astream_events(self, *args, **kwargs):
+        self.runs.append("astream_events")
+        return self.graph.astream_events(*args, **kwargs)
+
+    async def ainvoke(self, *args, **kwargs):
+        self.runs.append("ainvoke")
+        return await self.graph.ainvoke(*args, **kwargs)
+
+    def invoke(self, *args, **kwargs):
+        self.runs.append("invoke")
+        return self.graph.invoke(*args, **kwargs)
+
+
+@pytest.fixture
+def graph(app, monkeypatch):
+    counting = CountingGraph(app.main.runtime.simple_agent)
+    monkeypatch.setattr(app.main.runtime, "simple_agent", counting)
+    monkeypatch.setattr(CountingChatModel, "calls", [])
+    return counting
+
+
+def _stream_turn(app, auth, question):
+    headers, tid = auth
+    r = app.post("/chat/stream", params={"format": "ndjson"}, headers=headers,
+                 json={"thread_id": tid, "question": question})
+    assert r.status_code == 200
+    events = [json.loads(line) for line in r.text.splitlines() if line]
+    assert events[-1]["type"] == "done"
+    steps = [e["content"] for e in events if e["type"] == "step"]
+    return "".join(e["text"] for e in events if e["type"] == "token"), steps
+
+
+def _supervisor_calls():
+    return [c for c in CountingChatModel.calls if any(n.startswith("transfer_to_") for n in c)]
+
+
+@pytest.mark.parametrize("streaming", [True, False], ids=["streamed", "fallback"])
+def test_one_graph_run_per_stream_turn(app, auth, graph, monkeypatch, streaming):
+    # streaming=False: supervisor 가 token 을 내지 않아 fallback 경로로 최종 답변을 얻는다
+    monkeypatch.setattr(CountingChatModel, "streaming", streaming)
+
+    answer, steps = _stream_turn(app, auth, "안녕하세요")
+
+    assert graph.runs == ["astream_events"]
+    assert len(CountingChatModel.calls) == len(_supervisor_calls()) == 1
+    assert answer.startswith("종합 답변입니다.")
+    assert ("🎯 최종 답변을 준비하고 있습니다..." in steps) == (not streaming)
+
+
+@pytest.mark.parametrize("streaming", [True, False], ids=["streamed", "fallback"])
+def test_agent_turn_runs_each_model_call_once(app, auth, graph, monkeypatch, streaming):
+    monkeypatch.setattr(CountingChatModel, "streaming", streaming)
+
+    answer, _ = _stream_turn(app, auth, "MTBF 신뢰성 정의를 알려줘")
+
+    assert graph.runs == ["astream_events"]
+    # supervisor → agent (도구 호출, 요약) → supervisor
+    assert len(_supervisor_calls()) == 2
+    assert len(CountingChatModel.calls) == 4
+    assert "📌 출처" in answer
+
+    headers, tid = auth
+    saved = app.get(f"/messages/{tid}", headers=headers).json()
+    assert [m["role"] for m in saved] == ["user", "assistant"]
+    assert saved[-1]["content"] == answer
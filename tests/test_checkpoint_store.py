@@ -0,0 +1,45 @@
+import os, sqlite3
+
+
+def _checkpoint_rows(thread_id: str):
+    with sqlite3.connect(os.environ["CHECKPOINT_DB"]) as conn:
+        rows = conn.execute(
+            "SELECT checkpoint_ns, count(*) FROM checkpoints WHERE thread_id = ? GROUP BY checkpoint_ns",
+            (thread_id,),
+        ).fetchall()
+        writes = conn.execute("SELECT count(*) FROM writes WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+    return dict(rows), writes
+
+
+def test_prune_bounds_rows_per_thread_across_subgraph_namespaces(app, auth):
+    headers, tid = auth
+    saver = app.main.runtime.checkpointer
+    sizes = []
+    for _ in range(6):
+        # 두 agent 를 모두 부르는 질문: turn 마다 subgraph namespace 가 새로 생긴다
+        r = app.post("/chat", headers=headers, json={"thread_id": tid, "question": "MTBF 신뢰성 기준과 최신 뉴스"})
+        assert r.status_code == 200
+        app.portal.call(saver.prune)
+        rows, _ = _checkpoint_rows(tid)
+        sizes.append(sum(rows.values()))
+
+    rows, writes = _checkpoint_rows(tid)
+    assert rows[""] == saver.keep_last
+    assert any(ns for ns in rows), "expected subgraph checkpoints from the latest turn"
+    # 매 turn 이 같은 수의 checkpoint 를 남기므로 prune 뒤의 크기는 더 늘지 않는다
+    assert sizes[-1] == sizes[-2] == sizes[-3]
+    assert len(rows) < 6
+
+    # 남은 write 는 모두 남아 있는 checkpoint 의 것
+    with sqlite3.connect(os.environ["CHECKPOINT_DB"]) as conn:
+        dangling = conn.execute(
+            """SELECT count(*) FROM writes w WHERE thread_id = ? AND NOT EXISTS (
+                   SELECT 1 FROM checkpoints c WHERE c.thread_id = w.thread_id
+                   AND c.checkpoint_ns = w.checkpoint_ns AND c.checkpoint_id = w.checkpoint_id)""",
+            (tid,),
+        ).fetchone()[0]
+    assert writes and dangling == 0
+
+    # 최신 state 는 그대로 읽힌다
+    r = app.post("/chat", headers=headers, json={"thread_id": tid, "question": "안녕하세요"})
+    assert r.status_code == 200
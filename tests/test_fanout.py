@@ -0,0 +1,42 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+import fanout
+from fanout import agent_citations, ensure_citations
+
+
+def _turn(*agent_answers):
+    return [HumanMessage(content="질문")] + [
+        AIMessage(content=text, name=name) for name, text in agent_answers
+    ]
+
+
+def test_citations_stop_at_the_end_of_the_list():
+    messages = _turn(
+        ("reliability_searcher", "요약\n📌 출처\n- a.pdf\n- b.pdf\n\n추가 질문이 있으면 알려주세요."),
+        ("websearcher", "뉴스\n📌 출처: https://example.com/1\n1. https://example.com/2\n감사합니다."),
+    )
+    assert agent_citations(messages) == [
+        "- a.pdf", "- b.pdf", "https://example.com/1", "1. https://example.com/2",
+    ]
+
+
+def test_ensure_citations_appends_only_missing_lines():
+    messages = _turn(("reliability_searcher", "요약\n📌 출처\n- a.pdf\n- b.pdf"))
+    answer, appended = ensure_citations("답변\n📌 출처\n- a.pdf", messages)
+    assert appended == "\n\n📌 출처\n- b.pdf"
+    assert answer.endswith(appended)
+    assert ensure_citations(answer, messages) == (answer, "")
+
+
+@pytest.mark.parametrize("mode, applied", [("sequential", False), ("parallel", True)])
+def test_citations_are_merged_only_in_parallel_mode(app, auth, monkeypatch, mode, applied):
+    calls = []
+    monkeypatch.setattr(app.main, "SUPERVISOR_MODE", mode)
+    monkeypatch.setattr(fanout, "ensure_citations", lambda answer, messages: (calls.append(1), (answer, ""))[1])
+    headers, tid = auth
+    body = {"thread_id": tid, "question": "MTBF 신뢰성 정의를 알려줘"}
+
+    assert app.post("/chat", headers=headers, json=body).status_code == 200
+    assert app.post("/chat/stream", headers=headers, json=body).status_code == 200
+    assert len(calls) == (2 if applied else 0)
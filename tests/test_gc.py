@@ -0,0 +1,22 @@
+def test_gc_endpoint_requires_admin(app, auth):
+    headers, _ = auth
+    assert app.post("/gc", headers=headers).status_code == 403
+
+
+def test_gc_endpoint_refuses_overlapping_and_frequent_passes(app, auth, monkeypatch):
+    headers, _ = auth
+    collector = app.main.collector
+    monkeypatch.setattr(app.main, "GC_ADMINS", {"tester"})
+    monkeypatch.setattr(collector, "_started", None)
+
+    monkeypatch.setattr(collector, "_collecting", True)
+    assert app.post("/gc", headers=headers).status_code == 409
+    monkeypatch.setattr(collector, "_collecting", False)
+
+    r = app.post("/gc", headers=headers)
+    assert r.status_code == 200
+    assert set(collector.totals) <= set(r.json())
+
+    r = app.post("/gc", headers=headers)
+    assert r.status_code == 429
+    assert 0 < int(r.headers["Retry-After"]) <= app.main.GC_MIN_INTERVAL
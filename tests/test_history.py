@@ -0,0 +1,66 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from history import HistoryManager, _turn_text, count_tokens
+
+
+class SlowSummarizer:
+    """Records the turns of every summary call; each call takes ``delay`` seconds."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    async def ainvoke(self, messages, config=None):
+        self.calls.append(messages[-1].content)
+        await asyncio.sleep(self.delay)
+        return AIMessage(content=f"summary {len(self.calls)}")
+
+
+def _turns(n):
+    return [[HumanMessage(content=f"question {i} " + "x" * 300), AIMessage(content=f"answer {i}", name="supervisor")]
+            for i in range(n)]
+
+
+def test_long_backlog_is_folded_in_bounded_batches():
+    turns = _turns(12)
+    per_turn = max(count_tokens(_turn_text(t)) for t in turns)
+    llm = SlowSummarizer()
+    history = HistoryManager(llm, fold_tokens=per_turn * 4)
+
+    assert asyncio.run(history.summarize(turns)) == "summary 3"
+    assert len(llm.calls) == 3
+    assert all(text.count("User:") == 4 for text in llm.calls)
+    # 이전 batch 의 prefix 요약도 캐시되어 있어 이어서 접을 수 있다
+    asyncio.run(history.summarize(turns + _turns(1)))
+    assert len(llm.calls) == 4 and llm.calls[-1].startswith("Existing summary:\nsummary 3")
+
+
+def test_concurrent_hooks_share_one_summary():
+    turns = _turns(5)
+    llm = SlowSummarizer(delay=0.05)
+    history = HistoryManager(llm)
+
+    async def main():
+        return await asyncio.gather(*(history.summarize(turns) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["summary 1"] * 4
+    assert len(llm.calls) == 1
+    assert history.counters["summary_shared"] == 3
+
+
+def test_a_waiter_takes_over_when_the_leader_is_cancelled():
+    turns = _turns(5)
+    llm = SlowSummarizer(delay=0.05)
+    history = HistoryManager(llm)
+
+    async def main():
+        leader = asyncio.create_task(history.summarize(turns))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(history.summarize(turns))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(main()) == "summary 2"
@@ -0,0 +1,35 @@
+import io
+
+from PIL import Image
+
+ROTATE_90_CW = 6   # EXIF Orientation: 보기 전에 시계 방향으로 90도 돌려야 함
+
+
+def _jpeg(size, orientation=None) -> bytes:
+    im = Image.new("RGB", size, (200, 30, 30))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    out = io.BytesIO()
+    im.save(out, "JPEG", exif=exif)
+    return out.getvalue()
+
+
+def _size(data: bytes):
+    with Image.open(io.BytesIO(data)) as im:
+        return im.size, im.getexif().get(0x0112)
+
+
+def test_shrink_applies_exif_orientation(app):
+    data, mime = app.main._shrink_image(_jpeg((3000, 1000), ROTATE_90_CW), 1568)
+    assert mime == "jpeg"
+    assert _size(data) == ((523, 1568), None)
+
+
+def test_small_rotated_image_is_still_made_upright(app):
+    data, _ = app.main._shrink_image(_jpeg((40, 20), ROTATE_90_CW), 1568)
+    assert _size(data) == ((20, 40), None)
+
+
+def test_small_upright_image_is_sent_unchanged(app):
+    assert app.main._shrink_image(_jpeg((40, 20)), 1568) is None
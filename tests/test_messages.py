@@ -0,0 +1,44 @@
+import datetime as dt
+
+from sqlalchemy.orm import Session
+
+
+def _add_messages(main, tid, count):
+    # write-behind 배치처럼 같은 시각으로 찍힌 행들
+    ts = dt.datetime(2026, 1, 1, 12, 0, 0)
+    with Session(main.engine) as db:
+        msgs = [main.Message(thread_id=tid, role="user", content=f"m{i}", ts=ts) for i in range(count)]
+        for m in msgs:
+            db.add(m)
+            db.flush()   # 삽입 순서 = rowid 순서
+        db.commit()
+
+
+def _pages(app, headers, tid, direction, cursor=None):
+    contents = []
+    while True:
+        params = {"limit": 2, **({direction: cursor} if cursor else {})}
+        r = app.get(f"/messages/{tid}", headers=headers, params=params)
+        assert r.status_code == 200
+        page = [m["content"] for m in r.json()]
+        contents = page + contents if direction == "before" else contents + page
+        if r.headers["X-Has-More"] != "true":
+            return contents
+        cursor = r.headers["X-Next-Cursor"]
+
+
+def test_keyset_pages_do_not_skip_or_repeat_equal_timestamps(app, auth):
+    headers, tid = auth
+    _add_messages(app.main, tid, 7)
+    expected = [f"m{i}" for i in range(7)]
+
+    assert _pages(app, headers, tid, "before") == expected
+
+    first = app.get(f"/messages/{tid}", headers=headers, params={"limit": 7}).json()[0]
+    assert _pages(app, headers, tid, "after", f"{first['timestamp']}|{first['id']}") == expected[1:]
+
+
+def test_bad_message_cursor_is_rejected(app, auth):
+    headers, tid = auth
+    r = app.get(f"/messages/{tid}", headers=headers, params={"before": "2026-01-01T00:00:00"})
+    assert r.status_code == 400
@@ -0,0 +1,75 @@
+import threading, time
+
+import pytest
+
+from sandbox import SandboxPool
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(size=1, timeout=30, memory_mb=0, preload=())
+    yield pool
+    pool.close()
+
+
+def test_run_returns_output(pool):
+    assert pool.run("print(6 * 7)").output.strip() == "42"
+
+
+def test_close_kills_checked_out_workers(pool):
+    pool.start()
+    procs = [w.proc for w in pool._workers]
+    results = []
+    runner = threading.Thread(target=lambda: results.append(pool.run("import time; time.sleep(30)")))
+    runner.start()
+    while pool._idle.qsize():      # worker 가 실행을 맡을 때까지
+        time.sleep(0.01)
+
+    pool.close()
+    runner.join(5)
+
+    assert not runner.is_alive()
+    assert results and results[0].error
+    assert not any(p.is_alive() for p in procs)
+    assert not pool._workers and pool._idle.empty()
+    with pytest.raises(RuntimeError):
+        pool.run("print(1)")
+
+
+def test_start_reopens_a_closed_pool(pool):
+    pool.start()
+    pool.close()
+    pool.start()
+    assert pool.run("print('again')").output.strip() == "again"
+
+
+def test_cancel_while_waiting_for_a_worker(pool):
+    pool.start()
+    busy = threading.Thread(target=lambda: pool.run("import time; time.sleep(2)"))
+    busy.start()
+    while pool._idle.qsize():
+        time.sleep(0.01)
+
+    cancel = threading.Event()
+    cancel.set()
+    started = time.monotonic()
+    result = pool.run("print(1)", cancel)
+    assert result.cancelled
+    assert time.monotonic() - started < 1
+    busy.join()
+
+
+def test_tool_runs_on_the_pool_executor(pool):
+    import asyncio
+    from sandbox import make_sandbox_tool
+
+    threads = []
+
+    def store_chart(data):
+        threads.append(threading.current_thread().name)
+        return "/images/chart.png"
+
+    tool = make_sandbox_tool(pool, store_chart)
+    text = asyncio.run(tool.ainvoke({"query": "print('IMAGE_DATA: aGk=')"}))
+    assert "[chart saved: /images/chart.png]" in text
+    assert threads and threads[0].startswith("sandbox")
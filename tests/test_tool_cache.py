@@ -0,0 +1,112 @@
+import asyncio
+
+from langchain_core.tools import tool
+
+from tool_cache import ToolResultCache, cached_tool, is_search_result
+
+
+def _slow_tool(calls):
+    @tool
+    async def search(query: str) -> str:
+        """Search."""
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return f"result for {query}"
+    return search
+
+
+def test_coalesced_call_shares_one_upstream_call():
+    calls = []
+    wrapped = cached_tool(_slow_tool(calls), ToolResultCache("t"), single_flight=True)
+
+    async def scenario():
+        return await asyncio.gather(*(wrapped.ainvoke({"query": "mtbf"}) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == ["result for mtbf"] * 3
+    assert calls == ["mtbf"]
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    calls = []
+    cache = ToolResultCache("t")
+    wrapped = cached_tool(_slow_tool(calls), cache, single_flight=True)
+
+    async def scenario():
+        leader = asyncio.create_task(wrapped.ainvoke({"query": "mtbf"}))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(wrapped.ainvoke({"query": "mtbf"}))
+        await asyncio.sleep(0.01)
+        assert cache.counters["coalesced"] == 1
+        leader.cancel()
+        result = await waiter
+        assert leader.cancelled()
+        return result
+
+    assert asyncio.run(scenario()) == "result for mtbf"
+    assert calls == ["mtbf", "mtbf"]   # 이어받은 waiter 가 다시 호출
+
+
+def test_cancelled_waiter_leaves_leader_running():
+    calls = []
+    wrapped = cached_tool(_slow_tool(calls), ToolResultCache("t"), single_flight=True)
+
+    async def scenario():
+        leader = asyncio.create_task(wrapped.ainvoke({"query": "mtbf"}))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(wrapped.ainvoke({"query": "mtbf"}))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        result = await leader
+        assert waiter.cancelled()
+        return result
+
+    assert asyncio.run(scenario()) == "result for mtbf"
+    assert calls == ["mtbf"]
+
+
+def test_error_payloads_are_not_cached():
+    calls = []
+
+    @tool
+    async def search(query: str) -> dict:
+        """Search."""
+        calls.append(query)
+        if len(calls) == 1:
+            return {"error": "rate limited"}
+        return {"query": query, "results": [{"url": "https://example.com"}]}
+
+    wrapped = cached_tool(search, ToolResultCache("t"), single_flight=True, cacheable=is_search_result)
+
+    async def scenario():
+        first = await wrapped.ainvoke({"query": "mtbf"})
+        second = await wrapped.ainvoke({"query": "mtbf"})
+        third = await wrapped.ainvoke({"query": "mtbf"})
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert first == {"error": "rate limited"}
+    assert second == third and second["results"]
+    assert calls == ["mtbf", "mtbf"]
+
+
+def test_disk_tier_purges_expired_rows(tmp_path, monkeypatch):
+    import tool_cache
+    from tool_cache import SqliteResultStore
+
+    clock = [1000.0]
+    monkeypatch.setattr(tool_cache.time, "time", lambda: clock[0])
+    path = str(tmp_path / "cache.sqlite")
+    rows = lambda store: store._conn.execute("SELECT key FROM tool_cache ORDER BY key").fetchall()
+
+    store = SqliteResultStore(path, ttl=10, purge_interval=60)
+    store.set("a", 1)
+    clock[0] += 30
+    store.set("b", 2)                       # 다음 purge 전이라 a 는 아직 남아 있다
+    assert rows(store) == [("a",), ("b",)]
+    clock[0] += 31
+    store.set("c", 3)
+    assert rows(store) == [("c",)]
+
+    clock[0] += 20
+    store._conn.close()
+    assert rows(SqliteResultStore(path, ttl=10)) == []
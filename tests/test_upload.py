@@ -0,0 +1,69 @@
+import hashlib, os
+
+BOUNDARY = "testboundary"
+
+
+def _form(data: bytes, name: str = "file", filename: str = "photo.PNG") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="note"\r\n\r\nhello\r\n'
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _post(app, headers, body, **kwargs):
+    return app.post("/upload", content=body, headers={
+        **headers, "Content-Type": f"multipart/form-data; boundary={BOUNDARY}", **kwargs.pop("extra", {}),
+    }, **kwargs)
+
+
+def _leftovers(main):
+    return [n for n in os.listdir(main.UPLOAD_DIR) if n.endswith(".part")]
+
+
+def test_upload_stores_file_by_content_hash(app, auth):
+    headers, _ = auth
+    data = os.urandom(300_000)
+    r = _post(app, headers, _form(data))
+    assert r.status_code == 200
+    url = r.json()["url"]
+    assert url == f"/images/{hashlib.sha256(data).hexdigest()}.png"
+    with open(os.path.join(app.main.UPLOAD_DIR, os.path.basename(url)), "rb") as f:
+        assert f.read() == data
+
+
+def test_declared_oversized_body_is_rejected_before_reading(app, auth, monkeypatch):
+    headers, _ = auth
+    monkeypatch.setattr(app.main, "UPLOAD_MAX_BYTES", 1000)
+    body = _form(b"x" * 100)
+    read = []
+
+    def chunks():
+        read.append(1)
+        yield body
+
+    r = _post(app, headers, chunks(), extra={"Content-Length": str(200_000)})
+    assert r.status_code == 413
+    assert not read
+
+
+def test_streamed_oversized_body_is_cut_off(app, auth, monkeypatch):
+    headers, _ = auth
+    monkeypatch.setattr(app.main, "UPLOAD_MAX_BYTES", 50_000)
+    body = _form(b"x" * 500_000)
+    def chunks():
+        # Content-Length 없이 (chunked) 보내서 실행 중 한도를 확인
+        for i in range(0, len(body), 16_384):
+            yield body[i:i + 16_384]
+
+    r = _post(app, headers, chunks())
+    assert r.status_code == 413
+    assert not _leftovers(app.main)
+
+
+def test_upload_without_file_field_is_rejected(app, auth):
+    headers, _ = auth
+    assert _post(app, headers, _form(b"abc", name="other")).status_code == 400
+    assert not _leftovers(app.main)
@@ -0,0 +1,309 @@
+# backend/tool_cache.py  ─────────────────────────────────────
+"""Result caches for agent tools (RAG retrieval, web search).
+
+``cached_tool`` wraps a LangChain tool with the same name, description and
+argument schema, so the agents and the ``on_tool_*`` stream events keep
+seeing the original tool. Results are looked up in an in-memory LRU+TTL tier
+first and, when configured, in a persistent SQLite tier. Identical in-flight
+calls can be coalesced into one (single-flight).
+"""
+import asyncio, json, re, sqlite3, threading, time, unicodedata, hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool
+from pydantic import BaseModel, Field
+
+_MISS = object()
+
+
+def normalize_query(text: str) -> str:
+    """Case/width/whitespace-insensitive form of a query string."""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class TTLCache:
+    """Thread-safe LRU whose entries expire ``ttl`` seconds after being stored."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl         = ttl
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return _MISS
+            value, expires = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return _MISS
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class SqliteResultStore:
+    """Persistent cache tier; values are stored as JSON text.
+
+    Expired rows are deleted when the store is opened and then by ``set`` at
+    most once every ``purge_interval`` seconds, so the file stays bounded by
+    what was written within one TTL.
+    """
+
+    def __init__(self, path: str, ttl: float, purge_interval: float = 3600.0):
+        self.ttl   = ttl
+        self.purge_interval = purge_interval
+        self._next_purge    = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tool_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+        self.purge_expired()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM tool_cache WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else _MISS
+
+    def set(self, key: str, value: Any):
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return  # JSON 으로 표현할 수 없는 결과는 메모리 tier 에만 둔다
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, payload, now + self.ttl),
+            )
+            if now >= self._next_purge:
+                self._purge(now)
+
+    def _purge(self, now: float) -> int:
+        self._next_purge = now + self.purge_interval
+        return self._conn.execute("DELETE FROM tool_cache WHERE expires <= ?", (now,)).rowcount
+
+    def purge_expired(self) -> int:
+        with self._lock, self._conn:
+            return self._purge(time.time())
+
+
+class ToolResultCache:
+    """Two-tier result cache for one tool, keyed by its normalized arguments.
+
+    ``namespace`` should identify the backing configuration (collection, index
+    version, search options) so a re-index or option change never serves stale
+    entries.
+    """
+
+    def __init__(self, namespace: str, max_entries: int = 512, ttl: float = 3600.0,
+                 db_path: Optional[str] = None):
+        self.namespace = namespace
+        self.memory    = TTLCache(max_entries, ttl)
+        self.disk      = SqliteResultStore(db_path, ttl) if db_path else None
+        self.counters  = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0}
+
+    def key(self, args: Dict[str, Any]) -> str:
+        norm = {k: normalize_query(v) if isinstance(v, str) else v for k, v in sorted(args.items())}
+        raw = json.dumps([self.namespace, norm], ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get_memory(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is not _MISS:
+            self.counters["memory_hits"] += 1
+        return value
+
+    def get_disk(self, key: str) -> Any:
+        if self.disk is None:
+            return _MISS
+        value = self.disk.get(key)
+        if value is not _MISS:
+            self.counters["disk_hits"] += 1
+            self.memory.set(key, value)
+        return value
+
+    def put(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        total = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "entries": len(self.memory),
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+
+def cached_tool(tool: BaseTool, cache: ToolResultCache, single_flight: bool = False,
+                transform: Optional[Callable[[Any], Any]] = None,
+                cacheable: Optional[Callable[[Any], bool]] = None) -> BaseTool:
+    """Return a drop-in replacement for ``tool`` that serves repeats from ``cache``.
+
+    ``transform`` is applied to fresh results before they are cached/returned
+    (e.g. to shrink payloads). Results for which ``cacheable`` returns false
+    (e.g. error payloads) are returned but not stored. With ``single_flight`` concurrent async calls
+    with the same key share one upstream call; if the call making it is
+    cancelled, one of the waiting calls takes over instead of failing.
+    """
+    transform = transform or (lambda value: value)
+    cacheable = cacheable or (lambda value: True)
+    inflight: Dict[str, asyncio.Future] = {}
+
+    def _run(**kwargs):
+        key = cache.key(kwargs)
+        value = cache.get_memory(key)
+        if value is _MISS:
+            value = cache.get_disk(key)
+        if value is _MISS:
+            cache.counters["misses"] += 1
+            value = transform(tool.invoke(kwargs))
+            if cacheable(value):
+                cache.put(key, value)
+        return value
+
+    async def _fetch(key: str, kwargs: Dict[str, Any]) -> Any:
+        cache.counters["misses"] += 1
+        value = transform(await tool.ainvoke(kwargs))
+        if not cacheable(value):
+            return value
+        if cache.disk is not None:
+            await asyncio.to_thread(cache.put, key, value)
+        else:
+            cache.put(key, value)
+        return value
+
+    async def _arun(**kwargs):
+        key = cache.key(kwargs)
+        value = cache.get_memory(key)
+        if value is _MISS and cache.disk is not None:
+            value = await asyncio.to_thread(cache.get_disk, key)
+        if value is not _MISS:
+            return value
+        if not single_flight:
+            return await _fetch(key, kwargs)
+
+        while (pending := inflight.get(key)) is not None:
+            cache.counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # leader 만 취소됐으면 (예: 다른 사용자의 연결 끊김) 이 호출이 이어받는다
+                if asyncio.current_task().cancelling() or not pending.cancelled():
+                    raise
+        pending = asyncio.get_running_loop().create_future()
+        pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+        inflight[key] = pending
+        try:
+            value = await _fetch(key, kwargs)
+            pending.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            inflight.pop(key, None)
+
+    return StructuredTool.from_function(
+        func=_run,
+        coroutine=_arun,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+    )
+
+
+def is_search_result(result: Any) -> bool:
+    """True for a successful Tavily-style result (``TavilySearch`` returns ``{"error": ...}`` on failure)."""
+    return isinstance(result, dict) and "error" not in result and isinstance(result.get("results"), list)
+
+
+def compact_search_results(result: Any, max_raw_chars: int) -> Any:
+    """Shrink a Tavily-style result before it enters the agent context.
+
+    ``raw_content`` is whitespace-collapsed and cut to ``max_raw_chars``
+    characters; ``0`` drops it entirely. Other shapes are returned unchanged.
+    """
+    if not isinstance(result, dict) or not isinstance(result.get("results"), list):
+        return result
+    items = []
+    for item in result["results"]:
+        if isinstance(item, dict) and item.get("raw_content"):
+            item = dict(item)
+            raw = re.sub(r"\s+", " ", item["raw_content"]).strip()
+            if max_raw_chars > 0:
+                item["raw_content"] = raw[:max_raw_chars] + ("…" if len(raw) > max_raw_chars else "")
+            else:
+                item.pop("raw_content")
+        items.append(item)
+    return {**result, "results": items}
+
+
+class _StubSearchArgs(BaseModel):
+    query: str = Field(description="Search query to look up")
+
+
+def make_stub_search_tool(name: str = "tavily_search", latency: float = 0.0,
+                          max_results: int = 5, raw_chars: int = 4000) -> BaseTool:
+    """Offline stand-in for ``TavilySearch`` returning deterministic results.
+
+    Result shape follows Tavily (``query``/``results`` with ``title``, ``url``,
+    ``content``, ``raw_content``, ``score``); ``latency`` simulates the network.
+    """
+
+    def _results(query: str) -> Dict[str, Any]:
+        seed = hashlib.sha256(query.encode()).hexdigest()
+        return {
+            "query": query,
+            "results": [
+                {
+                    "title": f"Stub result {i + 1} for {query}",
+                    "url": f"https://example.com/{seed[:12]}/{i + 1}",
+                    "content": f"Summary {i + 1} about {query}.",
+                    "raw_content": (f"{query} {seed} " * (raw_chars // (len(query) + 66) + 1))[:raw_chars],
+                    "score": round(1.0 - i * 0.1, 2),
+                }
+                for i in range(max_results)
+            ],
+        }
+
+    def _run(query: str) -> Dict[str, Any]:
+        time.sleep(latency)
+        return _results(query)
+
+    async def _arun(query: str) -> Dict[str, Any]:
+        await asyncio.sleep(latency)
+        return _results(query)
+
+    return StructuredTool.from_function(
+        func=_run,
+        coroutine=_arun,
+        name=name,
+        description="Search the web for up-to-date information (offline stub).",
+        args_schema=_StubSearchArgs,
+    )